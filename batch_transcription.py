@@ -0,0 +1,235 @@
+import os
+import glob
+import json
+import time
+import queue
+import threading
+import traceback
+from progress_events import NullEmitter
+
+# Batch configuration - can be overridden with environment variables or CLI flags
+BATCH_CONCURRENCY = int(os.environ.get("TRANSCRIPTION_BATCH_CONCURRENCY", "1"))
+# Decoded files allowed to wait for a free transcription slot; bounds batch memory use
+BATCH_PREFETCH = int(os.environ.get("TRANSCRIPTION_BATCH_PREFETCH", "1"))
+
+MEDIA_EXTENSIONS = {
+    ".mp4", ".mkv", ".mov", ".avi", ".webm", ".m4v",
+    ".mp3", ".wav", ".m4a", ".flac", ".ogg", ".aac",
+}
+
+SUMMARY_FILE = "batch_summary.json"
+
+
+def _read_manifest(path):
+    """Paths listed in a manifest: a JSON list / {"files": [...]} or one path per line"""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            entries = json.load(f)
+            if isinstance(entries, dict):
+                entries = entries.get("files", [])
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    # Relative entries are relative to the manifest, not to the working directory
+    return [os.path.join(base_dir, entry) for entry in entries]
+
+
+def collect_inputs(spec):
+    """Resolve a directory, glob pattern or manifest file into a sorted list of media files"""
+    if os.path.isdir(spec):
+        files = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(spec)
+            for name in names
+            if os.path.splitext(name)[1].lower() in MEDIA_EXTENSIONS
+        ]
+    elif os.path.isfile(spec) and os.path.splitext(spec)[1].lower() in (".json", ".txt", ".lst"):
+        files = _read_manifest(spec)
+    else:
+        files = glob.glob(spec, recursive=True)
+
+    seen = set()
+    unique = []
+    for path in sorted(os.path.abspath(f) for f in files):
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return unique
+
+
+def plan_outputs(files, output_dir):
+    """Pick an output directory per file so videos with the same name don't overwrite each other"""
+    taken = set()
+    plan = []
+    for path in files:
+        base_name = os.path.basename(path).rsplit(".", 1)[0]
+        target = output_dir
+        if base_name in taken:
+            # Fall back to a subdirectory named after the parent folder
+            target = os.path.join(output_dir, os.path.basename(os.path.dirname(path)) or "_")
+        taken.add(base_name)
+        plan.append((path, target))
+    return plan
+
+
+class BatchTranscriber:
+    """
+    Transcribes many files in one process with one set of warm models.
+
+    A loader thread decodes the audio of upcoming files while earlier files
+    are being transcribed; at most `prefetch` decoded files wait in memory.
+    `concurrency` files are transcribed at once, all sharing the same model
+    registry. A summary manifest is rewritten after every file, so a batch
+    interrupted overnight still says which files are done.
+    """
+
+    def __init__(self, stream, load_audio, concurrency=None, prefetch=None, events=None):
+        self.stream = stream
+        self.load_audio = load_audio
+        self.concurrency = max(1, concurrency or BATCH_CONCURRENCY)
+        self.prefetch = max(1, prefetch or BATCH_PREFETCH)
+        self.events = events or NullEmitter()
+        self._lock = threading.Lock()
+
+    def _load_all(self, plan, ready):
+        for path, target in plan:
+            started = time.perf_counter()
+            try:
+                audio, error = self.load_audio(path), None
+            except Exception as e:
+                audio, error = None, str(e)
+            # Blocks while `prefetch` decoded files are already waiting
+            ready.put((path, target, audio, time.perf_counter() - started, error))
+        for _ in range(self.concurrency):
+            ready.put(None)
+
+    def _transcribe_one(self, path, target, audio, load_seconds, model_size, options):
+        result = {
+            "file": path,
+            "output_dir": target,
+            "load_seconds": round(load_seconds, 3),
+        }
+        started = time.perf_counter()
+        try:
+            os.makedirs(target, exist_ok=True)
+            stream = self.stream(path, target, model_size, audio=audio,
+                                 events=self.events.child(os.path.basename(path)), **options)
+            segments = 0
+            while True:
+                try:
+                    next(stream)
+                    segments += 1
+                except StopIteration as done:
+                    metadata = done.value
+                    break
+            failed_chunks = metadata.get("failed_chunks", 0)
+            result.update({
+                "status": "completed" if not failed_chunks else "partial",
+                "audio_seconds": metadata.get("audio_seconds"),
+                "segments": segments,
+                "failed_chunks": failed_chunks,
+                "cache_hit": metadata.get("cache", {}).get("hit", False),
+                "metadata_file": os.path.join(target, f"{os.path.basename(path).rsplit('.', 1)[0]}_metadata.json"),
+            })
+        except Exception as e:
+            print(f"Batch item {path} failed: {e}")
+            traceback.print_exc()
+            result.update({"status": "failed", "error": str(e)})
+
+        seconds = time.perf_counter() - started
+        result["transcribe_seconds"] = round(seconds, 3)
+        if result.get("audio_seconds"):
+            result["real_time_factor"] = round(seconds / result["audio_seconds"], 4)
+        return result
+
+    def _write_summary(self, summary_path, summary):
+        temp_path = summary_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        os.replace(temp_path, summary_path)
+
+    def run(self, files, output_dir, model_size, **options):
+        """Transcribe every file and return the summary that is also written to output_dir"""
+        os.makedirs(output_dir, exist_ok=True)
+        plan = plan_outputs(files, output_dir)
+        summary_path = os.path.join(output_dir, SUMMARY_FILE)
+        summary = {
+            "model_size": model_size,
+            "concurrency": self.concurrency,
+            "prefetch": self.prefetch,
+            "started_at": time.time(),
+            "total_files": len(plan),
+            "completed": 0,
+            "failed": 0,
+            "audio_seconds": 0.0,
+            "complete": False,
+            "files": [],
+        }
+        self._write_summary(summary_path, summary)
+        self.events.emit("batch_start", files=len(plan), concurrency=self.concurrency, prefetch=self.prefetch)
+        print(f"Batch transcription of {len(plan)} files ({self.concurrency} at a time)")
+
+        batch_started = time.perf_counter()
+        ready = queue.Queue(maxsize=self.prefetch)
+        loader = threading.Thread(target=self._load_all, args=(plan, ready), name="batch-audio-loader", daemon=True)
+        loader.start()
+
+        def work():
+            while True:
+                item = ready.get()
+                if item is None:
+                    break
+                path, target, audio, load_seconds, error = item
+                if error is not None:
+                    print(f"Could not decode {path}: {error}")
+                    result = {"file": path, "output_dir": target, "status": "failed",
+                              "load_seconds": round(load_seconds, 3), "error": error}
+                else:
+                    result = self._transcribe_one(path, target, audio, load_seconds, model_size, options)
+                # Drop the decoded audio before waiting for the next file
+                item = audio = None
+                self._record(summary_path, summary, result, batch_started)
+
+        workers = [
+            threading.Thread(target=work, name=f"batch-transcriber-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        loader.join()
+
+        with self._lock:
+            summary["complete"] = True
+            summary["wall_seconds"] = round(time.perf_counter() - batch_started, 3)
+            self._write_summary(summary_path, summary)
+        self.events.emit("batch_end", wall_seconds=summary["wall_seconds"], files=len(plan),
+                         failed=summary["failed"])
+        print(f"Batch complete in {summary['wall_seconds']:.1f}s. Summary saved to {summary_path}")
+        return summary
+
+    def _record(self, summary_path, summary, result, batch_started):
+        with self._lock:
+            summary["files"].append(result)
+            done = len(summary["files"])
+            elapsed = time.perf_counter() - batch_started
+            audio_done = sum(item.get("audio_seconds") or 0.0 for item in summary["files"])
+            summary.update({
+                "completed": sum(1 for item in summary["files"] if item["status"] == "completed"),
+                "failed": sum(1 for item in summary["files"] if item["status"] != "completed"),
+                "audio_seconds": round(audio_done, 3),
+            })
+            self._write_summary(summary_path, summary)
+            remaining = summary["total_files"] - done
+            self.events.emit(
+                "batch_progress",
+                file=result["file"],
+                status=result["status"],
+                files_done=done,
+                files_total=summary["total_files"],
+                audio_seconds_done=round(audio_done, 3),
+                elapsed_seconds=round(elapsed, 3),
+                eta_seconds=round(elapsed / done * remaining, 1),
+            )
+        print(f"[{done}/{summary['total_files']}] {result['status']}: {result['file']}")
@@ -0,0 +1,128 @@
+import os
+import torch
+import whisper
+
+from segmenter import plan_chunks
+
+# Number of 30 s windows decoded together in one forward pass
+BATCH_SIZE = int(os.environ.get("WHISPER_BATCH_SIZE", "8"))
+
+# Whisper's fixed input window
+WINDOW_SECONDS = 30
+
+# Same quality gates whisper.transcribe uses to decide on a temperature fallback
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+# Whisper timestamp tokens are 20 ms apart
+TIMESTAMP_SECONDS = 0.02
+
+
+def plan_windows(audio, sample_rate):
+    """Cut audio into whisper-sized windows at silences (views of the buffer)"""
+    return plan_chunks(audio, 1, sample_rate, max_chunk_seconds=WINDOW_SECONDS)
+
+
+def _get_tokenizer(model, language):
+    try:
+        return whisper.tokenizer.get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages, language=language, task="transcribe")
+    except (TypeError, AttributeError):
+        # Older whisper releases have no num_languages argument
+        return whisper.tokenizer.get_tokenizer(model.is_multilingual, language=language, task="transcribe")
+
+
+def _log_mel(model, window_audio):
+    n_mels = getattr(model.dims, "n_mels", 80)
+    # Only this one window is padded to 30 s; the shared buffer is untouched
+    return whisper.log_mel_spectrogram(whisper.pad_or_trim(window_audio), n_mels)
+
+
+def tokens_to_segments(tokens, tokenizer, offset, duration):
+    """Turn a decoded token sequence with timestamp tokens into segments"""
+    timestamp_begin = tokenizer.timestamp_begin
+    segments = []
+    start = None
+    text_tokens = []
+
+    for token in tokens:
+        if token >= timestamp_begin:
+            position = (token - timestamp_begin) * TIMESTAMP_SECONDS
+            if start is None or not text_tokens:
+                start = position
+            else:
+                segments.append((start, position, text_tokens))
+                start, text_tokens = None, []
+        elif token < tokenizer.eot:
+            text_tokens.append(token)
+
+    if text_tokens:
+        segments.append((start or 0.0, duration, text_tokens))
+
+    decoded = []
+    for seg_start, seg_end, seg_tokens in segments:
+        text = tokenizer.decode(seg_tokens)
+        if not text.strip():
+            continue
+        decoded.append({
+            "start": offset + min(seg_start, duration),
+            "end": offset + min(max(seg_end, seg_start), duration),
+            "text": text,
+        })
+    return decoded
+
+
+def detect_language(model, window_audio):
+    """Detect the spoken language once so every window decodes consistently"""
+    if not model.is_multilingual:
+        return "en"
+    mel = _log_mel(model, window_audio).to(model.device)
+    _, probs = model.detect_language(mel)
+    return max(probs, key=probs.get)
+
+
+def iter_batched_segments(model, windows, sample_rate, batch_size=None, fp16=False, language=None):
+    """
+    Decode windows batch_size at a time on a single model instance.
+
+    Yields (window_index, segments) in window order. Windows whose batched
+    greedy decode fails whisper's quality gates are re-decoded on their own
+    with whisper's usual temperature fallback.
+    """
+    batch_size = max(1, batch_size or BATCH_SIZE)
+    if not windows:
+        return
+
+    language = language or detect_language(model, windows[0]["audio"])
+    tokenizer = _get_tokenizer(model, language)
+    options = whisper.DecodingOptions(
+        task="transcribe", language=language, temperature=0.0, without_timestamps=False, fp16=fp16)
+
+    for batch_start in range(0, len(windows), batch_size):
+        batch = windows[batch_start:batch_start + batch_size]
+        mel = torch.stack([_log_mel(model, window["audio"]) for window in batch]).to(model.device)
+        if fp16:
+            mel = mel.half()
+
+        with torch.no_grad():
+            results = whisper.decode(model, mel, options)
+
+        for offset, (window, result) in enumerate(zip(batch, results)):
+            duration = len(window["audio"]) / sample_rate
+            needs_fallback = (result.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                              or result.avg_logprob < LOGPROB_THRESHOLD)
+            is_silence = result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD
+
+            if is_silence:
+                segments = []
+            elif needs_fallback:
+                fallback = model.transcribe(window["audio"], language=language, verbose=None, fp16=fp16)
+                segments = [
+                    {"start": window["start_time"] + s["start"], "end": window["start_time"] + s["end"], "text": s["text"]}
+                    for s in fallback["segments"]
+                ]
+            else:
+                segments = tokens_to_segments(result.tokens, tokenizer, window["start_time"], duration)
+
+            yield batch_start + offset, segments
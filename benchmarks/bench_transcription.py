@@ -0,0 +1,216 @@
+"""
+Stage-by-stage benchmark of the transcription pipeline in main.py.
+
+Synthesizes a test recording locally (tones and noise separated by silences),
+then times each stage on its own and prints a JSON report with wall time,
+real-time factor, resident memory and bytes written to temp storage.
+
+    python benchmarks/bench_transcription.py --seconds 300 --model stub
+    python benchmarks/bench_transcription.py --seconds 120 --model tiny --output bench.json
+
+The stub model returns canned segments at a fixed speed, so the harness runs
+in seconds on CPU-only CI machines and still catches regressions in audio
+handling, chunking and output writing.
+"""
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import argparse
+import tempfile
+import resource
+import contextlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# main prints its dependency checks at import; keep stdout for the JSON report
+with contextlib.redirect_stdout(sys.stderr):
+    import main  # noqa: E402
+from model_registry import ModelRegistry, resident_memory_bytes  # noqa: E402
+from segmenter import plan_chunks  # noqa: E402
+
+
+class StubWhisperModel:
+    """Stands in for a whisper model: one segment per 5 s of audio at a fixed decode speed"""
+
+    def __init__(self, seconds_per_audio_second=0.001):
+        self.seconds_per_audio_second = seconds_per_audio_second
+
+    def transcribe(self, audio, **kwargs):
+        duration = len(audio) / main.SAMPLE_RATE
+        time.sleep(duration * self.seconds_per_audio_second)
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + 5.0)
+            segments.append({"start": start, "end": end, "text": f" stub segment at {start:.1f}s"})
+            start = end
+        return {"segments": segments}
+
+
+def synthesize_audio(seconds, sample_rate, seed=0):
+    """Alternate tone+noise 'speech' bursts with silences of varying length"""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * sample_rate), dtype=np.float32)
+    position = 0
+    while position < len(audio):
+        burst = int(rng.uniform(3.0, 12.0) * sample_rate)
+        end = min(len(audio), position + burst)
+        t = np.arange(end - position, dtype=np.float32) / sample_rate
+        tone = 0.3 * np.sin(2 * np.pi * rng.uniform(120, 400) * t)
+        audio[position:end] = tone + 0.05 * rng.standard_normal(end - position).astype(np.float32)
+        position = end + int(rng.choice([0.4, 1.0, 4.0]) * sample_rate)
+    return audio
+
+
+def write_wav(path, audio, sample_rate):
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(pcm.tobytes())
+
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def peak_rss_bytes():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class StageTimer:
+    """Collects per-stage wall time, memory and temp-disk usage"""
+
+    def __init__(self, temp_dir, audio_seconds):
+        self.temp_dir = temp_dir
+        self.audio_seconds = audio_seconds
+        self.stages = {}
+
+    def run(self, name, func, *args, **kwargs):
+        disk_before = directory_bytes(self.temp_dir)
+        rss_before = resident_memory_bytes()
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - started
+        self.stages[name] = {
+            "seconds": round(seconds, 4),
+            "real_time_factor": round(seconds / self.audio_seconds, 5) if self.audio_seconds else None,
+            "rss_delta_bytes": resident_memory_bytes() - rss_before,
+            "temp_disk_bytes": max(0, directory_bytes(self.temp_dir) - disk_before),
+        }
+        return result
+
+    def skip(self, name, reason):
+        self.stages[name] = {"skipped": reason}
+
+
+def run_benchmark(seconds, model_size, stub_speed, workers):
+    sample_rate = main.SAMPLE_RATE
+    work_dir = tempfile.mkdtemp(prefix="bench_transcription_")
+    temp_dir = os.path.join(work_dir, "tmp")
+    output_dir = os.path.join(work_dir, "out")
+    os.makedirs(temp_dir)
+    # Anything the pipeline puts in temp storage lands here and gets counted
+    tempfile.tempdir = temp_dir
+
+    try:
+        source = synthesize_audio(seconds, sample_rate)
+        media_path = os.path.join(work_dir, "input.wav")
+        write_wav(media_path, source, sample_rate)
+        timer = StageTimer(temp_dir, seconds)
+
+        if main.FFMPEG_AVAILABLE or main.MOVIEPY_AVAILABLE:
+            wav_path = os.path.join(temp_dir, "extracted.wav")
+            timer.run("extract_audio", main.extract_audio, media_path, wav_path)
+            if os.path.exists(wav_path):
+                os.unlink(wav_path)
+            audio = timer.run("load_audio", main.load_audio, media_path)
+        else:
+            timer.skip("extract_audio", "neither ffmpeg nor MoviePy is available")
+            timer.skip("load_audio", "neither ffmpeg nor MoviePy is available")
+            audio = source
+
+        timer.run("split_audio", main.split_audio, audio, workers)
+        chunks = timer.run("plan_chunks", plan_chunks, audio, workers, sample_rate)
+
+        if model_size == "stub":
+            registry = ModelRegistry(loader=lambda *args: StubWhisperModel(stub_speed))
+        else:
+            registry = ModelRegistry()
+        device = main.get_device()
+        timer.run("model_load", registry.warm, model_size, device)
+
+        def transcribe_all():
+            segments = []
+            for chunk in chunks:
+                segments.extend(main.transcribe_chunk(chunk, model_size, device, registry=registry))
+            return segments
+
+        segments = timer.run("transcribe_chunk", transcribe_all)
+        segments.sort(key=lambda s: s["start"])
+
+        def write_outputs():
+            os.makedirs(output_dir, exist_ok=True)
+            writer = main.TranscriptWriter(output_dir, "bench", {"video_file": media_path})
+            for segment in segments:
+                writer.add(segment)
+            return writer.close()
+
+        timer.run("bucketing_output", write_outputs)
+
+        decoded_seconds = sum(c["end_time"] - c["start_time"] for c in chunks)
+        total_seconds = sum(stage.get("seconds", 0.0) for stage in timer.stages.values())
+        return {
+            "audio_seconds": seconds,
+            "decoded_seconds": round(decoded_seconds, 3),
+            "model": model_size,
+            "device": device,
+            "chunks": len(chunks),
+            "segments": len(segments),
+            "stages": timer.stages,
+            "total_seconds": round(total_seconds, 4),
+            "real_time_factor": round(total_seconds / seconds, 5),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "output_disk_bytes": directory_bytes(output_dir),
+            "model_registry": registry.stats(),
+        }
+    finally:
+        tempfile.tempdir = None
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the transcription pipeline stages")
+    parser.add_argument("--seconds", type=float, default=300, help="Length of the synthesized audio")
+    parser.add_argument("--model", default="stub", help="'stub' or a whisper model size such as tiny/small")
+    parser.add_argument("--stub-speed", type=float, default=0.001,
+                        help="Stub decode time per second of audio")
+    parser.add_argument("--workers", type=int, default=2, help="Chunks to plan, as transcribe_video would")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    # Keep stdout clean for the JSON report; pipeline logging goes to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark(args.seconds, args.model, args.stub_speed, args.workers)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+
+CHECKPOINT_DIR_NAME = ".checkpoints"
+
+
+class ChunkCheckpoints:
+    """
+    Per-chunk transcription results persisted under output_dir.
+
+    The manifest records the input fingerprint, the engine and the exact chunk
+    plan; every finished chunk is written to its own file as soon as it is
+    decoded. A rerun with the same input can then rebuild the same plan and
+    only decode the chunks that have no checkpoint yet.
+    """
+
+    def __init__(self, output_dir, base_name):
+        self.directory = os.path.join(output_dir, CHECKPOINT_DIR_NAME, base_name)
+        self.manifest_path = os.path.join(self.directory, "manifest.json")
+
+    def _chunk_path(self, index):
+        return os.path.join(self.directory, f"chunk_{index:05d}.json")
+
+    @staticmethod
+    def _write_json(path, payload):
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(temp_path, path)
+
+    def load_manifest(self, fingerprint):
+        """Return the saved manifest if it belongs to this input, else None"""
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get("fingerprint") == fingerprint else None
+
+    def start(self, fingerprint, engine, chunks, sample_rate):
+        """Begin a fresh run: drop old checkpoints and record the chunk plan"""
+        self.clear()
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_json(self.manifest_path, {
+            "fingerprint": fingerprint,
+            "engine": engine,
+            "sample_rate": sample_rate,
+            "chunks": [
+                {key: value for key, value in chunk.items() if key != "audio"}
+                for chunk in chunks
+            ],
+        })
+
+    @staticmethod
+    def restore_chunks(manifest, audio):
+        """Rebuild the saved chunk plan as views of the freshly decoded audio"""
+        return [
+            dict(chunk, audio=audio[chunk["start_sample"]:chunk["end_sample"]])
+            for chunk in manifest["chunks"]
+        ]
+
+    def completed(self, manifest):
+        """Segments of every chunk that already has a checkpoint, by chunk index"""
+        done = {}
+        for chunk in manifest["chunks"]:
+            try:
+                with open(self._chunk_path(chunk["index"]), encoding="utf-8") as f:
+                    done[chunk["index"]] = json.load(f)["segments"]
+            except (OSError, ValueError, KeyError):
+                continue
+        return done
+
+    def save(self, index, segments):
+        self._write_json(self._chunk_path(index), {
+            "index": index,
+            "segments": [
+                {"start": float(s["start"]), "end": float(s["end"]), "text": s["text"]}
+                for s in segments
+            ],
+        })
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        # Remove the parent too once no other video has checkpoints in it
+        try:
+            os.rmdir(os.path.dirname(self.directory))
+        except OSError:
+            pass
@@ -1,15 +1,29 @@
 import os
 import sys
+import argparse
 import torch
 import whisper
 import json
-import tempfile
+import time
 import subprocess
+import threading
+import functools
 import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory
 import numpy as np
 import shutil
 from datetime import timedelta
-from pydub import AudioSegment
+from model_registry import get_registry, default_precision, transcribe_options
+from segmenter import plan_chunks, SegmentStitcher
+from batched_decoding import plan_windows, iter_batched_segments, BATCH_SIZE, WINDOW_SECONDS
+from scheduler import plan_layout, physical_cores
+from segmenter import (VAD_ENABLED, VAD_THRESHOLD_DB, VAD_SPEECH_PAD_SECONDS, VAD_MIN_SILENCE_SECONDS,
+                       MAX_SILENCE_SECONDS, MAX_CHUNK_SECONDS, CHUNK_OVERLAP_SECONDS)
+from transcript_cache import get_cache, audio_fingerprint, cache_key, CACHE_ENABLED
+from checkpoints import ChunkCheckpoints
+from progress_events import NullEmitter, EventEmitter, open_event_stream
+from batch_transcription import BatchTranscriber, collect_inputs
 
 # Try to import MoviePy, but don't fail if it's not available
 try:
@@ -19,13 +33,53 @@ except ImportError:
     MOVIEPY_AVAILABLE = False
     print("MoviePy not available, will use ffmpeg directly for audio extraction")
     
+# Whisper expects 16 kHz mono float32 audio
+SAMPLE_RATE = 16000
+
+# Decoding engine: "threads" (one pooled model per worker thread), "batched"
+# (one model, batches of 30 s windows), "processes" (one model per worker
+# process, audio in shared memory) or "auto" (picked from cores and duration)
+WHISPER_ENGINE = os.environ.get("WHISPER_ENGINE", "auto")
+
+# Bytes read from ffmpeg's stdout per iteration when decoding to PCM
+PCM_READ_BYTES = 1 << 20
+    
 # Check if ffmpeg is available
 FFMPEG_AVAILABLE = shutil.which('ffmpeg') is not None
 if not FFMPEG_AVAILABLE:
     print("WARNING: ffmpeg not found in PATH. Audio extraction may fail.")
 
+# torch's intra-op thread count is process-wide, so it is only set once per process
+_torch_threads_lock = threading.Lock()
+_torch_threads = None
+
+def set_torch_threads(threads):
+    """
+    Set torch's intra-op threads for this process, once; returns the count in effect.
+
+    Jobs running side by side in one process (--batch, --serve with
+    --concurrency > 1) would otherwise keep overriding each other's setting,
+    so the first job's layout wins. Callers running several jobs should pass
+    each a share of the cores so that first layout fits them all.
+    """
+    global _torch_threads
+    with _torch_threads_lock:
+        if _torch_threads is None:
+            torch.set_num_threads(threads)
+            _torch_threads = threads
+        return _torch_threads
+
+def get_device():
+    """Pick the device whisper should run on"""
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def warm_model(model_size, precision=None):
+    """Load a model into the process-wide registry ahead of the first job"""
+    device = get_device()
+    return get_registry().warm(model_size, device, precision or default_precision(device))
+
 def extract_audio(video_file_path, output_audio_path=None):
-    """Extract audio from video file"""
+    """Extract audio from video file to a WAV file (load_audio avoids the file entirely)"""
     if output_audio_path is None:
         output_audio_path = os.path.splitext(video_file_path)[0] + ".wav"
     
@@ -54,39 +108,102 @@ def extract_audio(video_file_path, output_audio_path=None):
     # If we get here, both methods failed or weren't available
     raise Exception("Could not extract audio: both ffmpeg and MoviePy methods failed or unavailable")
 
-def split_audio(audio_file_path, num_chunks=2):
-    """Split audio file into equal parts"""
-    audio = AudioSegment.from_file(audio_file_path)
-    chunk_length = len(audio) // num_chunks
+def _ffmpeg_pcm(media_file_path, sample_rate=SAMPLE_RATE):
+    """Stream ffmpeg's raw s16le output straight into a growing float32 buffer"""
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error", "-i", media_file_path, "-vn",
+           "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate), "-"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    
+    buffer = np.empty(sample_rate * 30, dtype=np.float32)
+    num_samples = 0
+    leftover = b""
+    try:
+        while True:
+            block = process.stdout.read(PCM_READ_BYTES)
+            if not block:
+                break
+            if leftover:
+                block = leftover + block
+            # Keep a dangling odd byte for the next read
+            usable = len(block) - (len(block) % 2)
+            leftover = block[usable:]
+            samples = np.frombuffer(block, dtype=np.int16, count=usable // 2)
+            
+            if num_samples + len(samples) > len(buffer):
+                grown = np.empty(max(len(buffer) * 2, num_samples + len(samples)), dtype=np.float32)
+                grown[:num_samples] = buffer[:num_samples]
+                buffer = grown
+            
+            view = buffer[num_samples:num_samples + len(samples)]
+            view[:] = samples
+            view *= 1.0 / 32768.0
+            num_samples += len(samples)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read().decode("utf-8", errors="replace")
+        process.stderr.close()
+        returncode = process.wait()
+    
+    if returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with code {returncode}: {stderr.strip()}")
+    return buffer[:num_samples]
+
+def load_audio(media_file_path, sample_rate=SAMPLE_RATE):
+    """Decode a video or audio file to mono float32 PCM in memory, without temp files"""
+    if FFMPEG_AVAILABLE:
+        try:
+            print("Decoding audio using ffmpeg...")
+            return _ffmpeg_pcm(media_file_path, sample_rate)
+        except Exception as e:
+            print(f"ffmpeg audio decoding failed: {e}")
+    else:
+        print("ffmpeg not available, skipping ffmpeg decoding attempt")
+    
+    if MOVIEPY_AVAILABLE:
+        try:
+            print("Trying MoviePy for audio decoding...")
+            video = VideoFileClip(media_file_path)
+            samples = video.audio.to_soundarray(fps=sample_rate)
+            if samples.ndim > 1:
+                samples = samples.mean(axis=1)
+            return np.ascontiguousarray(samples, dtype=np.float32)
+        except Exception as e:
+            print(f"MoviePy audio decoding failed: {e}")
+    
+    raise Exception("Could not decode audio: both ffmpeg and MoviePy methods failed or unavailable")
+
+def split_audio(audio, num_chunks=2, sample_rate=SAMPLE_RATE):
+    """Split audio into equal parts; each chunk holds a view of the shared buffer"""
+    if isinstance(audio, str):
+        audio = load_audio(audio, sample_rate)
     
-    temp_dir = tempfile.mkdtemp()
-    chunk_files = []
+    chunk_length = len(audio) // num_chunks
+    chunks = []
     
     for i in range(num_chunks):
-        start_time = i * chunk_length
-        end_time = (i + 1) * chunk_length if i < num_chunks - 1 else len(audio)
-        chunk = audio[start_time:end_time]
-        
-        chunk_path = os.path.join(temp_dir, f"chunk_{i}.wav")
-        chunk.export(chunk_path, format="wav")
-        chunk_files.append({
-            "path": chunk_path,
-            "start_time": start_time / 1000.0,  # Convert to seconds
-            "end_time": end_time / 1000.0  # Convert to seconds
+        start_sample = i * chunk_length
+        end_sample = (i + 1) * chunk_length if i < num_chunks - 1 else len(audio)
+        chunks.append({
+            "index": i,
+            "audio": audio[start_sample:end_sample],  # view, not a copy
+            "start_sample": start_sample,
+            "end_sample": end_sample,
+            "start_time": start_sample / sample_rate,
+            "end_time": end_sample / sample_rate
         })
     
-    return chunk_files
+    return chunks
 
-def transcribe_chunk(chunk_data, model_size, device):
-    """Transcribe a single audio chunk with its own model instance"""
-    chunk_path = chunk_data["path"]
+def transcribe_chunk(chunk_data, model_size, device, precision=None, registry=None):
+    """Transcribe a single audio chunk with a pooled model instance"""
+    chunk_audio = chunk_data["audio"]
     start_offset = chunk_data["start_time"]
+    registry = registry or get_registry()
+    precision = precision or default_precision(device)
     
-    # Load a new model instance for this thread
-    model = whisper.load_model(model_size, device=device)
-    
-    # Use whisper to transcribe the chunk
-    result = model.transcribe(chunk_path, verbose=False)
+    # Borrow an instance from the registry; it is only deserialized once per process
+    with registry.acquire(model_size, device, precision) as model:
+        result = model.transcribe(chunk_audio, verbose=False, **transcribe_options(precision))
     
     # Adjust timestamps based on chunk offset
     for segment in result["segments"]:
@@ -95,9 +212,259 @@ def transcribe_chunk(chunk_data, model_size, device):
     
     return result["segments"]
 
-def transcribe_video(video_file_path, output_dir="transcripts", model_size="small"):
+def _iter_threaded_chunks(audio_chunks, model_size, device, precision, registry, num_workers):
+    """Decode chunks on a thread pool, yielding (chunk_index, segments) as each finishes (None if it failed)"""
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+    try:
+        future_to_chunk = {executor.submit(transcribe_chunk, chunk, model_size, device, precision, registry): chunk["index"] 
+                           for chunk in audio_chunks}
+        
+        # Process results as they complete
+        for future in concurrent.futures.as_completed(future_to_chunk):
+            chunk_idx = future_to_chunk[future]
+            try:
+                chunk_segments = future.result()
+                print(f"Chunk {chunk_idx} transcription complete")
+            except Exception as e:
+                print(f"Error processing chunk {chunk_idx}: {e}")
+                print(f"Full error: {str(e)}")
+                chunk_segments = None
+            yield chunk_idx, chunk_segments
+    finally:
+        # A consumer that stops early cancels the chunks not started yet; the running
+        # ones are waited for so their model instances go back to the pool
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def _iter_batched_chunks(windows, model_size, device, precision, registry, batch_size):
+    """Decode 30 s windows in batches on one model instance"""
+    with registry.acquire(model_size, device, precision) as model:
+        for position, segments in iter_batched_segments(model, windows, SAMPLE_RATE, batch_size,
+                                                        **transcribe_options(precision)):
+            yield windows[position]["index"], segments
+
+# Per-process state of process-pool workers
+_process_worker_state = {}
+
+def share_audio(audio):
+    """Move audio into a shared memory block so worker processes can map it without copying"""
+    block = shared_memory.SharedMemory(create=True, size=max(1, audio.nbytes))
+    shared = np.ndarray(audio.shape, dtype=np.float32, buffer=block.buf)
+    shared[:] = audio
+    return block, shared
+
+def release_shared_audio(block):
+    block.unlink()
+    try:
+        block.close()
+    except BufferError:
+        # Views of the buffer are still alive; the mapping goes away with them
+        pass
+
+def _init_process_worker(block_name, num_samples, model_size, device, precision, torch_threads):
+    """Attach to the shared audio and load the model once per worker process"""
+    try:
+        block = shared_memory.SharedMemory(name=block_name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track flag; spawned workers share the parent's
+        # resource tracker, so the parent's unlink still cleans up
+        block = shared_memory.SharedMemory(name=block_name)
+    
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    _process_worker_state.update({
+        "block": block,
+        "audio": np.ndarray((num_samples,), dtype=np.float32, buffer=block.buf),
+        "model_size": model_size,
+        "device": device,
+        "precision": precision
+    })
+    get_registry().warm(model_size, device, precision)
+
+def _transcribe_shared_chunk(chunk_meta):
+    state = _process_worker_state
+    chunk = dict(chunk_meta, audio=state["audio"][chunk_meta["start_sample"]:chunk_meta["end_sample"]])
+    segments = transcribe_chunk(chunk, state["model_size"], state["device"], state["precision"])
+    # Only plain values go back over the pipe
+    return [{"start": float(s["start"]), "end": float(s["end"]), "text": s["text"]} for s in segments]
+
+def _iter_process_chunks(block, num_samples, audio_chunks, model_size, device, precision, num_workers, torch_threads):
+    """Decode chunks on a process pool that maps the audio from shared memory"""
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=num_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_process_worker,
+        initargs=(block.name, num_samples, model_size, device, precision, torch_threads)
+    )
+    try:
+        future_to_chunk = {}
+        for chunk in audio_chunks:
+            chunk_meta = {key: value for key, value in chunk.items() if key != "audio"}
+            future_to_chunk[executor.submit(_transcribe_shared_chunk, chunk_meta)] = chunk["index"]
+        
+        for future in concurrent.futures.as_completed(future_to_chunk):
+            chunk_idx = future_to_chunk[future]
+            try:
+                chunk_segments = future.result()
+                print(f"Chunk {chunk_idx} transcription complete")
+            except Exception as e:
+                print(f"Error processing chunk {chunk_idx}: {e}")
+                chunk_segments = None
+            yield chunk_idx, chunk_segments
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+class TranscriptWriter:
+    """
+    Write the 5-minute transcript files incrementally.
+
+    Segments must arrive in time order. Each bucket file is written, and the
+    full transcript and metadata updated, the moment the next bucket starts,
+    so downstream consumers can pick up finished buckets while decoding goes on.
+    """
+    
+    BUCKET_SECONDS = 300  # 5 minutes
+    
+    def __init__(self, output_dir, base_name, metadata, on_bucket=None):
+        self.output_dir = output_dir
+        self.base_name = base_name
+        self.metadata = metadata
+        self.on_bucket = on_bucket
+        self.chunks = []
+        self.chunk_files = []
+        self.current_key = None
+        self.current_segments = []
+        self.full_output_path = f"{output_dir}/{base_name}_full.txt"
+        self.metadata_path = f"{output_dir}/{base_name}_metadata.json"
+        
+        # Truncate any transcript left over from a previous run
+        with open(self.full_output_path, "w", encoding="utf-8"):
+            pass
+    
+    @classmethod
+    def bucket_key(cls, start_time):
+        chunk_index = int(start_time // cls.BUCKET_SECONDS)
+        chunk_start = chunk_index * 5  # in minutes
+        chunk_end = (chunk_index + 1) * 5  # in minutes
+        return f"{chunk_start:02d}_{chunk_end:02d}"
+    
+    def add(self, segment):
+        """Add the next segment; returns the key of a bucket this closed, if any"""
+        chunk_key = self.bucket_key(segment["start"])
+        closed = None
+        if chunk_key != self.current_key:
+            if self.current_key is not None:
+                closed = self._close_bucket()
+            self.current_key = chunk_key
+        
+        self.current_segments.append({
+            "start": segment["start"],
+            "end": segment["end"],
+            "text": segment["text"]
+        })
+        return closed
+    
+    def _close_bucket(self):
+        chunk_key = self.current_key
+        chunk_text = "\n".join([s["text"] for s in self.current_segments])
+        
+        # Save individual chunk file
+        chunk_file = f"{self.output_dir}/{self.base_name}_{chunk_key}.txt"
+        with open(chunk_file, "w", encoding="utf-8") as f:
+            f.write(f"Transcript {chunk_key.replace('_', '-')} minutes:\n{chunk_text}")
+        
+        # Append the section to the full transcript
+        with open(self.full_output_path, "a", encoding="utf-8") as f:
+            f.write(f"\n--- {chunk_key.replace('_', '-')} minutes ---\n{chunk_text}\n")
+        
+        self.chunks.append(chunk_key)
+        self.chunk_files.append(chunk_file)
+        self.current_key = None
+        self.current_segments = []
+        self._write_metadata(complete=False)
+        
+        if self.on_bucket:
+            self.on_bucket(chunk_key, chunk_file)
+        return chunk_key
+    
+    def _write_metadata(self, complete):
+        self.metadata.update({
+            "chunks": list(self.chunks),
+            "chunk_files": list(self.chunk_files),
+            "full_transcript": self.full_output_path,
+            "complete": complete
+        })
+        # Write to a temp file first so readers never see a half-written file
+        temp_path = self.metadata_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(self.metadata, f, indent=2)
+        os.replace(temp_path, self.metadata_path)
+    
+    def close(self, **extra):
+        """Flush the last bucket and write the final metadata"""
+        if self.current_key is not None:
+            self._close_bucket()
+        self.metadata.update(extra)
+        self._write_metadata(complete=True)
+        return self.metadata
+
+def segmentation_options(engine):
+    """
+    Settings that decide where the audio is cut and how chunks are stitched.
+
+    The batched engine decodes fixed 30 s windows while the others decode
+    silence-cut chunks of at most MAX_CHUNK_SECONDS, and segment boundaries
+    (and with them the text) differ between the two. Nothing that depends on
+    the machine (workers, cores, free memory) goes in, so the same input maps
+    to the same key whichever host or entry point transcribes it.
+    """
+    batched = engine == "batched"
+    return dict(vad_options(), **{
+        "chunking": "windows" if batched else "silence",
+        "max_chunk_seconds": WINDOW_SECONDS if batched else MAX_CHUNK_SECONDS,
+        "chunk_overlap_seconds": CHUNK_OVERLAP_SECONDS
+    })
+
+def vad_options():
+    """Settings that decide which stretches of the audio are decoded at all"""
+    return {
+        "vad": VAD_ENABLED,
+        "vad_threshold_db": VAD_THRESHOLD_DB,
+        "vad_speech_pad_seconds": VAD_SPEECH_PAD_SECONDS,
+        "vad_min_silence_seconds": VAD_MIN_SILENCE_SECONDS,
+        "max_silence_seconds": MAX_SILENCE_SECONDS
+    }
+
+def _rounded(stage_seconds):
+    return {stage: round(seconds, 4) for stage, seconds in stage_seconds.items()}
+
+def _emit_job_end(events, job_started, audio_seconds, **fields):
+    wall_seconds = time.perf_counter() - job_started
+    events.emit("job_end", wall_seconds=round(wall_seconds, 3), audio_seconds=round(audio_seconds, 3),
+                real_time_factor=round(wall_seconds / audio_seconds, 4) if audio_seconds else None,
+                stage_seconds=_rounded(events.stage_seconds), **fields)
+
+def stream_transcription(video_file_path, output_dir="transcripts", model_size="small", precision=None,
+                         registry=None, on_bucket=None, engine=None, batch_size=None, use_cache=None,
+                         resume=False, events=None, audio=None, cores=None):
+    """
+    Transcribe a video, yielding segments in time order as soon as they are final.
+    
+    Bucket files are written as each 5-minute bucket closes (on_bucket(key, path)
+    is called for each). Every decoded chunk is checkpointed under output_dir;
+    with resume=True a rerun on the same input only decodes the chunks that
+    have no checkpoint. Stage timings, per-chunk progress and ETA are reported
+    through events (an EventEmitter). Already decoded audio can be passed in,
+    and cores limits the CPU share used when other jobs run alongside. The
+    generator's return value is the final metadata.
+    """
     # Check if CUDA is available
-    device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = get_device()
+    precision = precision or default_precision(device)
+    registry = registry or get_registry()
+    batch_size = batch_size or BATCH_SIZE
+    events = events or NullEmitter()
+    job_started = time.perf_counter()
+    events.emit("job_start", video_file=video_file_path, model_size=model_size, device=device)
     print(f"Using device: {device}")
     
     # Calculate optimal number of chunks based on available GPU memory
@@ -122,124 +489,318 @@ def transcribe_video(video_file_path, output_dir="transcripts", model_size="smal
     # Get base filename without extension
     base_name = os.path.basename(video_file_path).rsplit('.', 1)[0]
     
-    # Extract audio from video
-    print(f"Extracting audio from {video_file_path}")
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-        audio_path = temp_audio.name
+    # Decode the audio track once into memory (unless the caller prefetched it)
+    if audio is None:
+        print(f"Extracting audio from {video_file_path}")
+        with events.stage("load_audio"):
+            audio = load_audio(video_file_path)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    events.emit("audio_loaded", audio_seconds=round(audio_seconds, 3))
+    print(f"Decoded {audio_seconds:.1f}s of audio")
+    
+    metadata = {
+        "video_file": video_file_path,
+        "model_size": model_size,
+        "precision": precision,
+        "audio_seconds": round(audio_seconds, 3)
+    }
+    
+    # Identical media decodes to identical PCM, so a content hash finds re-uploads
+    # and tells a resumed run whether its checkpoints belong to this input
+    with events.stage("fingerprint"):
+        fingerprint = audio_fingerprint(audio)
+    
+    # Checkpoints are found by the input alone, not by the engine or layout, so a run restarted
+    # with other free memory or concurrency still resumes; the manifest then supplies the
+    # engine and the exact chunk plan it was made with
+    checkpoints = ChunkCheckpoints(output_dir, base_name)
+    checkpoint_key = cache_key(fingerprint, model_size, dict(vad_options(), precision=precision))
+    manifest = checkpoints.load_manifest(checkpoint_key) if resume else None
+    if resume and manifest is None:
+        print("No matching checkpoints found, starting from the beginning")
+    if manifest is not None:
+        engine = manifest["engine"]
     
+    # Size workers x torch threads to the physical cores and the audio length
+    layout = plan_layout(audio_seconds, device, engine or WHISPER_ENGINE, model_size, gpu_workers=num_chunks,
+                         cores=cores)
+    engine = layout["engine"]
+    num_workers = layout["workers"]
+    
+    # The cache key covers every option that changes the resulting segments
+    transcript_key = cache_key(fingerprint, model_size, dict(segmentation_options(engine), precision=precision))
+    use_cache = CACHE_ENABLED if use_cache is None else use_cache
+    if use_cache:
+        cache = get_cache()
+        with events.stage("cache_lookup"):
+            cached_segments = cache.get(transcript_key)
+        if cached_segments is not None:
+            print(f"Transcript cache hit ({transcript_key[:12]}), skipping decoding")
+            with events.stage("write_output", cache_hit=True):
+                writer = TranscriptWriter(output_dir, base_name,
+                                          dict(metadata, cache={"hit": True, "key": transcript_key}), on_bucket)
+                for segment in cached_segments:
+                    writer.add(segment)
+                    yield segment
+                metadata = writer.close(transcript_cache=cache.stats(), stage_seconds=_rounded(events.stage_seconds))
+            events.progress(audio_seconds, audio_seconds, job_started, cache_hit=True)
+            _emit_job_end(events, job_started, audio_seconds, cache_hit=True)
+            print(f"Transcription complete. Results saved to {output_dir}/{base_name}_*.txt")
+            return metadata
+    
+    plan_started = events.stage_start("plan")
+    if layout["torch_threads"] and engine != "processes":
+        layout["torch_threads"] = set_torch_threads(layout["torch_threads"])
+    print(f"Using {engine} engine with {num_workers} workers x {layout['torch_threads'] or 'default'} torch threads "
+          f"({layout['physical_cores']} physical cores)")
+    
+    # Worker processes map the audio from shared memory instead of receiving copies; everything
+    # from creating the block on is guarded so it is unlinked however the job ends
+    shared_block = None
+    results = stitcher = None
     try:
-        extract_audio(video_file_path, audio_path)
+        if engine == "processes":
+            shared_block, audio = share_audio(audio)
         
-        # Split audio into chunks
-        print(f"Splitting audio into {num_chunks} chunks for parallel processing")
-        audio_chunks = split_audio(audio_path, num_chunks)
+        # Cut the audio at silences, dropping long non-speech spans - chunks are
+        # views of the one decoded buffer, nothing touches disk
+        if manifest is not None:
+            # A resumed run decodes exactly the chunks its checkpoints were made for
+            audio_chunks = ChunkCheckpoints.restore_chunks(manifest, audio)
+        elif engine == "batched":
+            audio_chunks = plan_windows(audio, SAMPLE_RATE)
+        elif engine == "processes":
+            # A couple of chunks per process keeps the pool busy until the end
+            audio_chunks = plan_chunks(audio, num_workers * 2, SAMPLE_RATE, max_chunk_seconds=MAX_CHUNK_SECONDS)
+        else:
+            # Bounded chunks queue up across the threads, so the first ones finish early
+            audio_chunks = plan_chunks(audio, num_workers, SAMPLE_RATE, max_chunk_seconds=MAX_CHUNK_SECONDS)
+        decoded_seconds = sum(chunk["end_time"] - chunk["start_time"] for chunk in audio_chunks)
+        print(f"Planned {len(audio_chunks)} chunks covering {decoded_seconds:.1f}s of {audio_seconds:.1f}s audio")
+        events.stage_end("plan", plan_started, engine=engine, workers=num_workers, chunks=len(audio_chunks),
+                         decoded_seconds=round(decoded_seconds, 3))
+        
+        if manifest is not None:
+            completed_chunks = checkpoints.completed(manifest)
+            print(f"Resuming: {len(completed_chunks)} of {len(audio_chunks)} chunks already transcribed")
+        else:
+            completed_chunks = {}
+            checkpoints.start(checkpoint_key, engine, audio_chunks, SAMPLE_RATE)
+        pending_chunks = [chunk for chunk in audio_chunks if chunk["index"] not in completed_chunks]
         
-        # Load the model for verification, but we'll create separate instances per worker
-        _ = whisper.load_model(model_size, device=device)
-        print(f"Model {model_size} loaded successfully")
+        # Load the model once and pre-create one pooled instance per worker;
+        # worker processes load their own copy instead
+        if engine != "processes" and pending_chunks:
+            num_instances = num_workers if engine == "threads" else 1
+            with events.stage("model_load", instances=num_instances):
+                registry.warm(model_size, device, precision, instances=num_instances)
+            print(f"Model {model_size} ready with {num_instances} pooled instances")
         
-        # Process chunks in parallel - each thread will load its own model
-        print(f"Starting parallel transcription with {num_chunks} workers")
+        writer = TranscriptWriter(output_dir, base_name, dict(metadata, **{
+            "decoded_seconds": round(decoded_seconds, 3),
+            "decode_chunks": len(audio_chunks),
+            "engine": engine,
+            "batch_size": batch_size if engine == "batched" else None,
+            "parallel_chunks": num_workers,
+            "schedule": layout,
+            "cache": {"hit": False, "key": transcript_key},
+            "resumed_chunks": len(completed_chunks)
+        }), on_bucket)
+        
+        if engine == "batched":
+            print(f"Starting batched transcription of {len(pending_chunks)} windows, {batch_size} per batch")
+            results = _iter_batched_chunks(pending_chunks, model_size, device, precision, registry, batch_size)
+        elif engine == "processes":
+            print(f"Starting parallel transcription with {num_workers} worker processes")
+            results = _iter_process_chunks(shared_block, len(audio), pending_chunks, model_size, device, precision,
+                                           num_workers, layout["torch_threads"])
+        else:
+            # Process chunks in parallel - each thread borrows its own pooled instance
+            print(f"Starting parallel transcription with {num_workers} workers")
+            results = _iter_threaded_chunks(pending_chunks, model_size, device, precision, registry, num_workers)
+        
+        # The stitcher releases segments in time order, whatever order chunks finish in
+        stitcher = SegmentStitcher(audio_chunks)
         all_segments = []
+        failed_chunks = 0
         
-        # Use ProcessPoolExecutor for true parallelism
-        with concurrent.futures.ThreadPoolExecutor(max_workers=num_chunks) as executor:
-            # Submit all tasks - each with model_size instead of model instance
-            future_to_chunk = {executor.submit(transcribe_chunk, chunk, model_size, device): i 
-                               for i, chunk in enumerate(audio_chunks)}
-            
-            # Process results as they complete
-            for future in concurrent.futures.as_completed(future_to_chunk):
-                chunk_idx = future_to_chunk[future]
-                try:
-                    chunk_segments = future.result()
-                    print(f"Chunk {chunk_idx} transcription complete")
-                    all_segments.extend(chunk_segments)
-                except Exception as e:
-                    print(f"Error processing chunk {chunk_idx}: {e}")
-                    print(f"Full error: {str(e)}")
-        
-        # Sort segments by start time
-        all_segments.sort(key=lambda x: x["start"])
-        
-        # Process and segment the transcript into 5-minute chunks
-        chunks = {}
-        
-        for segment in all_segments:
-            # Calculate which 5-minute chunk this segment belongs to
-            start_time = segment["start"]
-            chunk_index = int(start_time // 300)  # 300 seconds = 5 minutes
-            
-            chunk_start = chunk_index * 5  # in minutes
-            chunk_end = (chunk_index + 1) * 5  # in minutes
-            chunk_key = f"{chunk_start:02d}_{chunk_end:02d}"
-            
-            if chunk_key not in chunks:
-                chunks[chunk_key] = []
-            
-            # Add segment to the appropriate chunk
-            chunks[chunk_key].append({
-                "start": segment["start"],
-                "end": segment["end"],
-                "text": segment["text"]
-            })
-        
-        # Save the segmented transcript
-        full_transcript = ""
-        chunk_files = []
-        
-        for chunk_key, chunk_segments in chunks.items():
-            chunk_text = "\n".join([s["text"] for s in chunk_segments])
-            full_transcript += f"\n--- {chunk_key.replace('_', '-')} minutes ---\n{chunk_text}\n"
+        # Progress is measured in audio seconds so the ETA follows the real decode speed
+        chunk_seconds = {chunk["index"]: chunk["end_time"] - chunk["start_time"] for chunk in audio_chunks}
+        resumed_seconds = sum(chunk_seconds[idx] for idx in completed_chunks)
+        processed_seconds = resumed_seconds
+        transcribe_started = events.stage_start("transcribe", chunks=len(pending_chunks))
+        
+        # Checkpointed chunks go in first; stitching only releases them once
+        # every earlier chunk is known
+        for chunk_idx, chunk_segments in completed_chunks.items():
+            for segment in stitcher.add(chunk_idx, chunk_segments):
+                writer.add(segment)
+                all_segments.append(segment)
+                yield segment
+        
+        try:
+            for chunk_idx, chunk_segments in results:
+                failed = chunk_segments is None
+                if failed:
+                    failed_chunks += 1
+                    chunk_segments = []
+                else:
+                    checkpoints.save(chunk_idx, chunk_segments)
+                processed_seconds += chunk_seconds[chunk_idx]
+                events.emit("chunk_done", chunk=chunk_idx, audio_seconds=round(chunk_seconds[chunk_idx], 3),
+                            segments=len(chunk_segments), failed=failed)
+                events.progress(processed_seconds, decoded_seconds, transcribe_started,
+                                skipped_seconds=resumed_seconds, chunk=chunk_idx)
+                for segment in stitcher.add(chunk_idx, chunk_segments):
+                    writer.add(segment)
+                    all_segments.append(segment)
+                    yield segment
             
-            # Save individual chunk file
-            chunk_file = f"{output_dir}/{base_name}_{chunk_key}.txt"
-            with open(chunk_file, "w", encoding="utf-8") as f:
-                f.write(f"Transcript {chunk_key.replace('_', '-')} minutes:\n{chunk_text}")
-            chunk_files.append(chunk_file)
-        
-        # Save full transcript
-        full_output_path = f"{output_dir}/{base_name}_full.txt"
-        with open(full_output_path, "w", encoding="utf-8") as f:
-            f.write(full_transcript)
-        
-        # Save metadata
-        metadata = {
-            "video_file": video_file_path,
-            "model_size": model_size,
-            "chunks": list(chunks.keys()),
-            "chunk_files": chunk_files,
-            "full_transcript": full_output_path,
-            "parallel_chunks": num_chunks
-        }
-        
-        with open(f"{output_dir}/{base_name}_metadata.json", "w") as f:
-            json.dump(metadata, f, indent=2)
-        
-        print(f"Transcription complete. Results saved to {output_dir}/{base_name}_*.txt")
-        return metadata
-    
+            for segment in stitcher.finish():
+                writer.add(segment)
+                all_segments.append(segment)
+                yield segment
+        except Exception as e:
+            events.stage_end("transcribe", transcribe_started, status="error", error=str(e))
+            raise
     finally:
-        # Clean up temporary files
+        if results is not None:
+            results.close()
+        if shared_block is not None:
+            # Drop our views of the block so its mapping can be closed
+            audio = audio_chunks = pending_chunks = None
+            if stitcher is not None:
+                stitcher.chunks = None
+            release_shared_audio(shared_block)
+    events.stage_end("transcribe", transcribe_started, failed_chunks=failed_chunks)
+    
+    print(f"Dropped {stitcher.dropped} duplicate segments at chunk boundaries")
+    
+    # Keep checkpoints around for --resume while chunks are missing
+    if not failed_chunks:
+        checkpoints.clear()
+    
+    # Never cache a transcript with holes in it
+    with events.stage("write_output"):
+        extra = {"failed_chunks": failed_chunks, "model_registry": registry.stats()}
+        if use_cache and not failed_chunks:
+            cache.put(transcript_key, all_segments, {"video_file": video_file_path, "model_size": model_size})
+            extra["transcript_cache"] = cache.stats()
+        extra["stage_seconds"] = _rounded(events.stage_seconds)
+        metadata = writer.close(**extra)
+    _emit_job_end(events, job_started, audio_seconds, failed_chunks=failed_chunks)
+    
+    print(f"Transcription complete. Results saved to {output_dir}/{base_name}_*.txt")
+    return metadata
+
+def transcribe_video(video_file_path, output_dir="transcripts", model_size="small", precision=None, registry=None,
+                     engine=None, batch_size=None, use_cache=None, resume=False, events=None, cores=None):
+    """Transcribe a video and return its metadata once every segment is written"""
+    stream = stream_transcription(video_file_path, output_dir, model_size, precision, registry,
+                                  engine=engine, batch_size=batch_size, use_cache=use_cache, resume=resume,
+                                  events=events, cores=cores)
+    while True:
         try:
-            os.unlink(audio_path)
-            # Delete any temporary directories created for audio chunks
-            for chunk in audio_chunks if 'audio_chunks' in locals() else []:
-                try:
-                    if os.path.exists(chunk["path"]):
-                        os.unlink(chunk["path"])
-                except:
-                    pass
-        except:
-            pass
+            next(stream)
+        except StopIteration as done:
+            return done.value
+
+def transcribe_batch(spec, output_dir="transcripts", model_size="small", concurrency=None, prefetch=None,
+                     events=None, engine=None, batch_size=None, use_cache=None, resume=False):
+    """Transcribe every file in a directory, glob or manifest with one shared model registry"""
+    files = collect_inputs(spec)
+    if not files:
+        raise Exception(f"No media files found for {spec}")
+    runner = BatchTranscriber(stream_transcription, load_audio, concurrency, prefetch, events)
+    # Concurrent files split the cores between them instead of each sizing for the whole machine
+    return runner.run(files, output_dir, model_size, engine=engine, batch_size=batch_size, use_cache=use_cache,
+                      resume=resume, cores=max(1, physical_cores() // runner.concurrency))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Transcribe a video with whisper")
+    parser.add_argument("video_file", nargs="?", help="Video file to transcribe")
+    parser.add_argument("output_dir", nargs="?", default=None, help="Output directory (default: transcripts)")
+    parser.add_argument("model_size", nargs="?", default=None, help="Whisper model size (default: small)")
+    parser.add_argument("--engine", choices=["auto", "threads", "batched", "processes"], default=None,
+                        help="Decoding engine (default: WHISPER_ENGINE or auto)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help="Windows per forward pass for the batched engine")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reuse chunk checkpoints from an interrupted run on the same input")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Skip the content-addressed transcript cache")
+    parser.add_argument("--events-fd", type=int, default=None,
+                        help="Write NDJSON progress events to this inherited file descriptor")
+    parser.add_argument("--events-file", default=None,
+                        help="Append NDJSON progress events to this file")
+    parser.add_argument("--batch", default=None, metavar="DIR|GLOB|MANIFEST",
+                        help="Transcribe every media file in a directory, glob or manifest; positionals are then "
+                             "[output_dir] [model_size]")
+    parser.add_argument("--prefetch", type=int, default=None,
+                        help="Files decoded ahead of transcription in --batch mode (default 1)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run as a long-lived worker that takes jobs over HTTP")
+    parser.add_argument("--host", default=None, help="Worker bind address (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=None, help="Worker port (default 5002)")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Number of jobs the worker (or --batch) runs at once")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="Maximum number of jobs waiting in the worker queue")
+    parser.add_argument("--warm", action="append", default=None,
+                        help="Model size to load at worker startup (repeatable, default: small)")
+    return parser.parse_args(argv)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    args = parse_args()
+    
+    if args.serve:
+        from transcription_worker import serve, WORKER_CONCURRENCY
+        concurrency = max(1, args.concurrency or WORKER_CONCURRENCY)
+        serve(
+            # Concurrent jobs split the cores between them, as in --batch mode
+            functools.partial(transcribe_video, cores=max(1, physical_cores() // concurrency)),
+            host=args.host,
+            port=args.port,
+            concurrency=concurrency,
+            queue_size=args.queue_size,
+            warm_models=args.warm or ["small"],
+            warmup=warm_model,
+            extra_stats=lambda: {
+                "model_registry": get_registry().stats(),
+                "transcript_cache": get_cache().stats() if CACHE_ENABLED else None
+            },
+        )
+        sys.exit(0)
+    
+    # With --batch there is no single video, so the positionals shift left
+    if args.batch:
+        if args.model_size:
+            print("Usage: python main.py --batch <dir|glob|manifest> [output_dir] [model_size]")
+            sys.exit(1)
+        args.video_file, args.output_dir, args.model_size = None, args.video_file, args.output_dir
+    elif not args.video_file:
         print("Usage: python main.py <video_file_path> [output_dir] [model_size]")
+        print("       python main.py --batch <dir|glob|manifest> [output_dir] [model_size] [--concurrency N]")
+        print("       python main.py --serve [--port PORT] [--concurrency N] [--queue-size N]")
         sys.exit(1)
+    output_dir = args.output_dir or "transcripts"
+    model_size = args.model_size or "small"
     
-    video_file = sys.argv[1]
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else "transcripts"
-    model_size = sys.argv[3] if len(sys.argv) > 3 else "small"
-    
-    transcribe_video(video_file, output_dir, model_size)
+    # Progress events get their own channel so they never mix with the log output on stdout
+    event_stream = open_event_stream(args.events_fd, args.events_file)
+    events = EventEmitter(event_stream) if event_stream else None
+    try:
+        if args.batch:
+            summary = transcribe_batch(args.batch, output_dir, model_size, args.concurrency, args.prefetch, events,
+                                       engine=args.engine, batch_size=args.batch_size, use_cache=not args.no_cache,
+                                       resume=args.resume)
+            if summary["failed"]:
+                sys.exit(1)
+        else:
+            transcribe_video(args.video_file, output_dir, model_size,
+                             engine=args.engine, batch_size=args.batch_size, use_cache=not args.no_cache,
+                             resume=args.resume, events=events)
+    except Exception as e:
+        if events:
+            events.emit("job_error", error=str(e))
+        raise
@@ -0,0 +1,299 @@
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import whisper
+
+# Maximum number of distinct (model_size, device, precision) entries kept warm
+MAX_MODELS = int(os.environ.get("WHISPER_REGISTRY_MAX_MODELS", "2"))
+
+# Default number of pooled instances per model (0 = grow on demand)
+POOL_SIZE = int(os.environ.get("WHISPER_POOL_SIZE", "0"))
+
+
+def resident_memory_bytes():
+    """Return the current resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+        # ru_maxrss is the peak, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+    except Exception:
+        return 0
+
+
+def transcribe_options(precision):
+    """Decoding options matching a registry precision"""
+    return {"fp16": precision == "fp16"}
+
+
+def default_precision(device):
+    """fp16 only pays off on CUDA; whisper falls back to fp32 on CPU anyway"""
+    return "fp16" if device == "cuda" else "fp32"
+
+
+def load_whisper_model(model_size, device, precision):
+    """Deserialize a whisper checkpoint onto the given device"""
+    # Weights stay fp32; whisper casts them per layer when decoding with fp16=True
+    return whisper.load_model(model_size, device=device)
+
+
+def replicate_model(model):
+    """Deep copy a loaded model without going back to the checkpoint"""
+    replica = copy.deepcopy(model)
+    # The source may be mid-decode with whisper's kv-cache hooks installed;
+    # those closures write into the other instance's cache, so drop them
+    if hasattr(replica, "modules"):
+        for module in replica.modules():
+            module._forward_hooks.clear()
+    return replica
+
+
+class _ModelEntry:
+    """All pooled instances of one (model_size, device, precision) key"""
+
+    def __init__(self, key, model, load_seconds, rss_delta):
+        self.key = key
+        self.primary = model
+        self.idle = [model]
+        self.instances = 1
+        # Callers pinning the entry against eviction; only changed under the registry lock
+        self.in_use = 0
+        self.load_seconds = load_seconds
+        self.rss_delta_bytes = rss_delta
+        self.replica_seconds = 0.0
+        self.hits = 0
+        self.available = threading.Condition()
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded whisper models.
+
+    Each (model_size, device, precision) key is deserialized from disk once.
+    Workers that need exclusive use of a model borrow a pooled instance via
+    acquire(); extra instances are deep copies of the first one, so they never
+    touch the checkpoint again. When more than max_models keys are loaded the
+    least recently used idle key is evicted.
+    """
+
+    def __init__(self, max_models=None, pool_size=None, loader=None):
+        self.max_models = max(1, max_models or MAX_MODELS)
+        self.pool_size = pool_size if pool_size is not None else POOL_SIZE
+        self.loader = loader or load_whisper_model
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.loads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model_size, device, precision=None):
+        return (model_size, device, precision or default_precision(device))
+
+    def _entry(self, key, pin=False):
+        """
+        Return the entry for key, loading the model at most once.
+
+        With pin=True the entry is marked in use before the registry lock is
+        released, so no concurrent eviction can drop it before the caller is
+        done with it; release it with _unpin().
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                if pin:
+                    entry.in_use += 1
+                return entry
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other keys stay available, but
+        # serialize concurrent loads of the same key
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.hits += 1
+                    if pin:
+                        entry.in_use += 1
+                    return entry
+
+            model_size, device, precision = key
+            print(f"Loading whisper model {model_size} on {device} ({precision})")
+            rss_before = resident_memory_bytes()
+            started = time.perf_counter()
+            model = self.loader(model_size, device, precision)
+            load_seconds = time.perf_counter() - started
+            rss_delta = max(0, resident_memory_bytes() - rss_before)
+            print(f"Model {model_size} loaded in {load_seconds:.2f}s "
+                  f"(+{rss_delta / (1024 ** 2):.0f} MB resident)")
+
+            entry = _ModelEntry(key, model, load_seconds, rss_delta)
+            with self._lock:
+                if pin:
+                    entry.in_use += 1
+                self._entries[key] = entry
+                self.loads += 1
+                self._evict_locked()
+            return entry
+
+    def _unpin(self, entry):
+        with self._lock:
+            entry.in_use -= 1
+
+    def _evict_locked(self):
+        """Drop least recently used idle entries above max_models"""
+        for key in list(self._entries.keys()):
+            if len(self._entries) <= self.max_models:
+                break
+            entry = self._entries[key]
+            if entry.in_use:
+                continue
+            del self._entries[key]
+            self._key_locks.pop(key, None)
+            self.evictions += 1
+            print(f"Evicted whisper model {key[0]} on {key[1]} ({key[2]})")
+        self._release_device_memory()
+
+    @staticmethod
+    def _release_device_memory():
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except Exception:
+            pass
+
+    def get(self, model_size, device, precision=None):
+        """Return the shared primary instance (not safe for concurrent transcribe calls)"""
+        return self._entry(self.make_key(model_size, device, precision)).primary
+
+    @contextmanager
+    def acquire(self, model_size, device, precision=None):
+        """Borrow an instance for exclusive use, replicating the model if none is idle"""
+        entry = self._entry(self.make_key(model_size, device, precision), pin=True)
+        model = None
+        replicate = False
+
+        try:
+            with entry.available:
+                while not entry.idle:
+                    if self.pool_size <= 0 or entry.instances < self.pool_size:
+                        entry.instances += 1
+                        replicate = True
+                        break
+                    entry.available.wait()
+                if not replicate:
+                    model = entry.idle.pop()
+
+            if replicate:
+                try:
+                    started = time.perf_counter()
+                    model = replicate_model(entry.primary)
+                    entry.replica_seconds += time.perf_counter() - started
+                except Exception:
+                    with entry.available:
+                        entry.instances -= 1
+                    raise
+            yield model
+        finally:
+            with entry.available:
+                if model is not None:
+                    entry.idle.append(model)
+                entry.available.notify()
+            self._unpin(entry)
+
+    def warm(self, model_size, device, precision=None, instances=1):
+        """Load a model and pre-create pooled instances so the first jobs don't pay for it"""
+        entry = self._entry(self.make_key(model_size, device, precision), pin=True)
+        try:
+            with entry.available:
+                missing = max(0, instances - entry.instances)
+                entry.instances += missing
+            for created in range(missing):
+                started = time.perf_counter()
+                try:
+                    replica = replicate_model(entry.primary)
+                except Exception:
+                    # Give back the slots reserved for replicas that now won't exist,
+                    # and wake waiters so they can replicate into them themselves
+                    with entry.available:
+                        entry.instances -= missing - created
+                        entry.available.notify_all()
+                    raise
+                with entry.available:
+                    entry.replica_seconds += time.perf_counter() - started
+                    entry.idle.append(replica)
+                    entry.available.notify()
+        finally:
+            self._unpin(entry)
+        return entry.primary
+
+    def evict(self, model_size, device, precision=None):
+        """Explicitly drop a model; returns False if it is currently in use"""
+        key = self.make_key(model_size, device, precision)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.in_use:
+                return False
+            del self._entries[key]
+            self._key_locks.pop(key, None)
+            self.evictions += 1
+        self._release_device_memory()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+        self._release_device_memory()
+
+    def stats(self):
+        """Load time, memory and pool usage for every resident model"""
+        with self._lock:
+            entries = list(self._entries.values())
+            return {
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "max_models": self.max_models,
+                "resident_memory_bytes": resident_memory_bytes(),
+                "models": [
+                    {
+                        "model_size": e.key[0],
+                        "device": e.key[1],
+                        "precision": e.key[2],
+                        "load_seconds": round(e.load_seconds, 3),
+                        "rss_delta_bytes": e.rss_delta_bytes,
+                        "instances": e.instances,
+                        "in_use": e.in_use,
+                        "replica_seconds": round(e.replica_seconds, 3),
+                        "hits": e.hits,
+                    }
+                    for e in entries
+                ],
+            }
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide registry, creating it on first use"""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ModelRegistry()
+        return _default_registry
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+class EventEmitter:
+    """
+    Machine-readable progress events for a transcription job.
+
+    Every event is a flat JSON object written as one line (NDJSON) to a
+    dedicated stream - kept apart from stdout so free-form logging can't
+    corrupt it - and/or handed to a callback. Stage durations are also
+    accumulated so callers can aggregate them across jobs.
+    """
+
+    def __init__(self, stream=None, callback=None, job=None):
+        self.stream = stream
+        self.callback = callback
+        self.job = job
+        self.started_at = time.time()
+        self.stage_seconds = {}
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        payload = {"event": event, "ts": round(time.time(), 3)}
+        if self.job is not None:
+            payload["job"] = self.job
+        payload.update(fields)
+
+        with self._lock:
+            if self.stream is not None:
+                try:
+                    self.stream.write(json.dumps(payload) + "\n")
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    # The reader went away; progress is best-effort
+                    self.stream = None
+            if self.callback is not None:
+                self.callback(payload)
+        return payload
+
+    def child(self, job):
+        """Emitter for a sub-job that writes to the same channel, tagged with its own job id"""
+        child = type(self)(self.stream, self.callback, job)
+        child._lock = self._lock
+        return child
+
+    def stage_start(self, stage, **fields):
+        self.emit("stage_start", stage=stage, **fields)
+        return time.perf_counter()
+
+    def stage_end(self, stage, started, status="ok", **fields):
+        duration = time.perf_counter() - started
+        with self._lock:
+            self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + duration
+        self.emit("stage_end", stage=stage, status=status, duration_seconds=round(duration, 4), **fields)
+        return duration
+
+    @contextmanager
+    def stage(self, stage, **fields):
+        started = self.stage_start(stage, **fields)
+        try:
+            yield
+        except BaseException as e:
+            self.stage_end(stage, started, status="error", error=str(e))
+            raise
+        self.stage_end(stage, started)
+
+    def progress(self, processed_seconds, total_seconds, stage_started, skipped_seconds=0.0, **fields):
+        """
+        Report decoded audio so far with real-time factor and ETA.
+
+        skipped_seconds is audio that counts as done without being decoded in
+        this run (resumed chunks), so it is left out of the rate.
+        """
+        elapsed = time.perf_counter() - stage_started
+        decoded = processed_seconds - skipped_seconds
+        rtf = elapsed / decoded if decoded > 0 else None
+        remaining = max(0.0, total_seconds - processed_seconds)
+        self.emit(
+            "progress",
+            processed_audio_seconds=round(processed_seconds, 3),
+            total_audio_seconds=round(total_seconds, 3),
+            progress=round(processed_seconds / total_seconds, 4) if total_seconds else 1.0,
+            real_time_factor=round(rtf, 4) if rtf is not None else None,
+            eta_seconds=round(remaining * rtf, 1) if rtf is not None else None,
+            **fields
+        )
+
+
+class NullEmitter(EventEmitter):
+    """Emitter used when nobody listens; keeps stage timings only"""
+
+    def emit(self, event, **fields):
+        return None
+
+
+def open_event_stream(fd=None, path=None):
+    """Open the NDJSON event channel: an inherited file descriptor or a file path"""
+    if fd is not None:
+        return os.fdopen(fd, "w", buffering=1, encoding="utf-8")
+    if path:
+        return open(path, "a", buffering=1, encoding="utf-8")
+    return None
+
+
+class StageLatencyStats:
+    """Per-stage latency aggregated across jobs (count, total, max, recent p50/p95)"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, event):
+        if event.get("event") != "stage_end":
+            return
+        with self._lock:
+            stats = self._stages.setdefault(event["stage"], {"count": 0, "total": 0.0, "max": 0.0, "recent": []})
+            duration = event["duration_seconds"]
+            stats["count"] += 1
+            stats["total"] += duration
+            stats["max"] = max(stats["max"], duration)
+            stats["recent"] = (stats["recent"] + [duration])[-self.window:]
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for stage, stats in self._stages.items():
+                recent = sorted(stats["recent"])
+                snapshot[stage] = {
+                    "count": stats["count"],
+                    "total_seconds": round(stats["total"], 3),
+                    "mean_seconds": round(stats["total"] / stats["count"], 4),
+                    "max_seconds": round(stats["max"], 4),
+                    "p50_seconds": round(recent[len(recent) // 2], 4),
+                    "p95_seconds": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 4),
+                }
+            return snapshot
@@ -0,0 +1,128 @@
+import os
+import math
+
+# Scheduling knobs - can be overridden with environment variables
+THREADS_PER_PROCESS = int(os.environ.get("WHISPER_THREADS_PER_PROCESS", "4"))
+MIN_THREADS_PER_WORKER = int(os.environ.get("WHISPER_MIN_THREADS_PER_WORKER", "2"))
+MAX_PROCESSES = int(os.environ.get("WHISPER_MAX_PROCESSES", "8"))
+
+# Below this length a process pool costs more (spawn + model load per process) than it saves
+SHORT_AUDIO_SECONDS = float(os.environ.get("WHISPER_SHORT_AUDIO_SECONDS", "600"))
+
+# Audio each extra process should have to chew on
+SECONDS_PER_PROCESS = 300
+
+# Rough resident size of one loaded model in GB, used to cap the process count
+MODEL_MEMORY_GB = {
+    "tiny": 0.4,
+    "base": 0.5,
+    "small": 1.2,
+    "medium": 3.0,
+    "large": 6.0,
+    "turbo": 3.5,
+}
+
+
+def logical_cpus():
+    """CPUs this process may run on (respects taskset/cgroup affinity)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def physical_cores():
+    """Number of physical cores available, ignoring SMT siblings"""
+    logical = logical_cpus()
+    try:
+        cores = set()
+        physical_id = core_id = None
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical_id = value.strip()
+                elif key == "core id":
+                    core_id = value.strip()
+                elif not key and core_id is not None:
+                    cores.add((physical_id, core_id))
+                    physical_id = core_id = None
+        if core_id is not None:
+            cores.add((physical_id, core_id))
+        if cores:
+            total_logical = os.cpu_count() or logical
+            # Scale down when affinity restricts us to a subset of the machine
+            return max(1, min(len(cores), round(len(cores) * logical / total_logical)))
+    except OSError:
+        pass
+    return max(1, logical)
+
+
+def available_memory_gb():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / (1024 ** 2)
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _process_count(audio_seconds, cores, model_size):
+    if audio_seconds < SHORT_AUDIO_SECONDS:
+        return 1
+    by_cores = cores // max(1, THREADS_PER_PROCESS)
+    by_audio = math.ceil(audio_seconds / SECONDS_PER_PROCESS)
+    count = min(by_cores, by_audio, MAX_PROCESSES)
+
+    memory_gb = available_memory_gb()
+    model_gb = MODEL_MEMORY_GB.get(model_size.split(".")[0].split("-")[0], 2.0)
+    if memory_gb is not None:
+        count = min(count, int(memory_gb // model_gb))
+    return max(1, count)
+
+
+def plan_layout(audio_seconds, device, engine="auto", model_size="small", gpu_workers=2, cores=None):
+    """
+    Decide how to spread decoding over the machine.
+
+    Returns the engine to use, how many parallel workers it gets and how many
+    torch intra-op threads each worker should use, so workers x threads never
+    exceeds the physical cores (or `cores`, when several jobs share the machine).
+    """
+    cores = max(1, cores or physical_cores())
+    layout = {
+        "device": device,
+        "physical_cores": cores,
+        "logical_cpus": logical_cpus(),
+        "audio_seconds": round(audio_seconds, 3),
+    }
+
+    if device == "cuda":
+        # The GPU does the heavy lifting; CPU threads only feed it
+        engine = "threads" if engine in ("auto", "processes") else engine
+        layout.update({
+            "engine": engine,
+            "workers": gpu_workers if engine == "threads" else 1,
+            "torch_threads": None,
+        })
+        return layout
+
+    if engine == "auto":
+        engine = "processes" if _process_count(audio_seconds, cores, model_size) > 1 else "batched"
+
+    if engine == "processes":
+        workers = _process_count(max(audio_seconds, SHORT_AUDIO_SECONDS), cores, model_size)
+    elif engine == "threads":
+        workers = max(1, min(4, cores // max(1, MIN_THREADS_PER_WORKER)))
+    else:
+        workers = 1
+
+    layout.update({
+        "engine": engine,
+        "workers": workers,
+        "torch_threads": max(1, cores // workers),
+    })
+    return layout
@@ -0,0 +1,250 @@
+import os
+import re
+import numpy as np
+
+# Energy-based voice activity detection settings - can be overridden with environment variables
+VAD_ENABLED = os.environ.get("VAD_ENABLED", "1") == "1"
+VAD_FRAME_SECONDS = 0.03
+VAD_THRESHOLD_DB = os.environ.get("VAD_THRESHOLD_DB")  # fixed dBFS threshold, adaptive when unset
+VAD_SPEECH_PAD_SECONDS = float(os.environ.get("VAD_SPEECH_PAD_SECONDS", "0.2"))
+VAD_MIN_SILENCE_SECONDS = float(os.environ.get("VAD_MIN_SILENCE_SECONDS", "0.3"))
+
+# Silences longer than this are not decoded at all
+MAX_SILENCE_SECONDS = float(os.environ.get("MAX_SILENCE_SECONDS", "2.0"))
+
+# Whisper pads every window to 30 s, so shorter chunks cost the same as 30 s ones
+MIN_CHUNK_SECONDS = 30.0
+
+# Longest chunk the threads and processes engines decode; long audio becomes a queue of
+# chunks shared by the workers, so the first segments are final after minutes, not hours
+MAX_CHUNK_SECONDS = float(os.environ.get("MAX_CHUNK_SECONDS", "300"))
+
+# Audio decoded on both sides of a cut that had to be placed inside speech
+CHUNK_OVERLAP_SECONDS = float(os.environ.get("CHUNK_OVERLAP_SECONDS", "1.0"))
+
+# How far from the ideal cut point we look for a quieter spot, as a fraction of the chunk length
+CUT_SEARCH_FRACTION = 0.15
+
+
+def frame_energy_db(audio, sample_rate, frame_seconds=VAD_FRAME_SECONDS):
+    """RMS level of consecutive frames in dBFS, computed block-wise to avoid copying the whole signal"""
+    frame = max(1, int(sample_rate * frame_seconds))
+    num_frames = len(audio) // frame
+    energy = np.empty(num_frames, dtype=np.float32)
+
+    block_frames = 8192
+    for start in range(0, num_frames, block_frames):
+        end = min(num_frames, start + block_frames)
+        block = audio[start * frame:end * frame].reshape(end - start, frame)
+        energy[start:end] = np.sqrt(np.mean(np.square(block, dtype=np.float32), axis=1))
+
+    return 20.0 * np.log10(energy + 1e-10), frame
+
+
+def _speech_threshold(energy_db):
+    if VAD_THRESHOLD_DB is not None:
+        return float(VAD_THRESHOLD_DB)
+    noise_floor = float(np.percentile(energy_db, 10))
+    speech_level = float(np.percentile(energy_db, 95))
+    # Just above the noise floor, but never so high that quiet speech is cut
+    return max(-60.0, min(noise_floor + 10.0, speech_level - 20.0))
+
+
+def detect_speech(audio, sample_rate, energy=None):
+    """Return (start_sample, end_sample) regions that contain speech"""
+    if len(audio) == 0:
+        return []
+
+    energy_db, frame = energy or frame_energy_db(audio, sample_rate)
+    if len(energy_db) == 0:
+        return [(0, len(audio))]
+
+    voiced = energy_db > _speech_threshold(energy_db)
+
+    # Run boundaries of the voiced mask
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = list(zip(edges[::2], edges[1::2]))
+
+    pad = int(VAD_SPEECH_PAD_SECONDS * sample_rate)
+    min_gap = int(VAD_MIN_SILENCE_SECONDS * sample_rate)
+    regions = []
+    for start_frame, end_frame in runs:
+        start = max(0, int(start_frame) * frame - pad)
+        end = min(len(audio), int(end_frame) * frame + pad)
+        if regions and start - regions[-1][1] <= min_gap:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], end))
+        else:
+            regions.append((start, end))
+
+    return regions
+
+
+def _group_regions(regions, sample_rate):
+    """Merge speech regions into contiguous spans, dropping long silences between them"""
+    max_gap = int(MAX_SILENCE_SECONDS * sample_rate)
+    min_span = int(MIN_CHUNK_SECONDS * sample_rate)
+    spans = []
+    for start, end in regions:
+        if spans:
+            prev_start, prev_end = spans[-1]
+            # A short gap is cheap to keep; so is any gap if the merged span
+            # still fits in a single whisper window
+            if start - prev_end <= max_gap or end - prev_start <= min_span:
+                spans[-1] = (prev_start, end)
+                continue
+        spans.append((start, end))
+    return spans
+
+
+def _quietest_point(energy_db, frame, lo, hi):
+    """Sample index of the lowest-energy frame between samples lo and hi"""
+    lo_frame = max(0, lo // frame)
+    hi_frame = min(len(energy_db), max(lo_frame + 1, hi // frame))
+    if hi_frame <= lo_frame:
+        return (lo + hi) // 2
+    return (lo_frame + int(np.argmin(energy_db[lo_frame:hi_frame]))) * frame
+
+
+def plan_chunks(audio, num_chunks=2, sample_rate=16000, max_chunk_seconds=None, use_vad=None):
+    """
+    Cut audio into decode chunks at silences.
+
+    Long non-speech spans are dropped, the remaining speech is split into
+    roughly num_chunks pieces (or pieces of at most max_chunk_seconds) with
+    each cut placed at the quietest nearby frame. A cut that still lands in
+    speech is decoded with a small overlap on both sides; own_start/own_end
+    mark the part of each chunk whose segments it is responsible for.
+    Every chunk's "audio" is a view of the input buffer.
+    """
+    total = len(audio)
+    if total == 0:
+        return []
+
+    use_vad = VAD_ENABLED if use_vad is None else use_vad
+    energy_db, frame = frame_energy_db(audio, sample_rate)
+
+    if use_vad:
+        spans = _group_regions(detect_speech(audio, sample_rate, (energy_db, frame)), sample_rate)
+    else:
+        spans = [(0, total)]
+
+    speech_samples = sum(end - start for start, end in spans)
+    target = speech_samples / max(1, num_chunks)
+    target = max(target, MIN_CHUNK_SECONDS * sample_rate)
+    overlap = int(CHUNK_OVERLAP_SECONDS * sample_rate)
+    if max_chunk_seconds:
+        # Leave room for the overlap so no decoded chunk exceeds the limit
+        target = min(target, max_chunk_seconds * sample_rate - 2 * overlap)
+    target = max(sample_rate, int(target))
+
+    threshold_db = _speech_threshold(energy_db) if len(energy_db) else 0.0
+    chunks = []
+
+    for span_start, span_end in spans:
+        # Place cut points inside the span at the quietest spot near each target boundary
+        cuts = [span_start]
+        while span_end - cuts[-1] > target:
+            ideal = cuts[-1] + target
+            search = int(target * CUT_SEARCH_FRACTION)
+            hi = min(ideal, span_end)
+            if max_chunk_seconds is None:
+                hi = min(ideal + search, span_end)
+            cut = _quietest_point(energy_db, frame, max(cuts[-1] + 1, ideal - search), hi)
+            cuts.append(max(cuts[-1] + 1, cut))
+        cuts.append(span_end)
+
+        for own_start, own_end in zip(cuts[:-1], cuts[1:]):
+            decode_start, decode_end = own_start, own_end
+            # Only cuts that fall in speech need overlap; the span edges are silence already
+            if own_start != span_start and _is_voiced(energy_db, frame, own_start, threshold_db):
+                decode_start = max(span_start, own_start - overlap)
+            if own_end != span_end and _is_voiced(energy_db, frame, own_end, threshold_db):
+                decode_end = min(span_end, own_end + overlap)
+
+            chunks.append({
+                "index": len(chunks),
+                "audio": audio[decode_start:decode_end],  # view, not a copy
+                "start_sample": decode_start,
+                "end_sample": decode_end,
+                "start_time": decode_start / sample_rate,
+                "end_time": decode_end / sample_rate,
+                "own_start": own_start / sample_rate,
+                "own_end": own_end / sample_rate,
+            })
+
+    return chunks
+
+
+def _is_voiced(energy_db, frame, sample, threshold_db):
+    if len(energy_db) == 0:
+        return True
+    index = min(len(energy_db) - 1, sample // frame)
+    return bool(energy_db[index] > threshold_db)
+
+
+def _normalize_text(text):
+    return re.sub(r"[^\w]+", " ", text.lower()).strip()
+
+
+def _is_duplicate(previous, segment):
+    """Two segments from neighbouring chunks that cover the same words"""
+    if segment["start"] >= previous["end"]:
+        return False
+    a, b = _normalize_text(previous["text"]), _normalize_text(segment["text"])
+    return bool(a) and bool(b) and (a == b or a in b or b in a)
+
+
+class SegmentStitcher:
+    """
+    Merge per-chunk segment lists into one time-ordered list.
+
+    Chunks can finish in any order; add() returns the segments that are final
+    once every earlier chunk has been seen. Segments whose midpoint lies in a
+    neighbour's overlap are dropped, and the last segment of each chunk is held
+    back until the next chunk arrives so boundary duplicates can be removed.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self._results = {}
+        self._next = 0
+        self._tail = None
+        self.dropped = 0
+
+    def _owned(self, chunk, segments):
+        kept = []
+        for segment in segments:
+            middle = (segment["start"] + segment["end"]) / 2
+            if chunk["start_time"] < chunk["own_start"] and middle < chunk["own_start"]:
+                self.dropped += 1
+                continue
+            if chunk["end_time"] > chunk["own_end"] and middle >= chunk["own_end"]:
+                self.dropped += 1
+                continue
+            kept.append(segment)
+        kept.sort(key=lambda s: s["start"])
+        return kept
+
+    def add(self, index, segments):
+        self._results[index] = segments
+        final = []
+        while self._next in self._results:
+            chunk = self.chunks[self._next]
+            for segment in self._owned(chunk, self._results.pop(self._next)):
+                if self._tail is not None and _is_duplicate(self._tail, segment):
+                    self.dropped += 1
+                    # Keep whichever copy has more words
+                    if len(segment["text"]) > len(self._tail["text"]):
+                        self._tail = segment
+                    continue
+                if self._tail is not None:
+                    final.append(self._tail)
+                self._tail = segment
+            self._next += 1
+        return final
+
+    def finish(self):
+        """Flush the held-back segment; call once every chunk has been added"""
+        final = [self._tail] if self._tail is not None else []
+        self._tail = None
+        return final
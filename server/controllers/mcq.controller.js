@@ -136,6 +136,44 @@ exports.getMCQsBySegment = async (req, res) => {
   }
 };
 
+// Validate and store MCQs returned by the LLM service for one segment
+const saveGeneratedMcqs = async (fileId, segment, generatedMcqs, llmResult) => {
+  const savedMcqs = [];
+  
+  for (const mcq of generatedMcqs) {
+    try {
+      // Validate MCQ format
+      if (!mcq.question || !Array.isArray(mcq.options) || mcq.options.length !== 4 || 
+          typeof mcq.correct !== 'number' || mcq.correct < 0 || mcq.correct > 3) {
+        console.warn('Skipping invalid MCQ format:', JSON.stringify(mcq).substring(0, 100));
+        continue;
+      }
+      
+      // Create new MCQ
+      const newMcq = new MCQ({
+        fileId,
+        segmentId: segment,
+        question: mcq.question,
+        options: mcq.options,
+        correct: mcq.correct,
+        isAutoGenerated: true,
+        metadata: {
+          gpu_used: llmResult.gpu_used || false,
+          model: llmResult.model || 'unknown',
+          generated_at: new Date()
+        }
+      });
+      
+      await newMcq.save();
+      savedMcqs.push(newMcq);
+    } catch (error) {
+      console.error("Error saving MCQ:", error);
+    }
+  }
+  
+  return savedMcqs;
+};
+
 // Generate MCQs for a segment using the LLM service
 exports.generateMCQs = async (req, res) => {
   const io = req.app.get('io'); // Get socket.io instance for real-time updates
@@ -281,38 +319,7 @@ exports.generateMCQs = async (req, res) => {
       if (io) io.emit('mcq-status', { fileId, segment, status: 'saving', message: `Saving ${generatedMcqs.length} questions...` });
       
       // Save the generated MCQs to the database
-      const savedMcqs = [];
-      
-      for (const mcq of generatedMcqs) {
-        try {
-          // Validate MCQ format
-          if (!mcq.question || !Array.isArray(mcq.options) || mcq.options.length !== 4 || 
-              typeof mcq.correct !== 'number' || mcq.correct < 0 || mcq.correct > 3) {
-            console.warn('Skipping invalid MCQ format:', JSON.stringify(mcq).substring(0, 100));
-            continue;
-          }
-          
-          // Create new MCQ
-          const newMcq = new MCQ({
-            fileId,
-            segmentId: segment,
-            question: mcq.question,
-            options: mcq.options,
-            correct: mcq.correct,
-            isAutoGenerated: true,
-            metadata: {
-              gpu_used: llmResponse.data.gpu_used || false,
-              model: llmResponse.data.model || 'unknown',
-              generated_at: new Date()
-            }
-          });
-          
-          await newMcq.save();
-          savedMcqs.push(newMcq);
-        } catch (error) {
-          console.error("Error saving MCQ:", error);
-        }
-      }
+      const savedMcqs = await saveGeneratedMcqs(fileId, segment, generatedMcqs, llmResponse.data);
       
       if (savedMcqs.length === 0) {
         console.error('Failed to save any MCQs to database');
@@ -349,6 +356,86 @@ exports.generateMCQs = async (req, res) => {
   }
 };
 
+// Generate MCQs for every segment of a transcript with one batch call to the LLM service
+exports.generateAllMCQs = async (req, res) => {
+  const io = req.app.get('io');
+  
+  try {
+    const { fileId, numQuestions = 5 } = req.body;
+    
+    if (!fileId) {
+      return res.status(400).json({
+        success: false,
+        error: "fileId is required"
+      });
+    }
+    
+    const transcript = await Transcript.findOne({ fileId });
+    const segments = (transcript?.segments || []).filter(s => s.text && s.text.trim() !== "");
+    
+    if (segments.length === 0) {
+      return res.status(404).json({
+        success: false,
+        error: "No transcript segments found"
+      });
+    }
+    
+    console.log(`Generating MCQs for ${segments.length} segments of ${fileId}`);
+    segments.forEach(s => {
+      if (io) io.emit('mcq-status', { fileId, segment: s.segmentId, status: 'processing', message: 'Generating questions with LLM...' });
+    });
+    
+    // The LLM service schedules the segments with bounded parallelism and reports each one separately
+    const llmResponse = await axios.post(`${LLM_API_URL}/generate/batch`, {
+      items: segments.map(s => ({
+        text: s.text,
+        num_questions: numQuestions,
+        segment_id: s.segmentId,
+        file_id: fileId
+      }))
+    }, {
+      timeout: 120000 * Math.ceil(segments.length / 4),
+      headers: {
+        'Content-Type': 'application/json'
+      }
+    });
+    
+    const results = [];
+    for (const result of llmResponse.data.results) {
+      const segment = result.segment_id;
+      if (!result.success || !Array.isArray(result.mcqs) || result.mcqs.length === 0) {
+        const message = result.message || 'No questions were generated';
+        if (io) io.emit('mcq-status', { fileId, segment, status: 'error', message });
+        results.push({ segment, success: false, error: message });
+        continue;
+      }
+      
+      const savedMcqs = await saveGeneratedMcqs(fileId, segment, result.mcqs, result);
+      const success = savedMcqs.length > 0;
+      if (io) io.emit('mcq-status', {
+        fileId,
+        segment,
+        status: success ? 'completed' : 'error',
+        message: success ? `Generated ${savedMcqs.length} questions` : 'Failed to save questions'
+      });
+      results.push({ segment, success, count: savedMcqs.length });
+    }
+    
+    const succeeded = results.filter(r => r.success).length;
+    return res.json({
+      success: succeeded === results.length,
+      results,
+      message: `Generated MCQs for ${succeeded} of ${results.length} segments`
+    });
+  } catch (error) {
+    console.error("Error generating MCQs for transcript:", error);
+    res.status(500).json({
+      success: false,
+      error: `Server error while generating MCQs: ${error.message}`
+    });
+  }
+};
+
 // Update MCQ
 exports.updateMCQ = async (req, res) => {
   try {
@@ -2,6 +2,82 @@ const { spawn } = require("child_process");
 const path = require("path");
 const fs = require("fs").promises;
 const fsSync = require("fs");
+const readline = require("readline");
+const axios = require("axios");
+
+// Long-lived transcription worker started with `python main.py --serve`
+const TRANSCRIPTION_WORKER_URL = process.env.TRANSCRIPTION_WORKER_URL;
+const WORKER_POLL_INTERVAL = 1000; // milliseconds
+// Failed polls in a row (network blips, timeouts) tolerated before a job is given up on;
+// the wait between retries doubles each time up to WORKER_POLL_MAX_BACKOFF
+const WORKER_POLL_MAX_FAILURES = 5;
+const WORKER_POLL_MAX_BACKOFF = 15000; // milliseconds
+
+// Map a transcription progress event onto the 5-95% range shown to the client;
+// 100% is only sent once the results have been stored
+const progressPercent = (event) => Math.min(95, Math.max(5, Math.round(10 + (event.progress || 0) * 85)));
+
+// Submit a job to the transcription worker and poll it until it finishes
+const submitToTranscriptionWorker = async (videoPath, outputDir, modelSize, onFinish, onLog, onEvent) => {
+  const { data: job } = await axios.post(`${TRANSCRIPTION_WORKER_URL}/jobs`, {
+    video_file: path.resolve(videoPath),
+    output_dir: path.resolve(outputDir),
+    model_size: modelSize,
+  }, { timeout: 5000 });
+
+  onLog(`Queued transcription job ${job.job_id}\n`);
+
+  let lastState = job.state;
+  let failures = 0;
+  let finished = false;
+  // onFinish runs exactly once, however polling ends
+  const finish = async (code, message) => {
+    if (finished) return;
+    finished = true;
+    await onFinish(code, message);
+  };
+  // Each poll schedules the next one, so a slow answer never overlaps the following request
+  const poll = async () => {
+    let status;
+    try {
+      ({ data: status } = await axios.get(`${TRANSCRIPTION_WORKER_URL}/jobs/${job.job_id}`, { timeout: 5000 }));
+    } catch (error) {
+      failures += 1;
+      // A 404 means the worker no longer knows the job (e.g. it restarted); retrying won't bring it back
+      if (error.response?.status === 404 || failures >= WORKER_POLL_MAX_FAILURES) {
+        await finish(1, `Lost contact with transcription worker: ${error.message}`);
+        return;
+      }
+      const delay = Math.min(WORKER_POLL_MAX_BACKOFF, WORKER_POLL_INTERVAL * 2 ** failures);
+      onLog(`Polling transcription job ${job.job_id} failed (${error.message}), retrying in ${delay}ms\n`);
+      schedule(delay);
+      return;
+    }
+    failures = 0;
+
+    if (status.state !== lastState) {
+      lastState = status.state;
+      onLog(`Transcription job ${job.job_id} is ${status.state}\n`);
+    }
+    if (status.progress) {
+      onEvent({ event: "progress", stage: status.stage, ...status.progress });
+    } else if (status.stage) {
+      onEvent({ event: "stage_start", stage: status.stage });
+    }
+    if (status.state === "completed" || status.state === "failed") {
+      await finish(status.state === "completed" ? 0 : 1, status.error || "");
+      return;
+    }
+    schedule(WORKER_POLL_INTERVAL);
+  };
+  const schedule = (delay) => setTimeout(() => {
+    poll().catch((error) => {
+      console.error(`Error polling transcription job ${job.job_id}:`, error);
+      finish(1, `Error handling transcription job status: ${error.message}`).catch(console.error);
+    });
+  }, delay);
+  schedule(WORKER_POLL_INTERVAL);
+};
 
 const generateMCQs = async (transcript) => {
   // This is where we'll integrate with local LLM
@@ -55,74 +131,43 @@ exports.handleVideoUpload = async (req, res) => {
       });
     }
 
-    // Improved progress estimation
-    let progressInterval;
-    if (socketId && io) {
-      const fileSize = fsSync.statSync(videoPath).size;
-      const estimatedTimePerMB = 1000; // milliseconds
-      const estimatedTotalTime = Math.max((fileSize / (1024 * 1024)) * estimatedTimePerMB, 30000);
-      const updateFrequency = Math.min(estimatedTotalTime / 20, 3000); // More frequent updates
-      
-      let progress = 5;
-      const startTime = Date.now();
-      
-      progressInterval = setInterval(() => {
-        const elapsedTime = Date.now() - startTime;
-        const estimatedProgress = Math.min(Math.floor((elapsedTime / estimatedTotalTime) * 100), 95);
-        
-        // Only send if progress has increased
-        if (estimatedProgress > progress) {
-          progress = estimatedProgress;
-          io.to(socketId).emit('transcription-progress', { 
-            progress, 
-            fileName 
-          });
+    // Progress comes from the stage/chunk events main.py reports as it decodes
+    let progress = 5;
+    let stage = null;
+    const handleTranscriptionEvent = (event) => {
+      if (event.event === "stage_end") {
+        console.log(`Transcription stage ${event.stage} for ${fileName}: ${event.duration_seconds}s (${event.status})`);
+        return;
+      }
+      if (event.event === "stage_start" && event.stage !== stage) {
+        stage = event.stage;
+        if (socketId && io) {
+          io.to(socketId).emit('transcription-progress', { progress, stage, fileName });
         }
-      }, updateFrequency);
-    }
-
-    // Start transcription with Python script
-    const pythonScript = path.join(__dirname, "../../main.py");
-    const pythonProcess = spawn("python", [
-      pythonScript,
-      videoPath,
-      outputDir,
-      "small",
-    ]);
-
-    let transcriptionOutput = "";
-    let transcriptionError = "";
-
-    // Handle stdout from Python process
-    pythonProcess.stdout.on("data", (data) => {
-      transcriptionOutput += data.toString();
-      if (socketId && io) {
-        io.to(socketId).emit('transcription-log', { 
-          log: data.toString(), 
-          fileName 
-        });
+        return;
+      }
+      if (event.event !== "progress") {
+        return;
       }
-    });
 
-    // Handle stderr from Python process
-    pythonProcess.stderr.on("data", (data) => {
-      transcriptionError += data.toString();
-      if (socketId && io) {
-        io.to(socketId).emit('transcription-log', { 
-          log: data.toString(), 
-          fileName, 
-          isError: true 
+      const percent = progressPercent(event);
+      // Only send if progress has increased
+      if (percent > progress && socketId && io) {
+        progress = percent;
+        io.to(socketId).emit('transcription-progress', {
+          progress,
+          stage: event.stage || stage,
+          etaSeconds: event.eta_seconds,
+          realTimeFactor: event.real_time_factor,
+          processedSeconds: event.processed_audio_seconds,
+          totalSeconds: event.total_audio_seconds,
+          fileName
         });
       }
-    });
+    };
 
-    // Process completion
-    pythonProcess.on("close", async (code) => {
-      // Clear the interval regardless of outcome
-      if (progressInterval) {
-        clearInterval(progressInterval);
-      }
-      
+    // Read the transcription results once the job has finished (code 0 = success)
+    const finishTranscription = async (code, transcriptionError = "") => {
       if (code === 0) {
         // Success - Read metadata and store in MongoDB
         try {
@@ -268,7 +313,69 @@ exports.handleVideoUpload = async (req, res) => {
           });
         }
       }
+    };
+
+    // Prefer the long-lived transcription worker (warm models, no cold start)
+    if (TRANSCRIPTION_WORKER_URL) {
+      try {
+        await submitToTranscriptionWorker(videoPath, outputDir, "small", finishTranscription, (log) => {
+          if (socketId && io) {
+            io.to(socketId).emit('transcription-log', { log, fileName });
+          }
+        }, handleTranscriptionEvent);
+        return;
+      } catch (error) {
+        console.error("Transcription worker unavailable, falling back to spawning main.py:", error.message);
+      }
+    }
+
+    // Start transcription with Python script; fd 3 carries its NDJSON progress events
+    const pythonScript = path.join(__dirname, "../../main.py");
+    const pythonProcess = spawn("python", [
+      pythonScript,
+      videoPath,
+      outputDir,
+      "small",
+      "--events-fd",
+      "3",
+    ], { stdio: ["ignore", "pipe", "pipe", "pipe"] });
+
+    readline.createInterface({ input: pythonProcess.stdio[3] }).on("line", (line) => {
+      try {
+        handleTranscriptionEvent(JSON.parse(line));
+      } catch (error) {
+        console.error("Ignoring malformed transcription event:", line);
+      }
     });
+
+    let transcriptionOutput = "";
+    let transcriptionError = "";
+
+    // Handle stdout from Python process
+    pythonProcess.stdout.on("data", (data) => {
+      transcriptionOutput += data.toString();
+      if (socketId && io) {
+        io.to(socketId).emit('transcription-log', { 
+          log: data.toString(), 
+          fileName 
+        });
+      }
+    });
+
+    // Handle stderr from Python process
+    pythonProcess.stderr.on("data", (data) => {
+      transcriptionError += data.toString();
+      if (socketId && io) {
+        io.to(socketId).emit('transcription-log', { 
+          log: data.toString(), 
+          fileName, 
+          isError: true 
+        });
+      }
+    });
+
+    // Process completion
+    pythonProcess.on("close", (code) => finishTranscription(code, transcriptionError));
   } catch (error) {
     console.error("Error processing video:", error);
     res.status(500).json({ message: "Server error" });
@@ -1,14 +1,58 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
-import uvicorn
 import json
 import os
-from ollama_service import generate_mcqs, get_available_devices
-from config import GPU_ENABLED, GPU_LAYERS, DEFAULT_MODEL
+import time
+import asyncio
+import logging
+from ollama_service import (agenerate_mcqs, astream_mcqs, clean_transcript_text,
+                            is_fallback, parse_stats, PROMPT_VERSION, MCQ_OUTPUT_MODE)
+from mcq_cache import get_cache, cache_key, MCQ_CACHE_ENABLED
+from single_flight import SingleFlight
+from backend_pool import get_pool, close_pool
+from loop_monitor import EventLoopLagMonitor
+from metrics import REGISTRY, REQUEST_SECONDS, get_logger, log_event
+from config import GPU_ENABLED, GPU_LAYERS, DEFAULT_MODEL, API_PORT
+
+# Segments of one batch generated at the same time (each backend's client also caps its own requests)
+BATCH_MAX_PARALLEL = int(os.environ.get("BATCH_MAX_PARALLEL", "4"))
+MAX_BATCH_ITEMS = int(os.environ.get("MAX_BATCH_ITEMS", "100"))
 
 app = FastAPI(title="MCQ Generation API")
 
+# Identical requests arriving together share one LLM call
+generation_flight = SingleFlight()
+
+# How long the event loop is held up, e.g. by parsing on it instead of awaiting
+loop_lag = EventLoopLagMonitor()
+
+logger = get_logger("api")
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe each request in mcq_http_request_duration_seconds (until the response starts, for streams)"""
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Route templates only, so unknown URLs can't blow up the label set
+    path = request.url.path if request.url.path in ROUTE_PATHS else "other"
+    REQUEST_SECONDS.observe(time.perf_counter() - started, method=request.method, path=path,
+                            status=response.status_code)
+    return response
+
+@app.on_event("startup")
+async def startup():
+    """Start probing the Ollama backends and sampling event loop lag"""
+    get_pool().start_health_probes()
+    loop_lag.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the probes and close the pooled Ollama connections"""
+    loop_lag.stop()
+    await close_pool()
+
 class TranscriptRequest(BaseModel):
     text: str
     num_questions: Optional[int] = 5
@@ -16,12 +60,61 @@ class TranscriptRequest(BaseModel):
     file_id: Optional[str] = None
     model: Optional[str] = None
     use_gpu: Optional[bool] = True
+    bypass_cache: Optional[bool] = False
 
 class MCQResponse(BaseModel):
     success: bool
     mcqs: List[Dict[str, Any]]
     message: Optional[str] = None
     gpu_used: bool = False
+    cached: bool = False
+    # Placeholder questions made without the model because its output couldn't be parsed
+    fallback: bool = False
+
+class BatchTranscriptRequest(BaseModel):
+    items: List[TranscriptRequest]
+    max_parallel: Optional[int] = None
+
+class BatchItemResponse(MCQResponse):
+    file_id: Optional[str] = None
+    segment_id: Optional[str] = None
+
+class BatchMCQResponse(BaseModel):
+    success: bool
+    results: List[BatchItemResponse]
+    succeeded: int
+    failed: int
+
+# /generate/stream always asks for the line format, whatever MCQ_OUTPUT_MODE says
+STREAM_OUTPUT_MODE = "text"
+
+def mcq_cache_key(request: TranscriptRequest, output_mode: str = MCQ_OUTPUT_MODE) -> str:
+    """The prompt differs per output mode, so entries made with one are not served for the other"""
+    return cache_key(clean_transcript_text(request.text), request.model or DEFAULT_MODEL,
+                     request.num_questions, PROMPT_VERSION, output_mode)
+
+def cached_mcqs(request: TranscriptRequest, output_mode: str = MCQ_OUTPUT_MODE) -> Optional[List[Dict[str, Any]]]:
+    """Look the request up in the MCQ cache unless caching is off or bypassed"""
+    if not MCQ_CACHE_ENABLED:
+        return None
+    if request.bypass_cache:
+        get_cache().bypassed += 1
+        return None
+    return get_cache().get(mcq_cache_key(request, output_mode))
+
+def save_mcqs(request: TranscriptRequest, mcqs: List[Dict[str, Any]], output_mode: str = MCQ_OUTPUT_MODE):
+    """
+    Store freshly generated MCQs in the cache (a bypassed request refreshes its entry).
+    
+    Fallback placeholders are never stored, so one malformed response doesn't
+    pin them for the whole TTL; the next request asks the model again.
+    """
+    if MCQ_CACHE_ENABLED and mcqs and not is_fallback(mcqs):
+        get_cache().put(mcq_cache_key(request, output_mode), mcqs, {
+            "file_id": request.file_id,
+            "segment_id": request.segment_id,
+            "model": request.model or DEFAULT_MODEL
+        })
 
 @app.post("/generate", response_model=MCQResponse)
 async def create_mcqs(request: TranscriptRequest):
@@ -36,35 +129,47 @@ async def create_mcqs(request: TranscriptRequest):
             gpu_used=False
         )
     
+    mcqs = cached_mcqs(request)
+    if mcqs is not None:
+        return MCQResponse(
+            success=True,
+            mcqs=mcqs,
+            message=f"Loaded {len(mcqs)} cached questions",
+            cached=True
+        )
+    
     # Determine if we should use GPU
     use_gpu = request.use_gpu and GPU_ENABLED
     
-    try:
-        # Generate MCQs with Ollama service
-        mcqs = generate_mcqs(
+    async def generate():
+        # Generate MCQs with Ollama service; awaiting keeps the event loop free for other requests
+        mcqs = await agenerate_mcqs(
             request.text,
             request.num_questions,
             model=request.model or DEFAULT_MODEL,
-            use_gpu=use_gpu
+            use_gpu=use_gpu,
+            # Segments of one file go to the same backend, whose KV cache already holds the prompt prefix
+            sticky_key=request.file_id
         )
+        save_mcqs(request, mcqs)
+        return mcqs
+    
+    try:
+        # Concurrent duplicates (same text, model, count and device) wait for the call already in flight
+        mcqs = await generation_flight.do(f"{mcq_cache_key(request)}:{use_gpu}", generate)
         
-        # Cache results if file_id and segment_id are provided
-        if request.file_id and request.segment_id:
-            cache_folder = os.path.join(os.path.dirname(__file__), "cache")
-            os.makedirs(cache_folder, exist_ok=True)
-            
-            cache_file = os.path.join(cache_folder, f"{request.file_id}_{request.segment_id}.json")
-            with open(cache_file, "w") as f:
-                json.dump(mcqs, f)
-        
+        fallback = is_fallback(mcqs)
         return MCQResponse(
             success=True,
             mcqs=mcqs,
-            message=f"Generated {len(mcqs)} questions using {'GPU' if use_gpu else 'CPU'}",
-            gpu_used=use_gpu
+            message=(f"Model output could not be parsed; generated {len(mcqs)} placeholder questions" if fallback
+                     else f"Generated {len(mcqs)} questions using {'GPU' if use_gpu else 'CPU'}"),
+            gpu_used=use_gpu,
+            fallback=fallback
         )
     except Exception as e:
-        print(f"Error generating MCQs: {str(e)}")
+        log_event(logger, logging.ERROR, "generate_failed", file_id=request.file_id,
+                  segment_id=request.segment_id, error=str(e))
         return MCQResponse(
             success=False,
             mcqs=[],
@@ -72,26 +177,179 @@ async def create_mcqs(request: TranscriptRequest):
             gpu_used=False
         )
 
+@app.post("/generate/batch", response_model=BatchMCQResponse)
+async def create_mcqs_batch(request: BatchTranscriptRequest):
+    """
+    Generate MCQs for many transcript segments in one call.
+    
+    Items run concurrently, at most max_parallel at a time, and each one gets
+    its own result in request order so one failed segment doesn't fail the rest.
+    """
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+    
+    semaphore = asyncio.Semaphore(max(1, min(request.max_parallel or BATCH_MAX_PARALLEL, BATCH_MAX_PARALLEL)))
+    
+    async def run(item: TranscriptRequest) -> BatchItemResponse:
+        async with semaphore:
+            result = await create_mcqs(item)
+        return BatchItemResponse(file_id=item.file_id, segment_id=item.segment_id, **result.model_dump())
+    
+    results = await asyncio.gather(*(run(item) for item in request.items))
+    succeeded = sum(1 for result in results if result.success)
+    return BatchMCQResponse(
+        success=succeeded == len(results),
+        results=results,
+        succeeded=succeeded,
+        failed=len(results) - succeeded
+    )
+
+@app.post("/generate/stream")
+async def stream_mcqs(request: TranscriptRequest, format: str = "ndjson"):
+    """
+    Stream MCQs as they are generated, one event per question.
+    
+    Events are NDJSON lines by default or server-sent events with ?format=sse:
+    {"type": "mcq", ...} for each question, then {"type": "done", ...} or
+    {"type": "error", ...}. Closing the connection early cancels generation.
+    """
+    use_gpu = request.use_gpu and GPU_ENABLED
+    
+    async def events():
+        if not request.text or len(request.text.strip()) < 50:
+            yield {"type": "error", "message": "Transcript text is too short or empty"}
+            return
+        
+        started = time.perf_counter()
+        cached = cached_mcqs(request, STREAM_OUTPUT_MODE)
+        if cached is not None:
+            for index, mcq in enumerate(cached):
+                yield {"type": "mcq", "index": index, "mcq": mcq, "elapsed_seconds": 0.0}
+            yield {"type": "done", "count": len(cached), "elapsed_seconds": 0.0, "gpu_used": False, "cached": True,
+                   "fallback": False}
+            return
+        
+        mcqs = []
+        try:
+            async for mcq in astream_mcqs(request.text, request.num_questions,
+                                          model=request.model or DEFAULT_MODEL, use_gpu=use_gpu,
+                                          sticky_key=request.file_id):
+                mcqs.append(mcq)
+                yield {
+                    "type": "mcq",
+                    "index": len(mcqs) - 1,
+                    "mcq": mcq,
+                    "elapsed_seconds": round(time.perf_counter() - started, 3)
+                }
+        except Exception as e:
+            log_event(logger, logging.ERROR, "stream_failed", file_id=request.file_id,
+                      segment_id=request.segment_id, error=str(e))
+            yield {"type": "error", "message": f"Error generating MCQs: {str(e)}"}
+            return
+        
+        save_mcqs(request, mcqs, STREAM_OUTPUT_MODE)
+        yield {
+            "type": "done",
+            "count": len(mcqs),
+            "elapsed_seconds": round(time.perf_counter() - started, 3),
+            "gpu_used": use_gpu,
+            "cached": False,
+            "fallback": is_fallback(mcqs)
+        }
+    
+    async def body():
+        async for event in events():
+            if format == "sse":
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            else:
+                yield json.dumps(event) + "\n"
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+@app.get("/cache/stats")
+async def mcq_cache_stats():
+    """Hit rate, size and eviction counters of the MCQ cache"""
+    return {"enabled": MCQ_CACHE_ENABLED, **(get_cache().stats() if MCQ_CACHE_ENABLED else {})}
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint with GPU availability information"""
-    devices = get_available_devices()
+    pool = get_pool()
+    backends = pool.stats()
     return {
-        "status": "ok",
+        # Degraded once the last probe found every Ollama backend down
+        "status": "ok" if backends["healthy"] else "degraded",
         "gpu": {
             "enabled": GPU_ENABLED,
             "layers": GPU_LAYERS,
-            "available": devices.get("cuda_available", False) if devices.get("success") else False
+            # From Ollama's /api/ps: whether loaded models sit in VRAM (null until a model is loaded)
+            "available": pool.gpu_in_use()
         },
-        "model": DEFAULT_MODEL
+        "model": DEFAULT_MODEL,
+        "backends": backends,
+        "coalescing": generation_flight.stats(),
+        "event_loop": loop_lag.stats(),
+        "parsing": {"output_mode": MCQ_OUTPUT_MODE, "models": parse_stats.stats()}
     }
 
+@REGISTRY.collector
+def collect_service_metrics():
+    """Counters and gauges read from the stats the service already keeps, at scrape time"""
+    parsing = parse_stats.stats()
+    yield ("mcq_parse_outcomes_total", "counter",
+           "Model responses by how they became MCQs: schema, parser, fallback or failed",
+           [({"model": model, "outcome": outcome}, entry[outcome])
+            for model, entry in parsing.items() for outcome in parse_stats.OUTCOMES])
+    yield ("mcq_parser_paths_total", "counter", "Questions read by the text parser per path (line, json, json_repaired, json_rejected)",
+           [({"model": model, "path": path}, count)
+            for model, entry in parsing.items() for path, count in entry["parser_paths"].items()])
+    yield ("mcq_wasted_generation_seconds_total", "counter", "Generation time of responses that ended in fallback or failed",
+           [({"model": model}, entry["wasted_generation_seconds"]) for model, entry in parsing.items()])
+    
+    if MCQ_CACHE_ENABLED:
+        cache = get_cache().stats()
+        yield ("mcq_cache_lookups_total", "counter", "MCQ cache lookups by result",
+               [({"result": "memory_hit"}, cache["memory_hits"]), ({"result": "disk_hit"}, cache["disk_hits"]),
+                ({"result": "miss"}, cache["misses"]), ({"result": "bypassed"}, cache["bypassed"])])
+        yield ("mcq_cache_hit_ratio", "gauge", "Share of cache lookups served from the cache", [({}, cache["hit_rate"])])
+        yield ("mcq_cache_bytes", "gauge", "Bytes stored in the on-disk MCQ cache", [({}, cache["bytes"])])
+    
+    coalescing = generation_flight.stats()
+    yield ("mcq_generations_in_flight", "gauge", "Distinct generations running (after coalescing)",
+           [({}, coalescing["in_flight"])])
+    yield ("mcq_coalesced_requests_total", "counter", "Requests that shared a generation already in flight",
+           [({}, coalescing["coalesced"])])
+    
+    backends = get_pool().backends
+    yield ("ollama_requests_in_flight", "gauge", "Generations running on each backend",
+           [({"backend": backend.url}, backend.client.in_flight) for backend in backends])
+    yield ("ollama_requests_waiting", "gauge", "Generations queued for a slot on each backend",
+           [({"backend": backend.url}, backend.client.waiting) for backend in backends])
+    yield ("ollama_requests_total", "counter", "Generations completed by each backend",
+           [({"backend": backend.url}, backend.client.requests) for backend in backends])
+    yield ("ollama_request_errors_total", "counter", "Failed generations per backend",
+           [({"backend": backend.url}, backend.client.errors) for backend in backends])
+    yield ("ollama_backend_up", "gauge", "1 unless the last health probe failed or the circuit is open",
+           [({"backend": backend.url}, int(backend.available())) for backend in backends])
+    
+    lag = loop_lag.stats()
+    if lag["samples"]:
+        yield ("mcq_event_loop_lag_seconds", "gauge", "Event loop wake-up lag over recent samples",
+               [({"quantile": "0.5"}, round(lag["p50_ms"] / 1000, 6)), ({"quantile": "0.99"}, round(lag["p99_ms"] / 1000, 6)),
+                ({"quantile": "1"}, round(lag["max_ms"] / 1000, 6))])
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request, generation, parsing, cache and queue metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+ROUTE_PATHS = {route.path for route in app.routes}
+
 if __name__ == "__main__":
-    # Print GPU availability info at startup
-    devices = get_available_devices()
-    if devices["success"] and devices["cuda_available"]:
-        print(f"[GPU] CUDA acceleration is available! Using {GPU_LAYERS} layers on GPU.")
-    else:
-        print("[WARNING] CUDA acceleration not available or disabled. Using CPU only.")
-        
-    uvicorn.run(app, host="0.0.0.0", port=5001)
+    import uvicorn
+    
+    # GPU placement is Ollama's business; /health reports it from /api/ps once a model is loaded
+    log_event(logger, logging.INFO, "starting", port=API_PORT, model=DEFAULT_MODEL,
+              gpu_enabled=GPU_ENABLED, gpu_layers=GPU_LAYERS if GPU_ENABLED else 0)
+    uvicorn.run(app, host="0.0.0.0", port=API_PORT)
@@ -0,0 +1,240 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from typing import List, Dict, Any, Optional, Set
+import httpx
+from ollama_client import OllamaClient, base_url_from_api_url
+from config import OLLAMA_BACKENDS, OLLAMA_TIMEOUT
+from metrics import get_logger, log_event
+
+# Pool configuration - can be overridden with environment variables
+# Seconds between /api/tags probes of every backend, and how long one probe may take
+OLLAMA_HEALTH_INTERVAL = float(os.environ.get("OLLAMA_HEALTH_INTERVAL", "15"))
+OLLAMA_PROBE_TIMEOUT = float(os.environ.get("OLLAMA_PROBE_TIMEOUT", "3"))
+# A sticky request stays on its backend unless that has this many more requests outstanding than the least busy one
+OLLAMA_STICKY_MAX_EXTRA = int(os.environ.get("OLLAMA_STICKY_MAX_EXTRA", "2"))
+
+logger = get_logger("pool")
+
+
+def normalize_model(name: str) -> str:
+    """Ollama treats "llama3" and "llama3:latest" as the same model"""
+    return name if ":" in name else f"{name}:latest"
+
+
+def parse_backends(spec: str) -> List[Dict[str, Any]]:
+    """
+    Parse OLLAMA_BACKENDS: comma-separated URLs, each optionally followed by
+    "=" and the "|"-separated models it serves, e.g.
+    "http://gpu1:11434=gemma3:4b|llama3:8b,http://gpu2:11434".
+    """
+    backends = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        url, _, models = entry.partition("=")
+        backends.append({
+            "url": base_url_from_api_url(url.strip()),
+            "models": {normalize_model(model.strip()) for model in models.split("|") if model.strip()} or None,
+        })
+    return backends
+
+
+class Backend:
+    """One Ollama server in the pool, with what the last health probe found out about it"""
+
+    def __init__(self, url: str, models: Optional[Set[str]] = None, timeout: float = None):
+        self.url = url
+        self.client = OllamaClient(url, timeout=timeout or OLLAMA_TIMEOUT)
+        # Models from OLLAMA_BACKENDS; when not configured, the ones the backend reports
+        self.configured_models = models
+        self.reported_models: Optional[Set[str]] = None
+        # Models loaded right now (from /api/ps), which tells whether they run on the GPU
+        self.loaded_models: Optional[List[Dict[str, Any]]] = None
+        # Unknown until the first probe, and given the benefit of the doubt meanwhile
+        self.healthy: Optional[bool] = None
+        self.last_probe = None
+        self.probe_error = None
+        self.probe_seconds = None
+        self.routed = 0
+
+    @property
+    def models(self) -> Optional[Set[str]]:
+        return self.configured_models if self.configured_models is not None else self.reported_models
+
+    def serves(self, model: str) -> bool:
+        models = self.models
+        return models is None or normalize_model(model) in models
+
+    def available(self) -> bool:
+        return self.healthy is not False and self.client.breaker.allows_call()
+
+    def outstanding(self) -> int:
+        return self.client.in_flight + self.client.waiting
+
+    async def probe(self):
+        """Ask the backend which models it has and which are loaded; any valid answer marks it healthy"""
+        started = time.perf_counter()
+        was_healthy = self.healthy
+        try:
+            self.reported_models = {normalize_model(name) for name in await self.client.list_models(OLLAMA_PROBE_TIMEOUT)}
+            self.healthy = True
+            self.probe_error = None
+        except Exception as e:
+            # Anything unexpected (a body of the wrong shape included) counts against the backend
+            # rather than ending the probe loop
+            self.healthy = False
+            self.probe_error = str(e) or type(e).__name__
+        if self.healthy:
+            try:
+                self.loaded_models = await self.client.running_models(OLLAMA_PROBE_TIMEOUT)
+            except httpx.HTTPStatusError:
+                # Older Ollama versions have no /api/ps; that says nothing about health
+                self.loaded_models = None
+            except Exception as e:
+                self.loaded_models = None
+                log_event(logger, logging.WARNING, "ps_probe_failed", backend=self.url,
+                          error=str(e) or type(e).__name__)
+        if not self.healthy:
+            # Warn when a backend goes down; while it stays down, repeats are only worth a debug line
+            log_event(logger, logging.DEBUG if was_healthy is False else logging.WARNING, "probe_failed",
+                      backend=self.url, error=self.probe_error)
+        elif was_healthy is False:
+            log_event(logger, logging.INFO, "backend_recovered", backend=self.url)
+        self.probe_seconds = time.perf_counter() - started
+        self.last_probe = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "models": sorted(self.models) if self.models is not None else None,
+            "loaded": [
+                dict(model, gpu_fraction=round(model["size_vram"] / model["size"], 2) if model["size"] else None)
+                for model in self.loaded_models
+            ] if self.loaded_models is not None else None,
+            "outstanding": self.outstanding(),
+            "routed": self.routed,
+            "last_probe_age_seconds": round(time.time() - self.last_probe, 1) if self.last_probe else None,
+            "probe_seconds": round(self.probe_seconds, 3) if self.probe_seconds is not None else None,
+            "probe_error": self.probe_error,
+            "client": self.client.stats(),
+        }
+
+
+def _rendezvous_score(key: str, url: str) -> int:
+    return int.from_bytes(hashlib.sha1(f"{key}|{url}".encode("utf-8")).digest()[:8], "big")
+
+
+class BackendPool:
+    """
+    Routes generations over several Ollama backends.
+
+    Each request goes to the backend with the fewest outstanding requests
+    among the healthy ones that serve its model. A sticky key (the file id)
+    maps to a preferred backend by rendezvous hashing, so segments of one
+    file keep hitting the server whose KV cache already holds their prompt
+    prefix, unless that backend is clearly busier than the rest. Background
+    probes of /api/tags keep health and model lists current.
+    """
+
+    def __init__(self, spec: str = None, timeout: float = None):
+        self.backends = [Backend(entry["url"], entry["models"], timeout)
+                         for entry in parse_backends(spec or OLLAMA_BACKENDS)]
+        if not self.backends:
+            raise ValueError("OLLAMA_BACKENDS lists no backends")
+        self.sticky_hits = 0
+        self.sticky_spills = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def choose(self, model: str, sticky_key: Optional[str] = None) -> OllamaClient:
+        """Pick the client for the next generation with model"""
+        serving = [backend for backend in self.backends if backend.serves(model)]
+        if not serving:
+            raise ConnectionError(f"No Ollama backend serves model {model}")
+        # With every backend down, still route so the circuit breakers can fail fast or let a trial through
+        candidates = [backend for backend in serving if backend.available()] or serving
+
+        chosen = min(candidates, key=lambda backend: (backend.outstanding(), backend.routed))
+        if sticky_key:
+            preferred = max(candidates, key=lambda backend: _rendezvous_score(sticky_key, backend.url))
+            if preferred.outstanding() <= chosen.outstanding() + OLLAMA_STICKY_MAX_EXTRA:
+                self.sticky_hits += 1
+                chosen = preferred
+            else:
+                self.sticky_spills += 1
+        chosen.routed += 1
+        return chosen.client
+
+    async def probe_all(self):
+        results = await asyncio.gather(*(backend.probe() for backend in self.backends), return_exceptions=True)
+        for backend, result in zip(self.backends, results):
+            if isinstance(result, Exception):
+                log_event(logger, logging.ERROR, "probe_crashed", backend=backend.url,
+                          error=str(result) or type(result).__name__)
+
+    async def _probe_loop(self, interval: float):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception:
+                # A stopped loop would leave /health reporting the last probe forever
+                logger.exception("probe loop iteration failed")
+            await asyncio.sleep(interval)
+
+    def start_health_probes(self, interval: float = None):
+        """Probe every backend now and then every interval seconds, on the running loop"""
+        if self._probe_task is None:
+            self._probe_task = asyncio.ensure_future(self._probe_loop(interval or OLLAMA_HEALTH_INTERVAL))
+
+    async def aclose(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        for backend in self.backends:
+            await backend.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def gpu_in_use(self) -> Optional[bool]:
+        """Whether any loaded model sits (partly) in VRAM on any backend; None until one is loaded"""
+        loaded = [model for backend in self.backends for model in backend.loaded_models or []]
+        return any(model["size_vram"] > 0 for model in loaded) if loaded else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backends": {backend.url: backend.stats() for backend in self.backends},
+            "healthy": sum(1 for backend in self.backends if backend.healthy is not False),
+            "sticky_hits": self.sticky_hits,
+            "sticky_spills": self.sticky_spills,
+        }
+
+
+_default_pool = None
+
+
+def get_pool() -> BackendPool:
+    """
+    Return the process-wide pool, creating it on first use.
+
+    Its clients belong to the event loop that first used them, so the API
+    service shares it and closes it on shutdown; one-off callers should
+    create their own BackendPool instead.
+    """
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = BackendPool()
+    return _default_pool
+
+
+async def close_pool():
+    global _default_pool
+    if _default_pool is not None:
+        pool, _default_pool = _default_pool, None
+        await pool.aclose()
@@ -0,0 +1,111 @@
+"""
+Micro-benchmark of MCQ response parsing on large model outputs.
+
+Builds outputs of the given sizes from the seed corpus in corpus/ (repeated
+line-format questions, questions missing their Correct: lines, a long JSON
+array, JSON after a long prose preamble, and unparseable prose with stray
+braces) and times mcq_parser against the regex cascade it replaced. Prints a
+JSON report with MB/s and MCQs found.
+
+The old cascade backtracks super-linearly on questions without answers
+(seconds for a few KB, minutes beyond), so on that shape it is only timed on
+a --legacy-kb prefix.
+
+    python benchmarks/bench_mcq_parser.py --sizes 100 300 1000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcq_parser import parse_mcqs  # noqa: E402
+from legacy_mcq_parser import legacy_parse  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+# Shapes the legacy parser can't finish at full size in reasonable time
+SUPERLINEAR_SHAPES = {"line_format_unanswered"}
+
+
+def read_seed(name):
+    with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def repeat_to(text, size):
+    return (text * (size // len(text) + 1))[:size]
+
+
+def build_outputs(size):
+    """Model outputs of roughly size bytes in the shapes seen in practice"""
+    line_format = read_seed("line_format.txt")
+    unanswered = "\n".join(line for line in line_format.splitlines() if not line.startswith("Correct"))
+    question = json.loads(read_seed("json_array.txt"))[0]
+    item = json.dumps(question)
+    count = max(1, size // (len(item) + 2))
+    prose = "The transcript discusses membranes, transport and cell structure at length. "
+    return {
+        "line_format": line_format * max(1, size // len(line_format)),
+        "line_format_unanswered": repeat_to(unanswered, size),
+        "json_array": "[" + ", ".join([item] * count) + "]",
+        "json_after_prose": repeat_to(prose, size) + "\n" + json.dumps([question] * 5),
+        "prose_stray_braces": repeat_to(prose + "{set notation like {a, b} appears here} ", size),
+    }
+
+
+def best_of(func, text, repeats):
+    best = None
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MCQ response parsing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 1000], help="Output sizes in KB")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the new parser")
+    parser.add_argument("--legacy-kb", type=int, default=3,
+                        help="Prefix size the legacy parser gets on super-linear shapes")
+    args = parser.parse_args()
+
+    report = []
+    for size_kb in args.sizes:
+        for shape, text in build_outputs(size_kb * 1024).items():
+            megabytes = len(text) / 1e6
+            seconds, mcqs = best_of(parse_mcqs, text, args.repeats)
+            row = {
+                "shape": shape,
+                "kb": round(len(text) / 1024),
+                "seconds": round(seconds, 4),
+                "mb_per_second": round(megabytes / seconds, 2),
+                "mcqs": len(mcqs),
+            }
+            if not args.skip_legacy:
+                legacy_text = text
+                if shape in SUPERLINEAR_SHAPES:
+                    legacy_text = text[:args.legacy_kb * 1024]
+                    row["legacy_kb"] = round(len(legacy_text) / 1024)
+                legacy_seconds, legacy_mcqs = best_of(legacy_parse, legacy_text, args.repeats)
+                legacy_mb_per_second = len(legacy_text) / 1e6 / legacy_seconds
+                row.update({
+                    "legacy_seconds": round(legacy_seconds, 4),
+                    "legacy_mb_per_second": round(legacy_mb_per_second, 2),
+                    "legacy_mcqs": len(legacy_mcqs),
+                    "speedup": round(row["mb_per_second"] / legacy_mb_per_second, 2),
+                })
+            report.append(row)
+            print(json.dumps(row), file=sys.stderr)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Measure cold start and memory of the LLM API service, and print a JSON report.
+
+Each run is a fresh interpreter, as on a deploy or worker respawn:
+  import     time to import api_service, peak RSS after it, and whether
+             torch got pulled in (it must not)
+  serve      (--serve) time from launching uvicorn until /health answers,
+             and the server's RSS at that point (Linux only)
+One more import under -X importtime breaks the import down by the modules
+api_service imports directly, to show what a regression came from.
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --runs 3 --serve
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+LLM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import sys, json, time, resource
+started = time.perf_counter()
+import api_service
+seconds = time.perf_counter() - started
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# ru_maxrss is in KB on Linux and in bytes on macOS
+peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+print(json.dumps({"seconds": seconds, "peak_rss_mb": peak_mb, "torch_loaded": "torch" in sys.modules,
+                  "modules": len(sys.modules)}))
+"""
+
+
+def service_env():
+    # Per-request debug logging would only add noise
+    return dict(os.environ, DEBUG_MODE="0")
+
+
+def measure_import():
+    output = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=LLM_DIR, env=service_env(),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_breakdown(top):
+    """Cumulative import time (ms) of each module api_service imports directly, slowest first"""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import api_service"], cwd=LLM_DIR,
+                            env=service_env(), capture_output=True, text=True, check=True).stderr
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            # Names are indented two spaces per level after the separator's own space
+            entries.append(((len(name) - len(name.lstrip()) - 1) // 2, name.strip(), int(cumulative) / 1000))
+    # Lines come in post-order: a module's imports are listed right before it
+    end = max(index for index, (depth, name, _) in enumerate(entries) if depth == 0 and name == "api_service")
+    modules = []
+    for depth, name, ms in reversed(entries[:end]):
+        if depth == 0:
+            break
+        if depth == 1:
+            modules.append((name, ms))
+    modules.sort(key=lambda item: -item[1])
+    return {name: round(ms, 1) for name, ms in modules[:top]}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def measure_serve(timeout=120):
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_service:app", "--port", str(port), "--log-level", "warning"],
+        cwd=LLM_DIR, env=service_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"api_service exited with code {process.returncode}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    if response.status == 200:
+                        return {"seconds": time.perf_counter() - started, "rss_mb": rss_mb(process.pid)}
+            except OSError:
+                time.sleep(0.05)
+        raise RuntimeError(f"api_service did not answer /health within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def summarize(runs, key):
+    values = [run[key] for run in runs if run.get(key) is not None]
+    if not values:
+        return None
+    return {"median": round(statistics.median(values), 3), "min": round(min(values), 3),
+            "max": round(max(values), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark api_service import time and memory")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--serve", action="store_true", help="Also time uvicorn start until /health answers")
+    parser.add_argument("--top", type=int, default=8, help="Modules listed in the import breakdown")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    report = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "import": {
+            "seconds": summarize(imports, "seconds"),
+            "peak_rss_mb": summarize(imports, "peak_rss_mb"),
+            "modules_loaded": imports[-1]["modules"],
+            "torch_loaded": any(run["torch_loaded"] for run in imports),
+        },
+        "import_breakdown_ms": import_breakdown(args.top),
+    }
+    if args.serve:
+        serves = [measure_serve() for _ in range(args.runs)]
+        report["serve"] = {"seconds_to_health": summarize(serves, "seconds"), "rss_mb": summarize(serves, "rss_mb")}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
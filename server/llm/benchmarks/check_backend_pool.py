@@ -0,0 +1,156 @@
+"""
+Exercise BackendPool routing against several fake_ollama.py servers and
+print a JSON report.
+
+Scenarios:
+  load_spread         unsticky requests spread over equal backends by
+                      least outstanding requests
+  stickiness          segments of one file land on the same backend, and
+                      spill over when it is much busier than the others
+  model_availability  models are only sent to backends that have them,
+                      and a model nobody serves fails at once
+  unhealthy_backend   after a backend stops, the probe marks it down and
+                      requests go to the rest without errors
+
+    python benchmarks/check_backend_pool.py --backends 3 --requests 60
+"""
+import os
+import sys
+import json
+import asyncio
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_ollama  # noqa: E402
+from backend_pool import BackendPool  # noqa: E402
+
+MODEL = "gemma3:4b"
+
+
+async def routed_call(pool, model=MODEL, sticky_key=None):
+    """One generation through the pool; returns the backend it went to and the error, if any"""
+    try:
+        client = pool.choose(model, sticky_key)
+    except ConnectionError as e:
+        return None, type(e).__name__
+    try:
+        await client.generate({"model": model, "prompt": "Generate questions", "stream": False})
+        return client.base_url, None
+    except Exception as e:
+        return client.base_url, type(e).__name__
+
+
+async def run_load(pool, calls, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(call):
+        async with semaphore:
+            return await call()
+
+    return await asyncio.gather(*(one(call) for call in calls))
+
+
+def spec_for(servers, models=None):
+    return ",".join(server.url + (f"={'|'.join(models[index])}" if models and models[index] else "")
+                    for index, server in enumerate(servers))
+
+
+async def load_spread(servers, requests):
+    async with BackendPool(spec_for(servers)) as pool:
+        results = await run_load(pool, [lambda: routed_call(pool)] * requests, 4 * len(servers))
+        return {"per_backend": dict(Counter(url for url, _ in results)),
+                "errors": sum(1 for _, error in results if error)}
+
+
+async def stickiness(servers, files, segments):
+    async with BackendPool(spec_for(servers)) as pool:
+        # One segment at a time: nothing is busy, so every file should stay on its backend
+        placements = {}
+        for file_index in range(files):
+            for _ in range(segments):
+                url, _ = await routed_call(pool, sticky_key=f"file-{file_index}")
+                placements.setdefault(file_index, set()).add(url)
+        quiet = {
+            "files_on_one_backend": sum(1 for urls in placements.values() if len(urls) == 1),
+            "files": files,
+            "backends_used": len(set().union(*placements.values())),
+        }
+
+        # Every segment of one file at once: its backend fills up and the rest spill over
+        hits, spills = pool.sticky_hits, pool.sticky_spills
+        results = await run_load(pool, [lambda: routed_call(pool, sticky_key="busy-file")] * (4 * len(servers)),
+                                 4 * len(servers))
+        busy = {
+            "per_backend": dict(Counter(url for url, _ in results)),
+            "sticky_hits": pool.sticky_hits - hits,
+            "sticky_spills": pool.sticky_spills - spills,
+        }
+        return {"sequential": quiet, "burst": busy}
+
+
+async def model_availability(servers):
+    # The last server only has llama3:8b; the others report gemma3:4b via /api/tags
+    servers[-1].settings["models"] = ["llama3:8b"]
+    try:
+        async with BackendPool(spec_for(servers)) as pool:
+            await pool.probe_all()
+            gemma = await run_load(pool, [lambda: routed_call(pool)] * 12, 6)
+            llama = await run_load(pool, [lambda: routed_call(pool, "llama3:8b")] * 6, 3)
+            missing = await routed_call(pool, "mistral:7b")
+            return {
+                "reported_models": {backend.url: sorted(backend.models) for backend in pool.backends},
+                "gemma3_per_backend": dict(Counter(url for url, _ in gemma)),
+                "llama3_per_backend": dict(Counter(url for url, _ in llama)),
+                "errors": sum(1 for _, error in gemma + llama if error),
+                "unserved_model_error": missing[1],
+            }
+    finally:
+        servers[-1].settings["models"] = [MODEL]
+
+
+async def unhealthy_backend(servers, requests):
+    survivors, victim = servers[:-1], fake_ollama.start(delay=0.05)
+    async with BackendPool(spec_for(survivors + [victim])) as pool:
+        await pool.probe_all()
+        victim.stop()
+        await pool.probe_all()
+        results = await run_load(pool, [lambda: routed_call(pool)] * requests, 2 * len(servers))
+        return {
+            "healthy": {backend.url: backend.healthy for backend in pool.backends},
+            "stopped_backend_requests": sum(1 for url, _ in results if url == victim.url),
+            "per_backend": dict(Counter(url for url, _ in results)),
+            "errors": sum(1 for _, error in results if error),
+        }
+
+
+async def main_async(args):
+    servers = [fake_ollama.start(delay=args.delay, jitter=args.delay / 4) for _ in range(args.backends)]
+    try:
+        return {
+            "backends": [server.url for server in servers],
+            "load_spread": await load_spread(servers, args.requests),
+            "stickiness": await stickiness(servers, args.files, 3),
+            "model_availability": await model_availability(servers),
+            "unhealthy_backend": await unhealthy_backend(servers, args.requests),
+        }
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check multi-backend routing against fake Ollama servers")
+    parser.add_argument("--backends", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=60, help="Requests per load scenario")
+    parser.add_argument("--files", type=int, default=12, help="Files in the stickiness scenario")
+    parser.add_argument("--delay", type=float, default=0.05, help="Fake generation time, seconds")
+    args = parser.parse_args()
+    if args.backends < 2:
+        parser.error("--backends must be at least 2")
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
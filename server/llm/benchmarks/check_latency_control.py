@@ -0,0 +1,146 @@
+"""
+Exercise adaptive timeouts, hedged requests and the circuit breaker of
+OllamaClient against fake_ollama.py, and print a JSON report.
+
+Scenarios:
+  adaptive_timeout  after warm-up on a fast backend, a hung generation fails
+                    after the adaptive timeout instead of the OLLAMA_TIMEOUT ceiling,
+                    without tripping the breaker, and the timeout grows afterwards
+  hedging           latency percentiles with a fraction of slow responses,
+                    without and with hedging
+  circuit_breaker   a failing backend trips the breaker, later calls fail
+                    fast, and a trial call closes it again once it recovers
+
+    python benchmarks/check_latency_control.py --requests 200
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+# Short floors and reset periods so the scenarios finish in seconds
+os.environ.setdefault("OLLAMA_ADAPTIVE_TIMEOUT_FLOOR", "1")
+os.environ.setdefault("OLLAMA_BREAKER_RESET_SECONDS", "1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fake_ollama  # noqa: E402
+from ollama_client import OllamaClient  # noqa: E402
+from latency_control import CircuitOpenError, percentile  # noqa: E402
+
+MODEL = "gemma3:4b"
+PARAMS = {"model": MODEL, "prompt": "Generate questions", "stream": False}
+
+
+async def timed_call(client):
+    started = time.perf_counter()
+    try:
+        await client.generate(PARAMS)
+        return time.perf_counter() - started, None
+    except Exception as e:
+        return time.perf_counter() - started, type(e).__name__
+
+
+async def run_load(client, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            return await timed_call(client)
+
+    return await asyncio.gather(*(one() for _ in range(requests)))
+
+
+def summarize(results):
+    latencies = sorted(seconds for seconds, error in results if error is None)
+    return {
+        "ok": len(latencies),
+        "errors": len(results) - len(latencies),
+        "p50": round(percentile(latencies, 0.5), 3) if latencies else None,
+        "p95": round(percentile(latencies, 0.95), 3) if latencies else None,
+        "p99": round(percentile(latencies, 0.99), 3) if latencies else None,
+    }
+
+
+async def adaptive_timeout(server, ceiling):
+    server.settings.update(delay=0.05, jitter=0.05, hang_rate=0.0)
+    async with OllamaClient(server.url, max_concurrency=4, timeout=ceiling) as client:
+        await run_load(client, 30, 4)
+        adaptive = client.latency.timeout_for(MODEL)
+        server.settings["hang_rate"] = 1.0
+        seconds, error = await timed_call(client)
+        server.settings["hang_rate"] = 0.0
+        return {
+            "ceiling": ceiling,
+            "adaptive_timeout": adaptive,
+            "hung_call_seconds": round(seconds, 3),
+            "hung_call_error": error,
+            # The kill is recorded at its deadline, so the timeout can grow back toward the ceiling
+            "timeout_after_kill": client.latency.timeout_for(MODEL),
+            "breaker_after_kill": client.breaker.state,
+        }
+
+
+async def hedging(server, requests):
+    # Slow responses stay under the adaptive timeout, so only hedging can cut them short
+    server.settings.update(delay=0.05, jitter=0.02, slow_rate=0.05, slow_delay=0.6)
+    report = {}
+    for hedge in (False, True):
+        async with OllamaClient(server.url, max_concurrency=8, timeout=30) as client:
+            client.latency.hedge = hedge
+            # Warm-up gives the tracker enough samples for a p95
+            await run_load(client, 30, 4)
+            results = await run_load(client, requests, 4)
+            report["hedged" if hedge else "unhedged"] = dict(
+                summarize(results), hedges=client.hedges, hedge_wins=client.hedge_wins)
+    server.settings.update(slow_rate=0.0)
+    return report
+
+
+async def circuit_breaker(server):
+    server.settings.update(delay=0.05, error_rate=1.0)
+    async with OllamaClient(server.url, timeout=30) as client:
+        requests_before = server.requests
+        results = [await timed_call(client) for _ in range(10)]
+        reached_backend = server.requests - requests_before
+        rejected = [seconds for seconds, error in results if error == CircuitOpenError.__name__]
+        state_when_failing = client.breaker.state
+
+        server.settings["error_rate"] = 0.0
+        await asyncio.sleep(client.breaker.reset_seconds)
+        recovery = await timed_call(client)
+        return {
+            "calls": len(results),
+            "reached_backend": reached_backend,
+            "rejected_fast": len(rejected),
+            "max_rejection_seconds": round(max(rejected), 4) if rejected else None,
+            "state_while_failing": state_when_failing,
+            "recovery_error": recovery[1],
+            "state_after_recovery": client.breaker.state,
+        }
+
+
+async def main_async(args):
+    server = fake_ollama.start()
+    try:
+        return {
+            "adaptive_timeout": await adaptive_timeout(server, args.ceiling),
+            "hedging": await hedging(server, args.requests),
+            "circuit_breaker": await circuit_breaker(server),
+        }
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check LLM tail-latency controls against a fake Ollama")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per hedging run")
+    parser.add_argument("--ceiling", type=float, default=20.0, help="Static timeout the adaptive one improves on")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
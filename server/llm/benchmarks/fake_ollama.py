@@ -0,0 +1,253 @@
+"""
+Stand-in for an Ollama server, for exercising the LLM service without a GPU.
+
+Serves /api/generate (streaming and not), /api/tags and /api/ps with canned
+MCQ output, timed like a real model: a first-token latency, then tokens at
+a fixed rate, with Ollama's eval/prompt_eval/load durations in the final
+response. Injects faults: jitter, a fraction of slow responses, responses
+that hang until the client gives up, HTTP 500s and malformed output.
+
+    python benchmarks/fake_ollama.py --port 11434 --delay 0.5 --slow-rate 0.05 --slow-delay 5
+    python benchmarks/fake_ollama.py --first-token-latency 0.3 --tokens-per-second 40 --malformed-rate 0.02
+
+Scripts can also run it in-process with start(port, **settings) and change
+the settings on the returned server between scenarios.
+"""
+import re
+import json
+import time
+import socket
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CANNED_MCQS = [
+    {
+        "question": f"Which statement about the cell membrane is correct ({index + 1})?",
+        "options": ["It is made of cellulose", "It is a lipid bilayer with proteins",
+                    "It stores genetic material", "It produces ATP"],
+        "correct": 1,
+    }
+    for index in range(10)
+]
+
+DEFAULT_SETTINGS = {
+    "delay": 0.2,               # first-token latency (prompt evaluation), seconds
+    "jitter": 0.0,              # extra uniform random delay, seconds
+    "slow_rate": 0.0,           # fraction of requests delayed by slow_delay instead
+    "slow_delay": 5.0,
+    "tokens_per_second": 0.0,   # output rate after the first token; 0 sends all tokens at once
+    "hang_rate": 0.0,           # fraction of requests that never answer
+    "error_rate": 0.0,          # fraction of requests answered with HTTP 500
+    "malformed_rate": 0.0,      # fraction of responses that contain no usable questions
+    "gpu_fraction": 1.0,        # share of each model /api/ps reports as loaded into VRAM
+    "models": ["gemma3:4b"],
+}
+
+# Roughly one model token per word (with its trailing whitespace)
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+QUESTION_COUNT = re.compile(r"create (\d+) multiple-choice")
+
+
+def canned_response(body, malformed=False):
+    """Answer in the shape the request asked for: schema JSON or the line format"""
+    match = QUESTION_COUNT.search(body.get("prompt", ""))
+    count = min(len(CANNED_MCQS), int(match.group(1))) if match else 5
+    if malformed:
+        # What a confused or cut-off model sends: the parser finds nothing and the service falls back
+        if body.get("format"):
+            return json.dumps({"questions": CANNED_MCQS[:count]})[:40]
+        return "I'm sorry, but the transcript does not contain enough information to write questions about."
+    if body.get("format"):
+        return json.dumps({"questions": CANNED_MCQS[:count]})
+    return "".join(
+        f"Q: {mcq['question']}\n" + "".join(f"{'ABCD'[i]}: {option}\n" for i, option in enumerate(mcq["options"]))
+        + f"Correct: {'ABCD'[mcq['correct']]}\n\n"
+        for mcq in CANNED_MCQS[:count]
+    )
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def settings(self):
+        return self.server.settings
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up waiting (timeout or a cancelled hedge)
+            pass
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": name, "model": name} for name in self.settings["models"]]})
+        elif self.path == "/api/ps":
+            size = 3_300_000_000
+            self._send_json(200, {"models": [
+                {"name": name, "model": name, "size": size, "size_vram": int(size * self.settings["gpu_fraction"])}
+                for name in self.settings["models"]
+            ]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        if body.get("model") not in self.settings["models"]:
+            self._send_json(404, {"error": f"model '{body.get('model')}' not found"})
+            return
+
+        with self.server.lock:
+            self.server.requests += 1
+        settings = self.settings
+        roll = random.random()
+        if roll < settings["hang_rate"]:
+            # Hold the connection until the client disconnects or the server stops
+            self.server.stopping.wait()
+            return
+        roll -= settings["hang_rate"]
+        if roll < settings["error_rate"]:
+            self._send_json(500, {"error": "injected failure"})
+            return
+        roll -= settings["error_rate"]
+        delay = settings["slow_delay"] if roll < settings["slow_rate"] else settings["delay"]
+        delay += random.uniform(0, settings["jitter"])
+
+        tokens = TOKEN_PATTERN.findall(canned_response(body, random.random() < settings["malformed_rate"]))
+        token_seconds = 1 / settings["tokens_per_second"] if settings["tokens_per_second"] > 0 else 0.0
+        if body.get("stream", True):
+            self._stream(body, tokens, delay, token_seconds)
+        else:
+            started = time.perf_counter()
+            time.sleep(delay)
+            prompt_done = time.perf_counter()
+            time.sleep(token_seconds * len(tokens))
+            self._send_json(200, dict(
+                {"model": body["model"], "response": "".join(tokens), "done": True},
+                **self._durations(body, tokens, started, prompt_done),
+            ))
+
+    def _durations(self, body, tokens, started, prompt_done):
+        """The timing fields Ollama adds to its final response, in nanoseconds"""
+        finished = time.perf_counter()
+        return {
+            "total_duration": int((finished - started) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": len(TOKEN_PATTERN.findall(body.get("prompt", ""))),
+            "prompt_eval_duration": int((prompt_done - started) * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int((finished - prompt_done) * 1e9),
+        }
+
+    def _stream(self, body, tokens, delay, token_seconds):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        started = time.perf_counter()
+        try:
+            time.sleep(delay)
+            prompt_done = time.perf_counter()
+            for token in tokens:
+                self._chunk({"model": body["model"], "response": token, "done": False})
+                time.sleep(token_seconds)
+            self._chunk(dict({"model": body["model"], "response": "", "done": True},
+                             **self._durations(body, tokens, started, prompt_done)))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading; a real server would stop generating here too
+            pass
+
+    def _chunk(self, payload):
+        line = (json.dumps(payload) + "\n").encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, **settings):
+        super().__init__(("127.0.0.1", port), FakeOllamaHandler)
+        self.settings = dict(DEFAULT_SETTINGS, **settings)
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.requests = 0
+        self.connections = set()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def get_request(self):
+        connection, address = super().get_request()
+        with self.lock:
+            self.connections.add(connection)
+        return connection, address
+
+    def shutdown_request(self, request):
+        with self.lock:
+            self.connections.discard(request)
+        super().shutdown_request(request)
+
+    def stop(self):
+        self.stopping.set()
+        self.shutdown()
+        self.server_close()
+        # Drop keep-alive connections too, like a server process that went away
+        with self.lock:
+            connections, self.connections = self.connections, set()
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+def start(port=0, **settings):
+    """Run a fake server on a background thread (port 0 picks a free port)"""
+    server = FakeOllamaServer(port, **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server with fault injection")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--delay", "--first-token-latency", dest="delay", type=float, default=DEFAULT_SETTINGS["delay"])
+    parser.add_argument("--jitter", type=float, default=DEFAULT_SETTINGS["jitter"])
+    parser.add_argument("--slow-rate", type=float, default=DEFAULT_SETTINGS["slow_rate"])
+    parser.add_argument("--slow-delay", type=float, default=DEFAULT_SETTINGS["slow_delay"])
+    parser.add_argument("--tokens-per-second", type=float, default=DEFAULT_SETTINGS["tokens_per_second"])
+    parser.add_argument("--hang-rate", type=float, default=DEFAULT_SETTINGS["hang_rate"])
+    parser.add_argument("--error-rate", type=float, default=DEFAULT_SETTINGS["error_rate"])
+    parser.add_argument("--malformed-rate", type=float, default=DEFAULT_SETTINGS["malformed_rate"])
+    parser.add_argument("--gpu-fraction", type=float, default=DEFAULT_SETTINGS["gpu_fraction"])
+    parser.add_argument("--models", nargs="+", default=DEFAULT_SETTINGS["models"])
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.port, **{key: value for key, value in vars(args).items() if key != "port"})
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Fuzz mcq_parser with mutations of the seed corpus in corpus/.
+
+Each round picks a seed, applies a few random edits (deleting, duplicating
+or truncating spans, inserting stray braces, quotes and labels) and checks
+that the parser never raises, returns well-formed MCQ dicts, gives the same
+result when the text arrives in small streamed chunks, and stays linear in
+time: parsing the mutated text repeated 4x as often may take at most
+--max-growth times as long. Well-formed seeds are also compared against
+the legacy regex cascade.
+
+    python benchmarks/fuzz_mcq_parser.py --rounds 2000 --seed 1
+"""
+import os
+import sys
+import glob
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcq_parser import MCQParser, parse_mcqs  # noqa: E402
+from legacy_mcq_parser import legacy_parse  # noqa: E402
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+# Fragments that tend to confuse a parser
+NOISE = ["{", "}", "[", "]", '"', "'", "\\", ",", "\n", "Q:", "A:", "Correct:", "**", "```json\n",
+         '{"question": ', "'options': [", "True", "null", "\n\n", " " * 40]
+
+# Seeds both parsers should agree on exactly
+AGREEING_SEEDS = ["line_format.txt", "question_answer.txt", "json_array.txt"]
+
+
+def load_corpus():
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            corpus[os.path.basename(path)] = f.read()
+    return corpus
+
+
+def mutate(text, rng):
+    for _ in range(rng.randint(1, 4)):
+        if not text:
+            break
+        start = rng.randrange(len(text))
+        end = min(len(text), start + rng.randint(1, 40))
+        action = rng.random()
+        if action < 0.25:
+            text = text[:start] + text[end:]
+        elif action < 0.45:
+            text = text[:end] + text[start:end] + text[end:]
+        elif action < 0.55:
+            text = text[:start]
+        else:
+            text = text[:start] + rng.choice(NOISE) + text[start:]
+    return text
+
+
+def parse_streamed(text, rng):
+    parser = MCQParser()
+    mcqs = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 12)
+        mcqs += parser.feed(text[position:position + size])
+        position += size
+    return mcqs + parser.finish()
+
+
+def check_shape(mcqs):
+    for mcq in mcqs:
+        assert isinstance(mcq, dict), mcq
+        assert isinstance(mcq["question"], str), mcq
+        assert isinstance(mcq["options"], list), mcq
+        assert isinstance(mcq["correct"], int) and not isinstance(mcq["correct"], bool), mcq
+
+
+def best_seconds(text, repeats=5):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        parse_mcqs(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def growth(text, size=200_000):
+    """How much longer a 4x larger input takes; about 4 when parsing is linear"""
+    small = text * max(1, size // len(text))
+    small_seconds = best_seconds(small)
+    if small_seconds < 0.001:
+        # Too fast to time reliably; memory effects dominate
+        return None
+    return best_seconds(small * 4) / small_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz the MCQ response parser")
+    parser.add_argument("--rounds", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-growth", type=float, default=8.0,
+                        help="Largest allowed time ratio for a 4x larger input")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus()
+
+    for name in AGREEING_SEEDS:
+        assert parse_mcqs(corpus[name]) == legacy_parse(corpus[name]), f"{name}: differs from legacy parser"
+
+    failures = 0
+    worst = 0.0
+    for round_number in range(args.rounds):
+        name = rng.choice(sorted(corpus))
+        text = mutate(corpus[name], rng)
+        try:
+            mcqs = parse_mcqs(text)
+            check_shape(mcqs)
+            assert parse_streamed(text, rng) == mcqs, "streamed parse differs from whole-text parse"
+            if round_number % 50 == 0 and text:
+                ratio = growth(text)
+                if ratio is not None:
+                    worst = max(worst, ratio)
+                    assert ratio < args.max_growth, f"4x the input took {ratio:.1f}x as long"
+        except Exception as e:
+            failures += 1
+            print(f"round {round_number} ({name}): {type(e).__name__}: {e}\n{text!r}\n")
+
+    print(f"{args.rounds} rounds, {failures} failures, worst 4x-input time ratio {worst:.1f}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
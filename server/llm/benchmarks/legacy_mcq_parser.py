@@ -0,0 +1,77 @@
+"""
+The regex cascade ollama_service used before mcq_parser, kept as the
+baseline for bench_mcq_parser.py and fuzz_mcq_parser.py.
+
+legacy_parse returns the MCQs the old extract_mcqs found before validation,
+or [] where it would have fallen back to generated questions.
+"""
+import re
+import json
+from typing import List, Dict, Any
+
+JSON_PATTERNS = [
+    r'\[\s*{.+}\s*\]',  # Standard JSON array pattern
+    r'{.+}',               # Single JSON object
+    r'\[\s*\{"question":.+\}\s*\]'  # Specific MCQ JSON pattern
+]
+
+
+def parse_mcqs_from_text(text: str) -> List[Dict[str, Any]]:
+    question_blocks = re.findall(
+        r'Q:(.+?)(?:\n|\r\n)A:(.+?)(?:\n|\r\n)B:(.+?)(?:\n|\r\n)C:(.+?)(?:\n|\r\n)D:(.+?)(?:\n|\r\n)Correct:(.+?)(?:\n|\r\n|$)',
+        text,
+        re.DOTALL
+    )
+    if not question_blocks:
+        question_blocks = re.findall(
+            r'Question:(.+?)(?:\n|\r\n)A[).](.+?)(?:\n|\r\n)B[).](.+?)(?:\n|\r\n)C[).](.+?)(?:\n|\r\n)D[).](.+?)(?:\n|\r\n)(?:Correct Answer:|Answer:)(.+?)(?:\n|\r\n|$)',
+            text,
+            re.DOTALL
+        )
+
+    correct_map = {"A": 0, "B": 1, "C": 2, "D": 3}
+    return [{
+        "question": block[0].strip(),
+        "options": [opt.strip() for opt in block[1:5]],
+        "correct": correct_map.get(block[5].strip().upper(), 0),
+    } for block in question_blocks]
+
+
+def fix_json_syntax(text: str) -> str:
+    text = re.sub(r"'([^']*)'", r'"\1"', text)
+    text = re.sub(r'}\s*{', '}, {', text)
+    text = re.sub(r',\s*]', ']', text)
+    if not text.strip().startswith('['):
+        text = '[' + text
+    if not text.strip().endswith(']'):
+        text = text + ']'
+    return text
+
+
+def _search(text: str):
+    for pattern in JSON_PATTERNS:
+        match = re.search(pattern, text, re.DOTALL)
+        if match:
+            return match.group(0)
+    return None
+
+
+def legacy_parse(text: str) -> List[Dict[str, Any]]:
+    mcqs = parse_mcqs_from_text(text)
+    if mcqs:
+        return mcqs
+
+    json_str = _search(text) or _search(fix_json_syntax(text))
+    if not json_str:
+        return parse_mcqs_from_text(text)
+
+    try:
+        if json_str.strip()[0] != '[':
+            json_str = f"[{json_str}]"
+        mcqs = json.loads(json_str)
+    except json.JSONDecodeError:
+        try:
+            mcqs = json.loads(json_str.replace("'\n", "\n").replace("'", "\""))
+        except Exception:
+            return parse_mcqs_from_text(text)
+    return [mcqs] if isinstance(mcqs, dict) else mcqs
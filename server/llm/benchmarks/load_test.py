@@ -0,0 +1,237 @@
+"""
+Drive api_service at a target request rate and report what it sustains.
+
+By default everything runs locally and offline: fake_ollama.py servers
+stand in for Ollama and api_service is started under uvicorn against them,
+so any change to ollama_service can be measured on a laptop. With --url an
+already running api_service (and whatever backends it uses) is tested
+instead.
+
+Requests are sent open-loop: one every 1/--rps seconds, whether or not
+earlier ones have finished, with at most --concurrency outstanding. Each
+carries a distinct transcript and bypass_cache so neither the MCQ cache nor
+request coalescing hides the model. The report has throughput, latency
+percentiles (time to first question too with --stream), how far sending
+fell behind schedule, the fallback rate from the service's parse outcomes
+and the service's event loop lag.
+
+    python benchmarks/load_test.py --rps 8 --concurrency 32 --duration 30
+    python benchmarks/load_test.py --tokens-per-second 40 --first-token-latency 0.3 --malformed-rate 0.05
+    python benchmarks/load_test.py --stream --backends 2
+    python benchmarks/load_test.py --url http://127.0.0.1:5001 --rps 2
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+import httpx
+
+LLM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LLM_DIR)
+
+import fake_ollama  # noqa: E402
+from latency_control import percentile  # noqa: E402
+
+LECTURE = (
+    "Lecture {index}. The cell membrane is a lipid bilayer with embedded proteins that controls what "
+    "enters and leaves the cell. Channel proteins let ions pass down their gradient, while pumps such as "
+    "the sodium potassium pump use ATP to move ions against it. Cholesterol keeps the membrane fluid "
+    "across temperatures, and glycoproteins on the surface take part in cell recognition. "
+)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def transcript(index: int, words: int) -> str:
+    paragraph = LECTURE.format(index=index)
+    repeats = max(1, words // len(paragraph.split()))
+    return paragraph * repeats
+
+
+def summarize(seconds):
+    ordered = sorted(seconds)
+    if not ordered:
+        return None
+    return {
+        "p50": round(percentile(ordered, 0.5), 3),
+        "p95": round(percentile(ordered, 0.95), 3),
+        "p99": round(percentile(ordered, 0.99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def parse_outcomes(health):
+    """Sum parse outcomes over models from /health"""
+    totals = {}
+    for entry in health.get("parsing", {}).get("models", {}).values():
+        for outcome in ("responses", "schema", "parser", "fallback", "failed"):
+            totals[outcome] = totals.get(outcome, 0) + entry.get(outcome, 0)
+    return totals
+
+
+class LocalStack:
+    """fake_ollama backends plus an api_service under uvicorn, all on free local ports"""
+
+    def __init__(self, args):
+        self.backends = [
+            fake_ollama.start(
+                delay=args.first_token_latency, jitter=args.jitter,
+                tokens_per_second=args.tokens_per_second, malformed_rate=args.malformed_rate,
+            )
+            for _ in range(args.backends)
+        ]
+        self.url = f"http://127.0.0.1:{free_port()}"
+        env = dict(
+            os.environ,
+            OLLAMA_BACKENDS=",".join(server.url for server in self.backends),
+            DEBUG_MODE="0",
+            MCQ_CACHE_ENABLED="0",
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api_service:app",
+             "--port", self.url.rsplit(":", 1)[1], "--log-level", "warning"],
+            cwd=LLM_DIR, env=env, stdout=subprocess.DEVNULL,
+        )
+
+    async def wait_ready(self, timeout: float = 120):
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient() as client:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"api_service exited with code {self.process.returncode}")
+                try:
+                    if (await client.get(self.url + "/health")).status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.2)
+        raise RuntimeError(f"api_service did not come up within {timeout:.0f}s")
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        for server in self.backends:
+            server.stop()
+
+
+async def one_request(client, args, index, scheduled):
+    """Send one request; returns (start lag, latency, time to first question, ok)"""
+    sent = time.perf_counter()
+    payload = {
+        "text": transcript(index, args.transcript_words),
+        "num_questions": args.num_questions,
+        "file_id": f"load-{index % args.files}",
+        "bypass_cache": True,
+    }
+    first = None
+    try:
+        if args.stream:
+            ok = False
+            async with client.stream("POST", "/generate/stream", json=payload) as response:
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if event["type"] == "mcq" and first is None:
+                        first = time.perf_counter() - sent
+                    ok = event["type"] == "done"
+        else:
+            response = await client.post("/generate", json=payload)
+            ok = response.status_code == 200 and response.json().get("success", False)
+    except (httpx.HTTPError, ValueError):
+        ok = False
+    return sent - scheduled, time.perf_counter() - sent, first, ok
+
+
+async def run_load(args, url):
+    total = args.requests or max(1, int(args.rps * args.duration))
+    semaphore = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=args.timeout, limits=limits) as client:
+        before = parse_outcomes((await client.get("/health")).json())
+
+        async def scheduled(index, at):
+            await asyncio.sleep(max(0.0, at - time.perf_counter()))
+            async with semaphore:
+                return await one_request(client, args, index, at)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(scheduled(index, started + index / args.rps) for index in range(total)))
+        elapsed = time.perf_counter() - started
+
+        health = (await client.get("/health")).json()
+    after = parse_outcomes(health)
+    outcomes = {name: after.get(name, 0) - before.get(name, 0) for name in after}
+
+    completed = [latency for _, latency, _, ok in results if ok]
+    return {
+        "requests": total,
+        "completed": len(completed),
+        "errors": total - len(completed),
+        "elapsed_seconds": round(elapsed, 2),
+        "target_rps": args.rps,
+        "throughput_rps": round(len(completed) / elapsed, 2),
+        "latency_seconds": summarize(completed),
+        "first_mcq_seconds": summarize([first for _, _, first, ok in results if ok and first is not None])
+        if args.stream else None,
+        # Sending behind schedule means the concurrency cap was reached: the service is saturated
+        "send_lag_seconds": summarize([lag for lag, _, _, _ in results]),
+        "fallback_rate": round(outcomes.get("fallback", 0) / outcomes["responses"], 3)
+        if outcomes.get("responses") else None,
+        "parse_outcomes": outcomes,
+        "event_loop": health.get("event_loop"),
+    }
+
+
+async def main_async(args):
+    stack = None
+    url = args.url
+    if url is None:
+        stack = LocalStack(args)
+        url = stack.url
+    try:
+        if stack is not None:
+            await stack.wait_ready()
+        report = await run_load(args, url)
+    finally:
+        if stack is not None:
+            stack.stop()
+    report["config"] = {key: value for key, value in vars(args).items()}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test api_service against fake or real Ollama backends")
+    parser.add_argument("--url", help="Test a running api_service instead of starting one with fake backends")
+    parser.add_argument("--rps", type=float, default=4.0, help="Target requests per second")
+    parser.add_argument("--concurrency", type=int, default=32, help="Most requests outstanding at once")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds of load (unless --requests)")
+    parser.add_argument("--requests", type=int, help="Total requests to send")
+    parser.add_argument("--stream", action="store_true", help="Use /generate/stream instead of /generate")
+    parser.add_argument("--num-questions", type=int, default=5)
+    parser.add_argument("--transcript-words", type=int, default=300)
+    parser.add_argument("--files", type=int, default=8, help="Distinct file_ids the requests are spread over")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Client timeout per request, seconds")
+    fake = parser.add_argument_group("fake backends (without --url)")
+    fake.add_argument("--backends", type=int, default=1)
+    fake.add_argument("--first-token-latency", type=float, default=0.2)
+    fake.add_argument("--tokens-per-second", type=float, default=200.0)
+    fake.add_argument("--jitter", type=float, default=0.05)
+    fake.add_argument("--malformed-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
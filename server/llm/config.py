@@ -1,19 +1,22 @@
 import os
-import torch
 
 # Model configuration
-DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL", "gemma3:4b")
+# OLLAMA_MODEL / OLLAMA_GPU_LAYERS are the names ollama_service.py used to read
+DEFAULT_MODEL = os.environ.get("DEFAULT_MODEL", os.environ.get("OLLAMA_MODEL", "gemma3:4b"))
 
-# GPU configuration - enable by default if CUDA is available
-CUDA_AVAILABLE = torch.cuda.is_available()
+# GPU configuration - layers are offloaded by Ollama, so this process never needs CUDA itself
 GPU_ENABLED = os.environ.get("GPU_ENABLED", "1") == "1"
-GPU_LAYERS = int(os.environ.get("GPU_LAYERS", "100"))
+GPU_LAYERS = int(os.environ.get("GPU_LAYERS", os.environ.get("OLLAMA_GPU_LAYERS", "100")))
 
 # API configuration
 API_PORT = int(os.environ.get("API_PORT", "5001"))
 # Fix: Use the correct Ollama API URL (port 11434 is the default for Ollama)
 OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL", "http://localhost:11434/api/generate")
 OLLAMA_TIMEOUT = int(os.environ.get("OLLAMA_TIMEOUT", "60"))
+# Ollama servers to spread generations over: comma-separated URLs, each optionally followed by
+# "=" and the "|"-separated models it serves (otherwise asked via /api/tags), e.g.
+# "http://gpu1:11434=gemma3:4b|llama3:8b,http://gpu2:11434". Defaults to OLLAMA_API_URL alone.
+OLLAMA_BACKENDS = os.environ.get("OLLAMA_BACKENDS", OLLAMA_API_URL)
 
 # MCQ generation settings
 DEFAULT_NUM_QUESTIONS = int(os.environ.get("DEFAULT_NUM_QUESTIONS", "5"))
@@ -34,7 +37,3 @@ def get_ollama_params(prompt: str, model: str = None) -> dict:
         }
     
     return params
-
-print(f"CUDA Available: {CUDA_AVAILABLE}")
-print(f"GPU Enabled: {GPU_ENABLED}")
-print(f"Using Model: {DEFAULT_MODEL}")
@@ -0,0 +1,148 @@
+import os
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+# Latency control configuration - can be overridden with environment variables
+# Generation latencies remembered per model for the percentiles below
+LATENCY_WINDOW = int(os.environ.get("OLLAMA_LATENCY_WINDOW", "200"))
+# Below this many samples a model gets the static OLLAMA_TIMEOUT
+ADAPTIVE_TIMEOUT_MIN_SAMPLES = int(os.environ.get("OLLAMA_ADAPTIVE_MIN_SAMPLES", "20"))
+# Adaptive timeout = p99 latency x multiplier, kept within [ADAPTIVE_TIMEOUT_FLOOR, OLLAMA_TIMEOUT]
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.environ.get("OLLAMA_ADAPTIVE_TIMEOUT_MULTIPLIER", "3"))
+ADAPTIVE_TIMEOUT_FLOOR = float(os.environ.get("OLLAMA_ADAPTIVE_TIMEOUT_FLOOR", "10"))
+# Send a second copy of a request that is still running after the model's p95 latency
+OLLAMA_HEDGE = os.environ.get("OLLAMA_HEDGE", "0") == "1"
+# Consecutive failures that open the circuit, and how long it stays open before a trial request
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("OLLAMA_BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.environ.get("OLLAMA_BREAKER_RESET_SECONDS", "30"))
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class LatencyTracker:
+    """
+    Recent generation latencies per model, and the timeouts and hedge delays derived from them.
+
+    Latencies are kept per unit of output budget (per requested question),
+    so a 20-question call is judged against 20 times the per-question p99
+    rather than against a run of 5-question calls. Calls cut off by a
+    deadline are recorded at that deadline, a lower bound of their real
+    latency, so when the backend slows down the timeout grows back (by the
+    multiplier every few kills) until the ceiling, where kills count as
+    backend failures again.
+    """
+
+    def __init__(self, ceiling: float, window: int = None, hedge: bool = None):
+        self.ceiling = ceiling
+        self.window = window or LATENCY_WINDOW
+        self.hedge = OLLAMA_HEDGE if hedge is None else hedge
+        self._samples: Dict[str, deque] = {}
+
+    def record(self, model: str, seconds: float, budget: float = 1):
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+        samples.append(seconds / max(budget, 1))
+
+    def _sorted(self, model: str):
+        samples = self._samples.get(model)
+        if not samples or len(samples) < ADAPTIVE_TIMEOUT_MIN_SAMPLES:
+            return None
+        return sorted(samples)
+
+    def timeout_for(self, model: str, budget: float = 1) -> float:
+        """Timeout for the next call to model: a multiple of its p99 for budget, or the ceiling until enough samples exist"""
+        ordered = self._sorted(model)
+        if ordered is None:
+            return self.ceiling
+        timeout = percentile(ordered, 0.99) * max(budget, 1) * ADAPTIVE_TIMEOUT_MULTIPLIER
+        return min(self.ceiling, max(ADAPTIVE_TIMEOUT_FLOOR, timeout))
+
+    def hedge_delay(self, model: str, budget: float = 1) -> Optional[float]:
+        """Seconds after which a still-running call should be hedged (its p95 for budget), or None"""
+        if not self.hedge:
+            return None
+        ordered = self._sorted(model)
+        return percentile(ordered, 0.95) * max(budget, 1) if ordered else None
+
+    def stats(self) -> Dict[str, Any]:
+        report = {}
+        for model, samples in self._samples.items():
+            ordered = sorted(samples)
+            # Seconds per unit of output budget
+            report[model] = {
+                "samples": len(ordered),
+                "p50": round(percentile(ordered, 0.5), 3),
+                "p95": round(percentile(ordered, 0.95), 3),
+                "p99": round(percentile(ordered, 0.99), 3),
+                "timeout": round(self.timeout_for(model), 3),
+            }
+        return report
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling a backend whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a backend is unhealthy.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    are rejected with CircuitOpenError for reset_seconds. Then a single trial
+    call is let through (half-open): success closes the circuit, failure
+    opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = None, reset_seconds: float = None):
+        self.name = name
+        self.failure_threshold = failure_threshold or BREAKER_FAILURE_THRESHOLD
+        self.reset_seconds = BREAKER_RESET_SECONDS if reset_seconds is None else reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go to the backend now"""
+        if self.state == "closed":
+            return
+        now = time.monotonic()
+        if now - self.opened_at >= self.reset_seconds:
+            # Let one trial call through; one that never reports back is replaced after another period
+            self.state = "half_open"
+            self.opened_at = now
+            return
+        self.rejected += 1
+        retry_in = self.reset_seconds - (now - self.opened_at)
+        raise CircuitOpenError(f"Ollama backend {self.name} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+    def allows_call(self) -> bool:
+        """Whether before_call would let a call through now, without changing the state"""
+        return self.state == "closed" or time.monotonic() - self.opened_at >= self.reset_seconds
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
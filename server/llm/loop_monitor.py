@@ -0,0 +1,57 @@
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Dict, Any, Optional
+from latency_control import percentile
+
+# Event loop lag sampling - can be overridden with environment variables
+# Seconds between wake-ups, and how many recent lag samples are kept for the percentiles
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", "0.1"))
+LOOP_LAG_WINDOW = int(os.environ.get("LOOP_LAG_WINDOW", "600"))
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a sleeping task.
+
+    Any lag means something ran on the loop without yielding (parsing a huge
+    response, a blocking call), and every request waiting on the loop was
+    held up by that much.
+    """
+
+    def __init__(self, interval: float = None, window: int = None):
+        self.interval = interval or LOOP_LAG_INTERVAL
+        self._samples = deque(maxlen=window or LOOP_LAG_WINDOW)
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - expected)
+            self._samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._samples)
+        if not ordered:
+            return {"samples": 0}
+        return {
+            "samples": len(ordered),
+            "interval_ms": round(self.interval * 1000, 1),
+            "p50_ms": round(percentile(ordered, 0.5) * 1000, 2),
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+            "max_ms": round(ordered[-1] * 1000, 2),
+            "max_since_start_ms": round(self.max_lag * 1000, 2),
+        }
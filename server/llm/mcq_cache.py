@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional
+
+# Cache configuration - can be overridden with environment variables
+MCQ_CACHE_ENABLED = os.environ.get("MCQ_CACHE_ENABLED", "1") == "1"
+MCQ_CACHE_DIR = os.environ.get("MCQ_CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache", "mcqs"))
+MCQ_CACHE_MEMORY_ENTRIES = int(os.environ.get("MCQ_CACHE_MEMORY_ENTRIES", "256"))
+MCQ_CACHE_MAX_BYTES = int(float(os.environ.get("MCQ_CACHE_MAX_MB", "64")) * 1024 * 1024)
+# Entries older than this are regenerated; 0 keeps them until evicted for space
+MCQ_CACHE_TTL_SECONDS = float(os.environ.get("MCQ_CACHE_TTL_HOURS", "168")) * 3600
+
+
+def cache_key(clean_text: str, model: str, num_questions: int, prompt_version: int,
+              output_mode: str = "text") -> str:
+    """Key generated MCQs on everything that changes them: the text, model, count and prompt (and its output mode)"""
+    payload = json.dumps({
+        "text": clean_text,
+        "model": model,
+        "num_questions": num_questions,
+        "prompt_version": prompt_version,
+        "output_mode": output_mode,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MCQCache:
+    """
+    Read-through cache of generated MCQs.
+
+    A small in-memory LRU sits in front of one JSON file per entry on disk.
+    Disk entries expire after ttl_seconds, and the least recently used ones
+    (by mtime, bumped on every hit) are evicted once the directory grows past
+    max_bytes.
+    """
+
+    def __init__(self, directory: str = None, memory_entries: int = None, max_bytes: int = None,
+                 ttl_seconds: float = None):
+        self.directory = directory or MCQ_CACHE_DIR
+        self.memory_entries = MCQ_CACHE_MEMORY_ENTRIES if memory_entries is None else memory_entries
+        self.max_bytes = MCQ_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.ttl_seconds = MCQ_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.bypassed = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl_seconds > 0 and time.time() - entry["created_at"] > self.ttl_seconds
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached MCQs for key, or None on a miss"""
+        entry = self._memory.get(key)
+        if entry is not None and not self._expired(entry):
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return entry["mcqs"]
+
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._memory.pop(key, None)
+            self.misses += 1
+            return None
+
+        if self._expired(entry):
+            self._memory.pop(key, None)
+            self._remove(path)
+            self.expired += 1
+            self.misses += 1
+            return None
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._remember(key, entry)
+        self.disk_hits += 1
+        return entry["mcqs"]
+
+    def put(self, key: str, mcqs: List[Dict[str, Any]], info: Dict[str, Any] = None):
+        """Store the MCQs for key, then evict old entries above the size cap"""
+        entry = {"key": key, "created_at": time.time(), "info": info or {}, "mcqs": mcqs}
+        self._remember(key, entry)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def _remove(self, path: str) -> bool:
+        try:
+            os.unlink(path)
+            return True
+        except OSError:
+            return False
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self) -> int:
+        """Remove expired entries, then least recently used ones until the cache fits in max_bytes"""
+        now = time.time()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for mtime, size, name in entries:
+            # mtime is bumped on hits, so this only drops entries that also went unused for the TTL
+            stale = self.ttl_seconds > 0 and now - mtime > self.ttl_seconds
+            if total <= self.max_bytes and not stale:
+                continue
+            if self._remove(os.path.join(self.directory, name)):
+                self._memory.pop(name[:-len(".json")], None)
+                total -= size
+                evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / (hits + self.misses), 3) if hits + self.misses else None,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "bypassed": self.bypassed,
+            "memory_entries": len(self._memory),
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+_default_cache = None
+
+
+def get_cache() -> MCQCache:
+    """Return the process-wide MCQ cache, creating it on first use"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = MCQCache()
+    return _default_cache
@@ -0,0 +1,417 @@
+import re
+import json
+from typing import List, Dict, Any, Optional, Iterator
+
+# A line label such as "Q:", "**Question:**", "B)", "Correct Answer:"; matched after
+# leading whitespace/asterisks are stripped, so the pattern never backtracks far
+LABEL_PATTERN = re.compile(r'(Question|Q|Correct Answer|Correct|Answer|[ABCD])\**[ \t]*[:.)]', re.IGNORECASE)
+# The same label found anywhere in a block of lines, with the rest of its line; lets a block without
+# JSON be scanned in C, with Python only touching the labelled lines
+LABEL_LINE = re.compile(r'^[ \t*#>-]*(Question|Q|Correct Answer|Correct|Answer|[ABCD])\**[ \t]*[:.)](.*)$',
+                        re.IGNORECASE | re.MULTILINE)
+# The usual answer shape in one piece: a question, options A-D and the answer on consecutive lines.
+# Every field stops at its line end, so a failed attempt costs at most six lines
+_FIELD = r'[ \t*#>-]*{}\**[ \t]*[:.)]([^\n]*)'
+LINE_BLOCK = re.compile(
+    "^" + r"\n".join(_FIELD.format(label) for label in ("(?:Question|Q)", "A", "B", "C", "D",
+                                                        "(?:Correct Answer|Correct|Answer)")) + "$",
+    re.IGNORECASE | re.MULTILINE)
+BRACE = re.compile(r'[{}]')
+# A brace group closed on its line and nested at most two deep, else a lone "{" to go on from brace by brace
+BRACE_GROUP = re.compile(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}|\{')
+
+# Inside a JSON candidate only braces matter; strings are matched whole so braces in them are
+# skipped. JSON strings never contain raw newlines, so a string token never spans lines.
+JSON_TOKEN = re.compile(r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"|\'[^\'\\\n]*(?:\\.[^\'\\\n]*)*\'|[{}]')
+
+# What repair_json may need to rewrite; everything between matches is copied as is
+REPAIR_TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|\'[^\'\\]*(?:\\.[^\'\\]*)*\'|\b(?:True|False|None)\b|[}\]]')
+PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+JSON_DECODER = json.JSONDecoder()
+# Deeply nested input makes the decoder (and _normalize) recurse past the limit
+DECODE_ERRORS = (ValueError, RecursionError)
+
+OPTION_LETTERS = "ABCD"
+# The answers models give most often, mapped without any string work
+LETTER_INDEX = {letter: index for index, letter in enumerate(OPTION_LETTERS)}
+
+
+def _correct_index(value: Any, options: List[str]) -> int:
+    """Map 'B', 'B) text', 1 or the option text itself to a 0-based index (0 if unknown)"""
+    if isinstance(value, str) and value in LETTER_INDEX:
+        return LETTER_INDEX[value]
+    if isinstance(value, bool):
+        return 0
+    if isinstance(value, int):
+        return value
+    value = str(value).strip()
+    if value.isdigit():
+        return int(value)
+    marked = value.lstrip("([*").upper()
+    if marked[:1] and marked[:1] in OPTION_LETTERS and not marked[1:2].isalpha():
+        return OPTION_LETTERS.index(marked[:1])
+    for index, option in enumerate(options):
+        if option.strip().lower() == value.lower():
+            return index
+    return 0
+
+
+def _normalize(value: Any) -> Iterator[Dict[str, Any]]:
+    """Turn decoded JSON (an MCQ, a list of them or a wrapper object) into MCQ dicts"""
+    if isinstance(value, list):
+        for item in value:
+            # A list of plain MCQs is the common shape; only anything else goes through another generator
+            mcq = _mcq(item) if isinstance(item, dict) else None
+            if mcq is not None:
+                yield mcq
+            else:
+                yield from _normalize(item)
+        return
+    if not isinstance(value, dict):
+        return
+    mcq = _mcq(value)
+    if mcq is not None:
+        yield mcq
+    else:
+        # A wrapper such as {"questions": [...]}
+        for item in value.values():
+            if isinstance(item, (list, dict)):
+                yield from _normalize(item)
+
+
+def _mcq(value: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The MCQ a decoded object describes, or None when it has no question"""
+    question = value["question"] if "question" in value else value.get("q")
+    if question is None:
+        return None
+
+    options = value["options"] if "options" in value else value.get("choices", [])
+    if isinstance(options, dict):
+        options = [options[key] for key in sorted(options)]
+    if isinstance(options, list):
+        try:
+            # Options are nearly always strings already, and stripping them all in C is the cheap path
+            options = list(map(str.strip, options))
+        except TypeError:
+            options = [str(option).strip() for option in options]
+    else:
+        options = []
+    # Fallback keys are only looked up when needed; this runs once per question of every response
+    if "correct" in value:
+        correct = value["correct"]
+    else:
+        correct = value["answer"] if "answer" in value else value.get("correct_answer", 0)
+    return {
+        "question": str(question).strip(),
+        "options": options,
+        "correct": _correct_index(correct, options),
+    }
+
+
+def repair_json(text: str) -> str:
+    """
+    Fix the usual model mistakes in one pass: single-quoted strings, trailing
+    commas and Python literals.
+    """
+    out = []
+    last = 0
+    for match in REPAIR_TOKEN.finditer(text):
+        gap = text[last:match.start()]
+        last = match.end()
+        token = match.group()
+        if token in "}]":
+            # Drop a trailing comma before the closing bracket
+            stripped = gap.rstrip()
+            if stripped.endswith(","):
+                gap = stripped[:-1]
+            out.append(gap + token)
+        elif token[0] == "'":
+            inner = token[1:-1].replace("\\'", "'")
+            out.append(gap + '"' + re.sub(r'(?<!\\)"', '\\\\"', inner) + '"')
+        else:
+            out.append(gap + PYTHON_LITERALS.get(token, token))
+    out.append(text[last:])
+    return "".join(out)
+
+
+class MCQParser:
+    """
+    Single-pass parser for model output in either answer shape.
+
+    Lines labelled Q:/A:-D:/Correct: and JSON objects (bare, in arrays or in
+    wrapper objects, possibly with single quotes or trailing commas) are
+    recognised in the same left-to-right scan. Text can be fed incrementally;
+    feed() returns every MCQ completed by the new text, so streamed output
+    yields questions as soon as they are whole. Each character is examined a
+    constant number of times, so parsing time grows linearly with the output.
+    """
+
+    def __init__(self):
+        # Pieces of the current, not yet terminated line
+        self._pending = []
+        # Line format state
+        self._current = None
+        self._last_field = None
+        # JSON scanner state
+        self._depth = 0
+        self._json_parts = []
+        # How each MCQ was recovered, for the caller's metrics
+        self.stats = {"line": 0, "json": 0, "json_repaired": 0, "json_rejected": 0}
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """Add text and return the MCQs it completed"""
+        if "\n" not in text:
+            # Keep pieces apart so a long line streamed in small chunks isn't rejoined every time
+            self._pending.append(text)
+            return []
+        head, _, tail = text.rpartition("\n")
+        self._pending.append(head)
+        block = "".join(self._pending)
+        self._pending = [tail]
+        completed = []
+        if not self._depth and "{" not in block:
+            self._feed_labels(block, completed)
+        else:
+            for line in block.split("\n"):
+                self._feed_line(line + "\n", completed)
+        return completed
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Flush the last, unterminated line once the output has ended"""
+        line = "".join(self._pending)
+        self._pending = []
+        completed = []
+        if line:
+            self._feed_line(line, completed)
+        return completed
+
+    def _feed_labels(self, block: str, completed: List[Dict[str, Any]]):
+        """
+        Complete lines without any JSON. Whole question blocks are taken in
+        one regex match each; only the text between them goes label by label.
+        """
+        last = 0
+        for match in LINE_BLOCK.finditer(block):
+            start = match.start()
+            # Blank lines between blocks say nothing, so they are not scanned
+            if start > last and not block[last:start].isspace():
+                self._feed_label_lines(block, last, start, completed)
+            # A block starts with its own question, so whatever was pending is replaced
+            question, a, b, c, d, correct = match.groups()
+            options = [a.strip(" \t*").strip(), b.strip(" \t*").strip(),
+                       c.strip(" \t*").strip(), d.strip(" \t*").strip()]
+            completed.append({
+                "question": question.strip(" \t*").strip(),
+                "options": options,
+                "correct": _correct_index(correct.strip(" \t*"), options),
+            })
+            self.stats["line"] += 1
+            self._current = None
+            self._last_field = None
+            last = match.end()
+        self._feed_label_lines(block, last, len(block), completed)
+
+    def _feed_label_lines(self, block: str, start: int, end: int, completed: List[Dict[str, Any]]):
+        """Jump from label to label in block[start:end], treating the lines between as continuations"""
+        last = start
+        for match in LABEL_LINE.finditer(block, start, end):
+            if self._last_field:
+                self._continue(block[last:match.start()])
+            last = match.end()
+            self._parse_label(match.group(1).upper(), match.group(2).strip(" \t*"), completed)
+        if self._last_field:
+            self._continue(block[last:end])
+
+    def _continue(self, text: str):
+        """Add the non-blank lines of text to the field being written"""
+        if text.strip():
+            self._current[self._last_field].extend(line.strip() for line in text.split("\n") if line.strip())
+
+    def _feed_line(self, line: str, completed: List[Dict[str, Any]]):
+        stripped = line.lstrip(" \t*#>-")
+        label = LABEL_PATTERN.match(stripped)
+
+        if self._depth:
+            if label and label.group(1).upper() in ("Q", "QUESTION"):
+                # An unbalanced brace swallowed prose; give up on that candidate
+                self._reset_json()
+            else:
+                self._scan_json(line, 0, completed)
+                return
+
+        if label:
+            self._parse_label(label.group(1).upper(), stripped[label.end():].strip(" \t*\n"), completed)
+            return
+
+        brace = line.find("{")
+        if brace >= 0:
+            self._scan_json(line, brace, completed)
+        elif self._last_field and line.strip():
+            # Continuation of a multi-line question or option
+            self._current[self._last_field].append(line.strip())
+
+    def _parse_label(self, label: str, value: str, completed: List[Dict[str, Any]]):
+        # Field values are lists of lines, joined once the question is complete
+        if label in ("Q", "QUESTION"):
+            self._current = {"question": [value]}
+            self._last_field = "question"
+        elif self._current is None:
+            return
+        elif label in OPTION_LETTERS:
+            self._current[label] = [value]
+            self._last_field = label
+        else:
+            options = [" ".join(self._current.get(key, ())).strip() for key in OPTION_LETTERS]
+            completed.append({
+                "question": " ".join(self._current["question"]).strip(),
+                "options": options,
+                "correct": _correct_index(value, options),
+            })
+            self.stats["line"] += 1
+            self._current = None
+            self._last_field = None
+
+    def _reset_json(self):
+        self._depth = 0
+        self._json_parts = []
+
+    def _scan_json(self, line: str, start: int, completed: List[Dict[str, Any]]):
+        begin = 0
+        position = start
+        # A failed decode costs a scan back to the line start, so only the first one per line is tried
+        decode = True
+        while True:
+            if not self._depth:
+                # Outside a candidate only an opening brace matters
+                position = line.find("{", position)
+                if position < 0:
+                    return
+                # Well-formed objects on one line are decoded whole, without the token scan
+                if decode:
+                    try:
+                        value, end = JSON_DECODER.raw_decode(line, position)
+                        self._emit_value(value, "json", completed)
+                        position = end
+                        continue
+                    except DECODE_ERRORS:
+                        decode = False
+                if line.find('"', position) < 0 and line.find("'", position) < 0:
+                    # Braces in prose: without quotes nothing opened here can be an object with keys
+                    self._skip_braces(line, position)
+                    return
+                begin = position
+                self._depth = 1
+                position += 1
+                continue
+            match = JSON_TOKEN.search(line, position)
+            if match is None:
+                break
+            position = match.end()
+            token = match.group()
+            if token == "{":
+                self._depth += 1
+            elif token == "}":
+                self._depth -= 1
+                if not self._depth:
+                    self._json_parts.append(line[begin:position])
+                    self._emit_json("".join(self._json_parts), completed)
+                    self._json_parts = []
+        self._json_parts.append(line[begin:])
+
+    def _skip_braces(self, line: str, position: int):
+        """Track depth through a line with no strings, rejecting every candidate that closes on it"""
+        groups = BRACE_GROUP.findall(line, position)
+        if "{" not in groups:
+            # Every group closed on this line: the usual case, counted without a Python-level loop
+            self.stats["json_rejected"] += len(groups)
+            return
+        for group in BRACE_GROUP.finditer(line, position):
+            if group.end() - group.start() == 1:
+                position = group.start()
+                break
+            self.stats["json_rejected"] += 1
+        else:
+            return
+        depth = 0
+        begin = position
+        for match in BRACE.finditer(line, position):
+            if match.group() == "{":
+                if not depth:
+                    begin = match.start()
+                depth += 1
+            elif depth:
+                depth -= 1
+                if not depth:
+                    self.stats["json_rejected"] += 1
+        if depth:
+            # Still open at the line end; later lines may complete it
+            self._depth = depth
+            self._json_parts.append(line[begin:])
+
+    def _emit_json(self, candidate: str, completed: List[Dict[str, Any]]):
+        if ":" not in candidate or not ('"' in candidate or "'" in candidate):
+            # Braces around prose, not an object with keys
+            self.stats["json_rejected"] += 1
+            return
+        try:
+            self._emit_value(json.loads(candidate), "json", completed)
+        except DECODE_ERRORS:
+            try:
+                self._emit_value(json.loads(repair_json(candidate)), "json_repaired", completed)
+            except DECODE_ERRORS:
+                self.stats["json_rejected"] += 1
+
+    def _emit_value(self, value: Any, path: str, completed: List[Dict[str, Any]]):
+        # Normalize fully before adding anything, so a failure leaves completed untouched
+        mcqs = list(_normalize(value))
+        completed.extend(mcqs)
+        self.stats[path] += len(mcqs)
+
+
+def _has_label_line(text: str, start: int, end: int) -> bool:
+    """Whether a labelled line starts in text[start:end]; only line starts are tried, not every character"""
+    position = text.rfind("\n", 0, start) + 1
+    if position < start:
+        # start is mid-line; that line's label (if any) is before the range
+        position = text.find("\n", start, end) + 1 or end
+    while position < end:
+        if LABEL_LINE.match(text, position, end):
+            return True
+        position = text.find("\n", position, end) + 1 or end
+    return False
+
+
+def _whole_json(text: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    MCQs of a response that is a single JSON value (with at most prose or a
+    code fence around it), decoded in one call; None when the scan is needed.
+    The result is what MCQParser would find, only without its per-line work.
+    """
+    brackets = [position for position in (text.find("["), text.find("{")) if position >= 0]
+    if not brackets:
+        return None
+    start = min(brackets)
+    try:
+        value, end = JSON_DECODER.raw_decode(text, start)
+        mcqs = list(_normalize(value))
+    except DECODE_ERRORS:
+        return None
+    # Another object or a labelled line around the value would be picked up by the scan as well
+    if text.find("{", end) >= 0 or _has_label_line(text, 0, start) or _has_label_line(text, end, len(text)):
+        return None
+    return mcqs
+
+
+def parse_mcqs(text: str, stats: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """Parse a complete model response; parse-path counts are added to stats if given"""
+    parser = MCQParser()
+    mcqs = _whole_json(text)
+    if mcqs is not None:
+        parser.stats["json"] += len(mcqs)
+    else:
+        mcqs = parser.feed(text) + parser.finish()
+    if stats is not None:
+        for path, count in parser.stats.items():
+            stats[path] = stats.get(path, 0) + count
+    return mcqs
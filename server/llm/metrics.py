@@ -0,0 +1,184 @@
+import os
+import bisect
+import logging
+from typing import Dict, Any, List, Tuple, Callable, Iterable
+
+# Logging configuration - can be overridden with environment variables
+# DEBUG_MODE=1 turns on per-request debug logs; LOG_LEVEL sets the level otherwise
+DEBUG_MODE = os.environ.get("DEBUG_MODE", "0") == "1"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "DEBUG" if DEBUG_MODE else "INFO").upper()
+
+# Latency buckets in seconds, from a cache hit to a long generation
+LATENCY_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+TOKEN_RATE_BUCKETS = (1, 5, 10, 20, 30, 40, 60, 80, 120, 160, 250, 500)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """Observations counted into cumulative buckets per label combination"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        entry = self._values.get(key)
+        if entry is None:
+            # Per-bucket counts, then the +Inf count and the sum
+            entry = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, entry in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), entry):
+                cumulative += count
+                bucket = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, bucket)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(entry[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+# A collector returns (name, kind, description, [(labels, value), ...]) for values read from existing stats at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+
+class MetricsRegistry:
+    """Metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Collector] = []
+
+    def counter(self, name: str, description: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, description, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, description: str, labelnames: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, collect: Collector):
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        for collect in self._collectors:
+            for name, kind, description, values in collect():
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in values:
+                    if value is not None:
+                        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "mcq_http_request_duration_seconds", "API request latency until the response starts",
+    ("method", "path", "status"))
+GENERATION_SECONDS = REGISTRY.histogram(
+    "ollama_generation_duration_seconds", "Ollama total_duration per generation", ("model", "backend"))
+EVAL_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "ollama_eval_tokens_per_second", "Output tokens per second of each generation (eval_count / eval_duration)",
+    ("model",), TOKEN_RATE_BUCKETS)
+EVAL_TOKENS = REGISTRY.counter("ollama_eval_tokens_total", "Output tokens generated", ("model",))
+EVAL_SECONDS = REGISTRY.counter("ollama_eval_seconds_total", "Time spent generating output tokens", ("model",))
+PROMPT_EVAL_TOKENS = REGISTRY.counter("ollama_prompt_eval_tokens_total", "Prompt tokens evaluated", ("model",))
+PROMPT_EVAL_SECONDS = REGISTRY.counter("ollama_prompt_eval_seconds_total", "Time spent evaluating prompts", ("model",))
+LOAD_SECONDS = REGISTRY.counter("ollama_load_seconds_total", "Time Ollama spent loading the model", ("model",))
+
+
+def observe_generation(model: str, backend: str, result: Dict[str, Any]):
+    """Record the timings Ollama reports in a final response (durations are in nanoseconds)"""
+    if result.get("total_duration"):
+        GENERATION_SECONDS.observe(result["total_duration"] / 1e9, model=model, backend=backend)
+    eval_seconds = result.get("eval_duration", 0) / 1e9
+    if result.get("eval_count"):
+        EVAL_TOKENS.inc(result["eval_count"], model=model)
+        EVAL_SECONDS.inc(eval_seconds, model=model)
+        if eval_seconds > 0:
+            EVAL_TOKENS_PER_SECOND.observe(result["eval_count"] / eval_seconds, model=model)
+    if result.get("prompt_eval_count"):
+        PROMPT_EVAL_TOKENS.inc(result["prompt_eval_count"], model=model)
+        PROMPT_EVAL_SECONDS.inc(result.get("prompt_eval_duration", 0) / 1e9, model=model)
+    if result.get("load_duration"):
+        LOAD_SECONDS.inc(result["load_duration"] / 1e9, model=model)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger under "mcq" writing one line per event to stderr.
+
+    Use log_event for messages, so fields are only formatted when the level
+    is enabled and come out as greppable key=value pairs.
+    """
+    root = logging.getLogger("mcq")
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return logging.getLogger(f"mcq.{name}")
+
+
+def log_event(logger: logging.Logger, level: int, event: str, **fields):
+    """Log event with fields as key=value pairs, doing no formatting work if level is off"""
+    if logger.isEnabledFor(level):
+        logger.log(level, "%s %s", event, " ".join(f"{key}={value!r}" for key, value in fields.items()))
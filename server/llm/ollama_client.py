@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import asyncio
+from typing import Dict, Any, Optional
+import httpx
+from latency_control import LatencyTracker, CircuitBreaker
+
+# Client configuration - can be overridden with environment variables
+# Generations allowed in flight per Ollama backend; further requests wait their turn
+OLLAMA_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_MAX_CONCURRENCY", "2"))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "5"))
+# Keep-alive connections kept open to each backend
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "10"))
+
+
+class GenerationDeadlineError(httpx.ReadTimeout):
+    """A generation cut off by the client's deadline; adaptive is True when that deadline was tighter than the ceiling"""
+
+    def __init__(self, message: str, adaptive: bool):
+        super().__init__(message)
+        self.adaptive = adaptive
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Errors that say the backend is unhealthy (as opposed to rejecting one request)"""
+    if isinstance(error, GenerationDeadlineError):
+        # Running past an adaptive deadline says the request was long, not that the backend is down
+        return not error.adaptive
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+class OllamaClient:
+    """
+    Async client for one Ollama backend.
+
+    Requests share a keep-alive connection pool, and a semaphore caps how many
+    generations run on the backend at once so a burst of requests queues here
+    instead of overloading the model server.
+
+    Generations get a per-model timeout derived from recent latencies (timeout
+    is the ceiling), can be hedged with a second copy once they run past the
+    model's p95, and a circuit breaker rejects calls right away while the
+    backend keeps failing.
+    """
+
+    def __init__(self, base_url: str, max_concurrency: int = None, timeout: float = 60):
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency or OLLAMA_MAX_CONCURRENCY)
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout, connect=OLLAMA_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+            ),
+        )
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.latency = LatencyTracker(ceiling=timeout)
+        self.breaker = CircuitBreaker(self.base_url)
+
+    async def generate(self, params: Dict[str, Any], timeout: Optional[float] = None,
+                       budget: float = 1) -> Dict[str, Any]:
+        """
+        POST /api/generate and return the decoded JSON response.
+
+        budget is the size of the requested output (e.g. the number of
+        questions); latencies are tracked per unit of it, so a larger request
+        gets a proportionally longer timeout and hedge delay.
+        """
+        self.breaker.before_call()
+        model = params.get("model", "")
+        timeout = timeout or self.latency.timeout_for(model, budget)
+        hedge_after = self.latency.hedge_delay(model, budget)
+        try:
+            if hedge_after is None:
+                result, seconds = await self._attempt(params, timeout)
+            else:
+                result, seconds = await self._hedged(params, timeout, hedge_after)
+        except Exception as e:
+            if isinstance(e, GenerationDeadlineError):
+                # The call took at least this long; without the sample the timeout could only ever shrink
+                self.latency.record(model, timeout, budget)
+            if is_backend_failure(e):
+                self.breaker.record_failure()
+            elif isinstance(e, httpx.HTTPStatusError):
+                # The backend answered, it only rejected this request
+                self.breaker.record_success()
+            # Anything else (an adaptive deadline kill, a body that isn't JSON) says nothing either way
+            raise
+        self.breaker.record_success()
+        self.latency.record(model, seconds, budget)
+        return result
+
+    async def _attempt(self, params: Dict[str, Any], timeout: float):
+        """One request; returns the response and its latency, not counting time queued for a slot"""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            try:
+                # A deadline on the whole call; httpx's read timeout only bounds each wait for data,
+                # so it is left at the ceiling and only fires on a backend that stopped answering
+                response = await asyncio.wait_for(self._client.post(
+                    "/api/generate",
+                    json=params,
+                    timeout=httpx.Timeout(self.timeout, connect=OLLAMA_CONNECT_TIMEOUT),
+                ), timeout)
+            except asyncio.TimeoutError:
+                raise GenerationDeadlineError(f"Ollama generation did not finish within {timeout:.1f}s",
+                                              adaptive=timeout < self.timeout)
+            response.raise_for_status()
+            self.requests += 1
+            return response.json(), time.perf_counter() - started
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def _hedged(self, params: Dict[str, Any], timeout: float, hedge_after: float):
+        """Run a request, sending a second copy if it is still running after hedge_after; the first success wins"""
+        primary = asyncio.ensure_future(self._attempt(params, timeout))
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if done:
+                return primary.result()
+
+            self.hedges += 1
+            backup = asyncio.ensure_future(self._attempt(params, timeout))
+            pending = {primary, backup}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The losing copy is cancelled, which closes its connection and stops that generation
+            for task in pending:
+                task.cancel()
+
+    async def generate_stream(self, params: Dict[str, Any], timeout: Optional[float] = None):
+        """
+        POST /api/generate with streaming on, yielding each decoded JSON chunk.
+
+        Closing the generator early closes the connection, which makes Ollama
+        stop generating instead of spending tokens nobody will read.
+        """
+        self.breaker.before_call()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            async with self._client.stream(
+                "POST",
+                "/api/generate",
+                json=dict(params, stream=True),
+                timeout=httpx.Timeout(timeout or self.timeout, connect=OLLAMA_CONNECT_TIMEOUT),
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.strip():
+                        yield json.loads(line)
+            self.requests += 1
+            self.breaker.record_success()
+        except (httpx.HTTPError, ValueError) as e:
+            self.errors += 1
+            if is_backend_failure(e):
+                self.breaker.record_failure()
+            raise
+        finally:
+            self.busy_seconds += time.perf_counter() - started
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def list_models(self, timeout: Optional[float] = None):
+        """GET /api/tags and return the names of the models the backend has"""
+        response = await self._client.get("/api/tags", timeout=timeout or OLLAMA_CONNECT_TIMEOUT)
+        response.raise_for_status()
+        return [model.get("name") or model.get("model") for model in response.json().get("models", [])]
+
+    async def running_models(self, timeout: Optional[float] = None):
+        """GET /api/ps: the loaded models, each with its size and how many of those bytes are in VRAM"""
+        response = await self._client.get("/api/ps", timeout=timeout or OLLAMA_CONNECT_TIMEOUT)
+        response.raise_for_status()
+        return [
+            {"name": model.get("name") or model.get("model"), "size": model.get("size", 0),
+             "size_vram": model.get("size_vram", 0)}
+            for model in response.json().get("models", [])
+        ]
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "errors": self.errors,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency": self.latency.stats(),
+            "circuit": self.breaker.stats(),
+        }
+
+
+def base_url_from_api_url(api_url: str) -> str:
+    """Turn an endpoint URL such as http://host:11434/api/generate into the server's base URL"""
+    for suffix in ("/api/generate", "/api/chat", "/api"):
+        if api_url.rstrip("/").endswith(suffix):
+            return api_url.rstrip("/")[:-len(suffix)]
+    return api_url.rstrip("/")
+
@@ -1,56 +1,328 @@
-import requests
 import json
+import asyncio
+import logging
+import httpx
 import re
-import torch
+import math
 import random
 import os
+import time
 from typing import List, Dict, Any, Union, Optional
+from backend_pool import BackendPool, get_pool
+from mcq_parser import MCQParser, parse_mcqs
+# Model, GPU layers and backends come from config.py (OLLAMA_MODEL / OLLAMA_GPU_LAYERS still work there)
+from config import DEFAULT_MODEL, GPU_LAYERS
+# Debug logs are off unless DEBUG_MODE=1 (or LOG_LEVEL=DEBUG)
+from metrics import get_logger, log_event, observe_generation
 
-# Configuration
-DEFAULT_HOST = "http://localhost:11434"
-DEFAULT_TIMEOUT = 120  # seconds
+logger = get_logger("ollama")
 
-# Define the URL for the local Ollama API
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+# "json" constrains the model's output to MCQ_SCHEMA via Ollama's format option;
+# "text" asks for the Q:/A:/Correct: line format and relies on the text parser
+MCQ_OUTPUT_MODE = os.environ.get("MCQ_OUTPUT_MODE", "json")
 
-# Add debug mode to help diagnose issues
-DEBUG_MODE = os.environ.get("DEBUG_MODE", "1") == "1"
+MCQ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}, "minItems": 4, "maxItems": 4},
+                    "correct": {"type": "integer", "minimum": 0, "maximum": 3},
+                },
+                "required": ["question", "options", "correct"],
+            },
+        },
+    },
+    "required": ["questions"],
+}
 
-# Default model - can be overridden with environment variable
-DEFAULT_MODEL = os.environ.get("OLLAMA_MODEL", "gemma3:4b")
-
-# GPU configuration - set to 0 to disable, positive number for number of layers on GPU
-# Can be overridden with environment variable OLLAMA_GPU_LAYERS
-GPU_LAYERS = int(os.environ.get("OLLAMA_GPU_LAYERS", "50"))
+_devices = None
 
 def get_available_devices() -> Dict[str, Any]:
-    """Check available devices for model inference"""
-    try:
-        cuda_available = torch.cuda.is_available()
-        device_count = torch.cuda.device_count() if cuda_available else 0
-        device_name = torch.cuda.get_device_name(0) if cuda_available and device_count > 0 else None
-        
-        return {
-            "success": True,
-            "cuda_available": cuda_available,
-            "device_count": device_count,
-            "device_name": device_name
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e)
+    """
+    Check available devices for model inference on this host.
+    
+    torch is imported on the first call only and the answer is cached, since
+    it costs seconds and hundreds of MB. The API service doesn't call this:
+    inference runs inside Ollama, and /health reports GPU use from its /api/ps.
+    """
+    global _devices
+    if _devices is None:
+        try:
+            import torch
+            cuda_available = torch.cuda.is_available()
+            device_count = torch.cuda.device_count() if cuda_available else 0
+            device_name = torch.cuda.get_device_name(0) if cuda_available and device_count > 0 else None
+            
+            _devices = {
+                "success": True,
+                "cuda_available": cuda_available,
+                "device_count": device_count,
+                "device_name": device_name
+            }
+        except Exception as e:
+            _devices = {
+                "success": False,
+                "error": str(e)
+            }
+    return _devices
+
+def build_request_params(prompt: str, model: str = None, use_gpu: bool = True,
+                         output_mode: str = "text") -> Dict[str, Any]:
+    """Build the Ollama /api/generate request body"""
+    request_params = {
+        "model": model or DEFAULT_MODEL,
+        "prompt": prompt,
+        "stream": False,
+    }
+    
+    if output_mode == "json":
+        request_params["format"] = MCQ_SCHEMA
+    
+    # Add GPU configuration if requested
+    if use_gpu and GPU_LAYERS > 0:
+        request_params["options"] = {
+            "num_gpu": GPU_LAYERS  # Number of layers to put on the GPU
         }
+    
+    return request_params
 
-def generate_mcqs(transcript: str, num_questions: int = 5, model: str = None, use_gpu: bool = True) -> List[Dict[str, Any]]:
+class ParseStats:
+    """
+    Per-model record of how model responses were turned into MCQs.
+    
+    Each response ends in one outcome: "schema" (structured output valid as
+    is), "parser" (recovered by the text parser), "fallback" (nothing parsed,
+    replaced by generate_fallback_mcqs) or "failed" (parsed, but no MCQ was
+    valid). Generation time behind the last two bought nothing and is
+    counted as wasted.
+    """
+    
+    OUTCOMES = ("schema", "parser", "fallback", "failed")
+    
+    def __init__(self):
+        self._models: Dict[str, Dict[str, Any]] = {}
+    
+    def record(self, model: str, outcome: str, generation_seconds: float = 0.0,
+               paths: Optional[Dict[str, int]] = None):
+        entry = self._models.get(model)
+        if entry is None:
+            entry = self._models[model] = {
+                "responses": 0,
+                **{name: 0 for name in self.OUTCOMES},
+                "generation_seconds": 0.0,
+                "wasted_generation_seconds": 0.0,
+                "parser_paths": {},
+            }
+        entry["responses"] += 1
+        entry[outcome] += 1
+        entry["generation_seconds"] += generation_seconds
+        if outcome in ("fallback", "failed"):
+            entry["wasted_generation_seconds"] += generation_seconds
+        for path, count in (paths or {}).items():
+            entry["parser_paths"][path] = entry["parser_paths"].get(path, 0) + count
+    
+    def stats(self) -> Dict[str, Any]:
+        report = {}
+        for model, entry in self._models.items():
+            report[model] = dict(
+                entry,
+                success_rate=round((entry["schema"] + entry["parser"]) / entry["responses"], 3),
+                generation_seconds=round(entry["generation_seconds"], 3),
+                wasted_generation_seconds=round(entry["wasted_generation_seconds"], 3),
+                parser_paths=dict(entry["parser_paths"]),
+            )
+        return report
+
+parse_stats = ParseStats()
+
+def generation_seconds(result: Dict[str, Any], started: float) -> float:
+    """Model time for a response: Ollama's total_duration (ns) when reported, else wall time"""
+    if result.get("total_duration"):
+        return result["total_duration"] / 1e9
+    return time.perf_counter() - started
+
+def parse_structured_mcqs(generated_text: str) -> List[Dict[str, Any]]:
+    """Read MCQs from output constrained to MCQ_SCHEMA; [] unless it is valid JSON of that shape"""
+    try:
+        value = json.loads(generated_text)
+    except ValueError:
+        return []
+    questions = value.get("questions") if isinstance(value, dict) else value
+    if not isinstance(questions, list):
+        return []
+    return [mcq for mcq in questions if validate_mcq(mcq)]
+
+def extract_mcqs(generated_text: str, transcript: str, num_questions: int, model: str = None,
+                 generation_seconds: float = 0.0, structured: bool = False) -> List[Dict[str, Any]]:
+    """
+    Parse and validate MCQs from the model output, falling back to simple generated ones.
+    
+    Structured (MCQ_SCHEMA) output is validated directly; the text parser
+    only runs when that fails. The outcome is recorded in parse_stats.
+    """
+    model = model or DEFAULT_MODEL
+    if structured:
+        mcqs = parse_structured_mcqs(generated_text)
+        if mcqs:
+            parse_stats.record(model, "schema", generation_seconds)
+            return mcqs[:num_questions]
+        log_event(logger, logging.DEBUG, "structured_output_invalid", model=model, response_chars=len(generated_text))
+    
+    # One pass over the output recognises both the line format and JSON
+    paths = {}
+    mcqs = parse_mcqs(generated_text, paths)
+    
+    if not mcqs:
+        parse_stats.record(model, "fallback", generation_seconds, paths)
+        log_event(logger, logging.WARNING, "fallback_mcqs", model=model, response_chars=len(generated_text))
+        return generate_fallback_mcqs(transcript, num_questions)
+    
+    # Validate the MCQs
+    validated_mcqs = []
+    for mcq in mcqs:
+        if validate_mcq(mcq):
+            validated_mcqs.append(mcq)
+            if len(validated_mcqs) >= num_questions:
+                break
+                
+    if not validated_mcqs:
+        parse_stats.record(model, "failed", generation_seconds, paths)
+        raise ValueError("No valid MCQs could be extracted from the response")
+    
+    parse_stats.record(model, "parser", generation_seconds, paths)
+    return validated_mcqs
+
+# Transcript budget per prompt in estimated tokens; longer transcripts are split into windows
+MCQ_WINDOW_TOKENS = int(os.environ.get("MCQ_WINDOW_TOKENS", "1500"))
+MCQ_WINDOW_OVERLAP_TOKENS = int(os.environ.get("MCQ_WINDOW_OVERLAP_TOKENS", "100"))
+# Windows are asked for a few extra questions so deduplication still leaves enough
+MCQ_WINDOW_OVERGENERATE = float(os.environ.get("MCQ_WINDOW_OVERGENERATE", "1.25"))
+
+# Rough size of a token for English text; no tokenizer is needed for budgeting
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+def _split_long_sentence(sentence: str, max_tokens: int) -> List[str]:
+    """Cut a sentence that is longer than a whole window at word boundaries"""
+    pieces = []
+    current = []
+    current_chars = 0
+    for word in sentence.split():
+        if current and math.ceil((current_chars + len(word)) / CHARS_PER_TOKEN) > max_tokens:
+            pieces.append(" ".join(current))
+            current = []
+            current_chars = 0
+        current.append(word)
+        current_chars += len(word) + 1
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+def split_transcript_windows(text: str, max_tokens: int = None, overlap_tokens: int = None) -> List[str]:
+    """
+    Split cleaned transcript text into windows of at most max_tokens.
+    
+    Windows end on sentence boundaries and start with the last sentences of
+    the previous window (up to overlap_tokens), so an idea cut in two still
+    has its context on both sides.
+    """
+    max_tokens = max_tokens or MCQ_WINDOW_TOKENS
+    overlap_tokens = min(MCQ_WINDOW_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens, max_tokens // 2)
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    
+    pieces = []
+    for sentence in re.split(r'(?<=[.!?])\s+', text):
+        if estimate_tokens(sentence) > max_tokens:
+            pieces.extend(_split_long_sentence(sentence, max_tokens))
+        elif sentence:
+            pieces.append(sentence)
+    
+    windows = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        piece_tokens = estimate_tokens(piece)
+        if current and current_tokens + piece_tokens > max_tokens:
+            windows.append(" ".join(current))
+            # Carry the tail of this window into the next one
+            carry = []
+            carry_tokens = 0
+            for previous in reversed(current):
+                previous_tokens = estimate_tokens(previous)
+                if carry_tokens + previous_tokens > overlap_tokens:
+                    break
+                carry.insert(0, previous)
+                carry_tokens += previous_tokens
+            current, current_tokens = carry, carry_tokens
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        windows.append(" ".join(current))
+    return windows
+
+def allocate_questions(windows: List[str], num_questions: int) -> List[int]:
+    """Questions to ask of each window, in proportion to its length (largest remainder)"""
+    target = max(num_questions, math.ceil(num_questions * MCQ_WINDOW_OVERGENERATE))
+    weights = [estimate_tokens(window) for window in windows]
+    total = sum(weights)
+    shares = [target * weight / total for weight in weights]
+    allocation = [int(share) for share in shares]
+    by_remainder = sorted(range(len(windows)), key=lambda i: shares[i] - allocation[i], reverse=True)
+    for i in by_remainder[:target - sum(allocation)]:
+        allocation[i] += 1
+    return allocation
+
+def _question_words(mcq: Dict[str, Any]) -> set:
+    return set(re.findall(r'[a-z0-9]+', mcq["question"].lower()))
+
+def is_duplicate_mcq(mcq: Dict[str, Any], kept: List[Dict[str, Any]], threshold: float = 0.8) -> bool:
+    """True if the question is (nearly) the same as one already kept - overlapping windows repeat themselves"""
+    words = _question_words(mcq)
+    for other in kept:
+        other_words = _question_words(other)
+        union = words | other_words
+        if not union or len(words & other_words) / len(union) >= threshold:
+            return True
+    return False
+
+def merge_window_mcqs(per_window: List[List[Dict[str, Any]]], num_questions: int) -> List[Dict[str, Any]]:
+    """Take questions round-robin across windows, skipping duplicates, and keep transcript order"""
+    picked = []
+    kept = []
+    for position in range(max(len(mcqs) for mcqs in per_window)):
+        for window_index, mcqs in enumerate(per_window):
+            if position < len(mcqs) and len(kept) < num_questions and not is_duplicate_mcq(mcqs[position], kept):
+                kept.append(mcqs[position])
+                picked.append((window_index, position, mcqs[position]))
+    return [mcq for _, _, mcq in sorted(picked, key=lambda item: item[:2])]
+
+async def agenerate_mcqs(transcript: str, num_questions: int = 5, model: str = None, use_gpu: bool = True,
+                         pool: Optional[BackendPool] = None, sticky_key: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Generate MCQs using the local Ollama model with CUDA acceleration.
     
+    The request goes to the least busy backend of the pool (the shared one for
+    OLLAMA_BACKENDS unless pool is given) through its async client, so the
+    caller's event loop keeps serving other requests while the model
+    generates. Transcripts longer than
+    MCQ_WINDOW_TOKENS are split into overlapping windows that are generated
+    in parallel, then merged and deduplicated.
+    
     Args:
         transcript: The transcript text to generate questions from
         num_questions: Number of questions to generate (default: 5)
         model: Override default model (default: gemma3:4b)
         use_gpu: Whether to use GPU acceleration (default: True)
+        pool: Backends to route to (default: shared pool for OLLAMA_BACKENDS)
+        sticky_key: Requests with the same key (a file id) prefer the same backend
         
     Returns:
         A list of MCQ objects with structure:
@@ -65,168 +337,180 @@ def generate_mcqs(transcript: str, num_questions: int = 5, model: str = None, us
     
     # Clean and prepare the transcript
     clean_transcript = clean_transcript_text(transcript)
+    pool = pool or get_pool()
     
+    windows = split_transcript_windows(clean_transcript)
+    if len(windows) == 1:
+        return await _agenerate_window(clean_transcript, transcript, num_questions, model, use_gpu,
+                                       pool, sticky_key)
+    
+    # Spread the questions over the windows by size and generate them all at once
+    allocation = allocate_questions(windows, num_questions)
+    log_event(logger, logging.DEBUG, "transcript_windows", windows=len(windows), questions=allocation)
+    results = await asyncio.gather(
+        *(_agenerate_window(window, window, count, model, use_gpu, pool, sticky_key)
+          for window, count in zip(windows, allocation) if count),
+        return_exceptions=True
+    )
+    
+    # Placeholder questions from a window whose output didn't parse must not crowd out real ones
+    per_window = []
+    fell_back = False
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            log_event(logger, logging.WARNING, "window_failed", window=index, windows=len(results), error=str(result))
+        elif is_fallback(result):
+            fell_back = True
+        else:
+            per_window.append(result)
+    if per_window:
+        return merge_window_mcqs(per_window, num_questions)
+    if fell_back:
+        return generate_fallback_mcqs(transcript, num_questions)
+    raise next(result for result in results if isinstance(result, BaseException))
+
+async def _agenerate_window(clean_transcript: str, transcript: str, num_questions: int, model: str,
+                            use_gpu: bool, pool: BackendPool, sticky_key: Optional[str]) -> List[Dict[str, Any]]:
+    """Generate MCQs for text that fits in one prompt"""
     # Construct prompt for the LLM
-    prompt = create_mcq_prompt(clean_transcript, num_questions)
+    prompt = create_mcq_prompt(clean_transcript, num_questions, MCQ_OUTPUT_MODE)
     
     try:
-        # Debug: Print important info
-        if DEBUG_MODE:
-            print(f"===== MCQ GENERATION REQUEST =====")
-            print(f"Using model: {model or DEFAULT_MODEL}")
-            print(f"API URL: {OLLAMA_API_URL}")
-            print(f"GPU enabled: {use_gpu and GPU_LAYERS > 0}")
-            print(f"Prompt length: {len(prompt)} characters")
+        client = pool.choose(model or DEFAULT_MODEL, sticky_key)
         
         # Prepare request parameters
-        request_params = {
-            "model": model or DEFAULT_MODEL,
-            "prompt": prompt,
-            "stream": False,
-        }
+        request_params = build_request_params(prompt, model, use_gpu, MCQ_OUTPUT_MODE)
+        log_event(logger, logging.DEBUG, "generation_request", model=request_params["model"],
+                  backend=client.base_url, gpu_layers=request_params.get("options", {}).get("num_gpu", 0),
+                  output_mode=MCQ_OUTPUT_MODE, prompt_chars=len(prompt))
         
-        # Add GPU configuration if requested
-        if use_gpu and GPU_LAYERS > 0:
-            request_params["options"] = {
-                "num_gpu": GPU_LAYERS  # Number of layers to put on the GPU
-            }
-            print(f"Using GPU acceleration with {GPU_LAYERS} layers")
-        
-        # Debug: Log request
-        if DEBUG_MODE:
-            print(f"Sending request to Ollama API at {OLLAMA_API_URL}")
-            print(f"Request parameters: {json.dumps(request_params, indent=2)}")
-        
-        # Make request to Ollama API
-        response = requests.post(
-            OLLAMA_API_URL,
-            json=request_params,
-            timeout=60
-        )
-        
-        # Debug: Print response status
-        if DEBUG_MODE:
-            print(f"Response status code: {response.status_code}")
-        
-        response.raise_for_status()
+        # Make request to Ollama API without blocking the event loop
+        started = time.perf_counter()
+        result = await client.generate(request_params, budget=num_questions)
+        observe_generation(request_params["model"], client.base_url, result)
         
         # Extract the text response
-        result = response.json()
         generated_text = result.get("response", "")
+        log_event(logger, logging.DEBUG, "generation_response", model=request_params["model"],
+                  backend=client.base_url, response_chars=len(generated_text),
+                  eval_count=result.get("eval_count"), head=generated_text[:200])
         
-        # Debug: Log generated text
-        if DEBUG_MODE:
-            print(f"===== RECEIVED RESPONSE =====")
-            print(f"Response length: {len(generated_text)} characters")
-            print(f"First 200 chars: {generated_text[:200]}...")
-        
-        # Find and parse JSON in the response
-        if DEBUG_MODE:
-            print("Attempting to parse JSON from response...")
-        
-        # First try to parse questions directly from text format
-        mcqs = parse_mcqs_from_text(generated_text)
-        
-        # If text parsing failed, try to find JSON
-        if not mcqs:
-            if DEBUG_MODE:
-                print("No MCQs found with text parsing, trying JSON extraction...")
-            
-            # Try with different regex patterns to find JSON
-            json_patterns = [
-                r'\[\s*{.+}\s*\]',  # Standard JSON array pattern
-                r'{.+}',               # Single JSON object
-                r'\[\s*\{"question":.+\}\s*\]'  # Specific MCQ JSON pattern
-            ]
-            
-            json_str = None
-            for pattern in json_patterns:
-                json_match = re.search(pattern, generated_text, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
-                    if DEBUG_MODE:
-                        print(f"Found JSON match with pattern: {pattern}")
-                        print(f"JSON string found: {json_str[:100]}...")
-                    break
-            
-            if not json_str:
-                # If no JSON found, try to fix common issues
-                if DEBUG_MODE:
-                    print("No JSON found, attempting to fix JSON syntax...")
-                fixed_text = fix_json_syntax(generated_text)
-                
-                for pattern in json_patterns:
-                    json_match = re.search(pattern, fixed_text, re.DOTALL)
-                    if json_match:
-                        json_str = json_match.group(0)
-                        if DEBUG_MODE:
-                            print(f"Found JSON match after fixing with pattern: {pattern}")
-                        break
-            
-            if not json_str:
-                # Last resort - try to manually parse the MCQs from text
-                if DEBUG_MODE:
-                    print("No JSON found, falling back to text parsing...")
-                mcqs = parse_mcqs_from_text(generated_text)
-                
-                if not mcqs:
-                    if DEBUG_MODE:
-                        print("Generating fallback MCQs since no valid MCQs could be extracted")
-                    return generate_fallback_mcqs(transcript, num_questions)
-            else:
-                # Try to parse the found JSON
-                try:
-                    # Make sure it's a list
-                    if json_str.strip()[0] != '[':
-                        json_str = f"[{json_str}]"
-                    
-                    mcqs = json.loads(json_str)
-                    
-                    # If we got a single object instead of a list, wrap it
-                    if isinstance(mcqs, dict):
-                        mcqs = [mcqs]
-                        
-                except json.JSONDecodeError as e:
-                    if DEBUG_MODE:
-                        print(f"JSON decode error: {str(e)}")
-                        print(f"Problem JSON: {json_str}")
-                    
-                    # Try one more fix attempt
-                    try:
-                        fixed_json = json_str.replace("'\n", "\n")
-                        fixed_json = fixed_json.replace("'", "\"")
-                        mcqs = json.loads(fixed_json)
-                        if isinstance(mcqs, dict):
-                            mcqs = [mcqs]
-                    except:
-                        # Fall back to text parsing
-                        mcqs = parse_mcqs_from_text(generated_text)
-                        
-                        if not mcqs:
-                            if DEBUG_MODE:
-                                print("Generating fallback MCQs since JSON parsing failed")
-                            return generate_fallback_mcqs(transcript, num_questions)
-        
-        # Validate the MCQs
-        validated_mcqs = []
-        for mcq in mcqs:
-            if validate_mcq(mcq):
-                validated_mcqs.append(mcq)
-                if len(validated_mcqs) >= num_questions:
-                    break
-                    
-        if not validated_mcqs:
-            raise ValueError("No valid MCQs could be extracted from the response")
-            
-        return validated_mcqs
+        return extract_mcqs(generated_text, transcript, num_questions, model,
+                            generation_seconds(result, started), structured=MCQ_OUTPUT_MODE == "json")
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise ConnectionError(f"Error connecting to Ollama API: {str(e)}")
+    except ConnectionError:
+        # Circuit breaker rejections and unserved models are already clear
+        raise
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in model response: {str(e)}")
     except Exception as e:
         raise RuntimeError(f"Error generating MCQs: {str(e)}")
 
+async def astream_mcqs(transcript: str, num_questions: int = 5, model: str = None, use_gpu: bool = True,
+                       pool: Optional[BackendPool] = None, sticky_key: Optional[str] = None):
+    """
+    Yield validated MCQs one at a time as the model writes them.
+    
+    Generation stops as soon as num_questions are out, and closing the
+    generator early cancels the Ollama request. The model is asked for the
+    line format even when MCQ_OUTPUT_MODE is "json", since each question in it
+    is complete on its own while a JSON list only closes at the end. If the
+    output turns out not to yield any whole questions, the full text is
+    parsed like generate_mcqs does.
+    """
+    if not transcript or len(transcript.strip()) < 50:
+        return
+    
+    clean_transcript = clean_transcript_text(transcript)
+    pool = pool or get_pool()
+    
+    windows = split_transcript_windows(clean_transcript)
+    if len(windows) > 1:
+        # Long transcripts: generate all windows at once and pass questions on as each window finishes
+        tasks = [
+            asyncio.ensure_future(_agenerate_window(window, window, count, model, use_gpu, pool, sticky_key))
+            for window, count in zip(windows, allocate_questions(windows, num_questions)) if count
+        ]
+        kept = []
+        errors = []
+        fell_back = False
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    mcqs = await next_done
+                except Exception as e:
+                    log_event(logger, logging.WARNING, "window_failed", windows=len(tasks), error=str(e))
+                    errors.append(e)
+                    continue
+                if is_fallback(mcqs):
+                    fell_back = True
+                    continue
+                for mcq in mcqs:
+                    if not is_duplicate_mcq(mcq, kept):
+                        kept.append(mcq)
+                        yield mcq
+                        if len(kept) >= num_questions:
+                            return
+        finally:
+            # Windows still generating are no longer needed
+            for task in tasks:
+                task.cancel()
+        if not kept:
+            if fell_back:
+                for mcq in generate_fallback_mcqs(transcript, num_questions):
+                    yield mcq
+            elif errors:
+                raise errors[0]
+        return
+    
+    prompt = create_mcq_prompt(clean_transcript, num_questions)
+    parser = MCQParser()
+    generated_text = []
+    count = 0
+    final_chunk = {}
+    
+    started = time.perf_counter()
+    client = pool.choose(model or DEFAULT_MODEL, sticky_key)
+    stream = client.generate_stream(build_request_params(prompt, model, use_gpu))
+    try:
+        async for chunk in stream:
+            text = chunk.get("response", "")
+            generated_text.append(text)
+            completed = parser.feed(text)
+            if chunk.get("done"):
+                final_chunk = chunk
+                completed += parser.finish()
+            for mcq in completed:
+                if validate_mcq(mcq):
+                    count += 1
+                    yield mcq
+                    if count >= num_questions:
+                        return
+    except httpx.HTTPError as e:
+        raise ConnectionError(f"Error connecting to Ollama API: {str(e)}")
+    finally:
+        # Closing the stream drops the connection, so Ollama stops generating
+        await stream.aclose()
+        if final_chunk:
+            observe_generation(model or DEFAULT_MODEL, client.base_url, final_chunk)
+        if count:
+            parse_stats.record(model or DEFAULT_MODEL, "parser", generation_seconds(final_chunk, started), parser.stats)
+    
+    if not count:
+        for mcq in extract_mcqs("".join(generated_text), transcript, num_questions, model,
+                                generation_seconds(final_chunk, started)):
+            yield mcq
+
+def generate_mcqs(transcript: str, num_questions: int = 5, model: str = None, use_gpu: bool = True) -> List[Dict[str, Any]]:
+    """Blocking wrapper around agenerate_mcqs for scripts and the CLI (not for use inside an event loop)"""
+    async def run():
+        # A private pool: the shared one belongs to the long-running service loop
+        async with BackendPool() as pool:
+            return await agenerate_mcqs(transcript, num_questions, model, use_gpu, pool=pool)
+    return asyncio.run(run())
+
 def clean_transcript_text(transcript: str) -> str:
     """Clean and normalize transcript text."""
     # Remove timestamps or other non-text elements
@@ -239,18 +523,27 @@ def clean_transcript_text(transcript: str) -> str:
     
     return cleaned
 
-def create_mcq_prompt(transcript: str, num_questions: int) -> str:
-    """Create a prompt for the LLM to generate MCQs."""
-    return f"""As an educational assessment expert, create {num_questions} multiple-choice questions based on the following transcript.
-Each question should have 4 options with exactly one correct answer.
+# Bump whenever create_mcq_prompt changes so cached MCQs from the old prompt are not reused
+PROMPT_VERSION = 2
 
-Format your response as follows for each question:
+def create_mcq_prompt(transcript: str, num_questions: int, output_mode: str = "text") -> str:
+    """Create a prompt for the LLM to generate MCQs."""
+    if output_mode == "json":
+        answer_format = """Respond with a JSON object of the form:
+{"questions": [{"question": "[Question text]", "options": ["[Option A]", "[Option B]", "[Option C]", "[Option D]"], "correct": [0-based index of the correct option]}]}"""
+    else:
+        answer_format = """Format your response as follows for each question:
 Q: [Question text]
 A: [Option A]
 B: [Option B]
 C: [Option C]
 D: [Option D]
-Correct: [Letter of correct option]
+Correct: [Letter of correct option]"""
+    
+    return f"""As an educational assessment expert, create {num_questions} multiple-choice questions based on the following transcript.
+Each question should have 4 options with exactly one correct answer.
+
+{answer_format}
 
 Here is the transcript:
 "{transcript}"
@@ -262,39 +555,7 @@ Do not include explanations. Only include questions, options, and correct answer
 
 def parse_mcqs_from_text(text: str) -> List[Dict[str, Any]]:
     """Parse generated text into structured MCQs."""
-    mcqs = []
-    
-    # Extract questions using regex
-    question_blocks = re.findall(
-        r'Q:(.+?)(?:\n|\r\n)A:(.+?)(?:\n|\r\n)B:(.+?)(?:\n|\r\n)C:(.+?)(?:\n|\r\n)D:(.+?)(?:\n|\r\n)Correct:(.+?)(?:\n|\r\n|$)',
-        text,
-        re.DOTALL
-    )
-    
-    if not question_blocks:
-        # Try alternative format
-        question_blocks = re.findall(
-            r'Question:(.+?)(?:\n|\r\n)A[).](.+?)(?:\n|\r\n)B[).](.+?)(?:\n|\r\n)C[).](.+?)(?:\n|\r\n)D[).](.+?)(?:\n|\r\n)(?:Correct Answer:|Answer:)(.+?)(?:\n|\r\n|$)',
-            text,
-            re.DOTALL
-        )
-    
-    for block in question_blocks:
-        question = block[0].strip()
-        options = [opt.strip() for opt in block[1:5]]
-        correct_answer = block[5].strip().upper()
-        
-        # Map the letter to index (0-based)
-        correct_map = {"A": 0, "B": 1, "C": 2, "D": 3}
-        correct_index = correct_map.get(correct_answer, 0)
-        
-        mcqs.append({
-            "question": question,
-            "options": options,
-            "correct": correct_index
-        })
-    
-    return mcqs
+    return parse_mcqs(text)
 
 def validate_mcq(mcq: Dict[str, Any]) -> bool:
     """Validate that an MCQ has the required fields and structure."""
@@ -318,8 +579,12 @@ def validate_mcq(mcq: Dict[str, Any]) -> bool:
     
     return True
 
+def is_fallback(mcqs: List[Dict[str, Any]]) -> bool:
+    """Whether MCQs came from generate_fallback_mcqs rather than the model (such results must not be cached)"""
+    return any(mcq.get("fallback") for mcq in mcqs)
+
 def generate_fallback_mcqs(transcript: str, num_questions: int) -> List[Dict[str, Any]]:
-    """Generate simple fallback MCQs when LLM generation fails."""
+    """Generate simple fallback MCQs when LLM generation fails (each marked "fallback": True)."""
     # Extract sentences to create basic questions
     sentences = re.split(r'[.!?]\s+', transcript)
     sentences = [s for s in sentences if len(s.split()) > 5]
@@ -362,30 +627,12 @@ def generate_fallback_mcqs(transcript: str, num_questions: int) -> List[Dict[str
         mcqs.append({
             "question": question,
             "options": options,
-            "correct": correct_index
+            "correct": correct_index,
+            "fallback": True
         })
     
     return mcqs[:num_questions]
 
-def fix_json_syntax(text: str) -> str:
-    """Attempt to fix common JSON syntax errors in the model output"""
-    # Replace single quotes with double quotes
-    text = re.sub(r"'([^']*)'", r'"\1"', text)
-    
-    # Fix missing commas between objects
-    text = re.sub(r'}\s*{', '}, {', text)
-    
-    # Remove trailing commas in arrays
-    text = re.sub(r',\s*]', ']', text)
-    
-    # Add brackets if missing
-    if not text.strip().startswith('['):
-        text = '[' + text
-    if not text.strip().endswith(']'):
-        text = text + ']'
-        
-    return text
-
 if __name__ == "__main__":
     # Test with a sample transcript
     sample_transcript = """
@@ -110,7 +110,7 @@ async function startLlmService() {
     ...process.env,
     PYTHONIOENCODING: 'utf-8',      // Ensure Python can handle Unicode
     PYTHONUNBUFFERED: '1',          // Make Python output unbuffered
-    DEBUG_MODE: '1',                // Enable debug mode
+    DEBUG_MODE: process.env.DEBUG_MODE || '0',  // Per-request debug logs only when asked for
     OLLAMA_MODEL: defaultModel      // Set the model name
   };
 
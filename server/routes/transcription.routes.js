@@ -36,6 +36,7 @@ router.get("/metadata/:fileId", mcqController.getTranscriptMetadata);
 router.get("/segment/:fileId/:segmentId", mcqController.getSegmentContent);
 router.get("/mcqs/:fileId/:segmentId", mcqController.getMCQsBySegment);
 router.post("/generate-mcqs", mcqController.generateMCQs); // MCQ generation route
+router.post("/generate-mcqs/all", mcqController.generateAllMCQs); // MCQs for every segment in one batch
 
 // Stats and other routes
 router.get('/stats', transcriptionController.getStats);
@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+# Cache configuration - can be overridden with environment variables
+CACHE_ENABLED = os.environ.get("TRANSCRIPT_CACHE_ENABLED", "1") == "1"
+CACHE_DIR = os.environ.get(
+    "TRANSCRIPT_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "voice_to_mcq", "transcripts"),
+)
+CACHE_MAX_BYTES = int(float(os.environ.get("TRANSCRIPT_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+# Bump when the stored segment format or the decoding pipeline changes meaningfully
+CACHE_VERSION = 1
+
+STATS_FILE = "_stats.json"
+
+
+def audio_fingerprint(audio):
+    """SHA-256 of the decoded PCM, hashed straight from the buffer without a copy"""
+    return hashlib.sha256(memoryview(audio).cast("B")).hexdigest()
+
+
+def cache_key(audio_hash, model_size, options=None):
+    """Key a transcript on the audio content, the model and the options that change its output"""
+    payload = json.dumps({
+        "version": CACHE_VERSION,
+        "audio": audio_hash,
+        "model_size": model_size,
+        "options": options or {},
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranscriptCache:
+    """
+    On-disk store of transcript segments keyed by content hash.
+
+    Each entry is one JSON file; its mtime is bumped on every hit so eviction
+    can drop the least recently used entries once the directory grows past
+    max_bytes. Hit/miss counters are persisted next to the entries because
+    every transcription may run in a fresh process.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _bump(self, counter, amount=1):
+        stats_path = os.path.join(self.directory, STATS_FILE)
+        with self._lock:
+            try:
+                with open(stats_path) as f:
+                    stats = json.load(f)
+            except (OSError, ValueError):
+                stats = {}
+            stats[counter] = stats.get(counter, 0) + amount
+            temp_path = f"{stats_path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(stats, f)
+            os.replace(temp_path, stats_path)
+
+    def get(self, key):
+        """Return the cached segments for key, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._bump("misses")
+            return None
+
+        # Mark as recently used for LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._bump("hits")
+        return entry["segments"]
+
+    def put(self, key, segments, info=None):
+        """Store the segments for key, then evict old entries above the size cap"""
+        entry = {
+            "key": key,
+            "created_at": time.time(),
+            "info": info or {},
+            "segments": [
+                {"start": float(s["start"]), "end": float(s["end"]), "text": s["text"]}
+                for s in segments
+            ],
+        }
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or name == STATS_FILE:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        if evicted:
+            self._bump("evictions", evicted)
+        return evicted
+
+    def stats(self):
+        try:
+            with open(os.path.join(self.directory, STATS_FILE)) as f:
+                counters = json.load(f)
+        except (OSError, ValueError):
+            counters = {}
+        entries = self._entries()
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Return the process-wide transcript cache, creating it on first use"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = TranscriptCache()
+    return _default_cache
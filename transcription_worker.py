@@ -0,0 +1,340 @@
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from progress_events import EventEmitter, StageLatencyStats
+
+# Worker configuration - can be overridden with environment variables or CLI flags
+WORKER_HOST = os.environ.get("TRANSCRIPTION_WORKER_HOST", "127.0.0.1")
+WORKER_PORT = int(os.environ.get("TRANSCRIPTION_WORKER_PORT", "5002"))
+WORKER_CONCURRENCY = int(os.environ.get("TRANSCRIPTION_WORKER_CONCURRENCY", "1"))
+WORKER_QUEUE_SIZE = int(os.environ.get("TRANSCRIPTION_WORKER_QUEUE_SIZE", "16"))
+
+# Number of finished jobs whose status is kept around for polling
+JOB_HISTORY = int(os.environ.get("TRANSCRIPTION_WORKER_HISTORY", "200"))
+
+# Whisper model sizes a job may ask for (comma-separated)
+WORKER_MODEL_SIZES = [size.strip() for size in os.environ.get(
+    "TRANSCRIPTION_WORKER_MODELS",
+    "tiny,tiny.en,base,base.en,small,small.en,medium,medium.en,large,large-v2,large-v3,turbo",
+).split(",") if size.strip()]
+# Decoding engines a job may pick, and the largest batch it may ask the batched engine for
+WORKER_ENGINES = ("auto", "threads", "batched", "processes")
+WORKER_MAX_BATCH_SIZE = int(os.environ.get("TRANSCRIPTION_WORKER_MAX_BATCH_SIZE", "32"))
+
+
+class QueueFullError(Exception):
+    """Raised when the bounded job queue cannot take another job"""
+
+
+def validate_options(options):
+    """
+    Return the transcription options a client may set, checked and normalized.
+
+    Options end up as keyword arguments of the transcribe call, so anything
+    not listed here (or of the wrong type) raises ValueError instead.
+    """
+    if options is None:
+        return {}
+    if not isinstance(options, dict):
+        raise ValueError("options must be an object")
+    unknown = sorted(set(options) - {"engine", "batch_size", "use_cache", "resume"})
+    if unknown:
+        raise ValueError(f"Unknown options: {', '.join(unknown)}")
+
+    validated = {}
+    if options.get("engine") is not None:
+        if options["engine"] not in WORKER_ENGINES:
+            raise ValueError(f"engine must be one of {', '.join(WORKER_ENGINES)}")
+        validated["engine"] = options["engine"]
+    if options.get("batch_size") is not None:
+        batch_size = options["batch_size"]
+        # bool is an int subclass, but true is not a batch size
+        valid = isinstance(batch_size, int) and not isinstance(batch_size, bool)
+        if not valid or not 1 <= batch_size <= WORKER_MAX_BATCH_SIZE:
+            raise ValueError(f"batch_size must be an integer between 1 and {WORKER_MAX_BATCH_SIZE}")
+        validated["batch_size"] = batch_size
+    for flag in ("use_cache", "resume"):
+        if options.get(flag) is not None:
+            if not isinstance(options[flag], bool):
+                raise ValueError(f"{flag} must be true or false")
+            validated[flag] = options[flag]
+    return validated
+
+
+class TranscriptionJob:
+    """A single queued transcription request and its status"""
+
+    def __init__(self, video_file, output_dir, model_size, options=None):
+        self.id = uuid.uuid4().hex
+        self.video_file = video_file
+        self.output_dir = output_dir
+        self.model_size = model_size
+        self.options = options or {}
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.metadata = None
+        self.error = None
+        # Latest stage and progress reported by the transcription events
+        self.stage = None
+        self.progress = None
+
+    def to_dict(self):
+        now = time.time()
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "video_file": self.video_file,
+            "output_dir": self.output_dir,
+            "model_size": self.model_size,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queued_seconds": round((self.started_at or now) - self.submitted_at, 3),
+            "run_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            "stage": self.stage,
+            "progress": self.progress,
+            "metadata": self.metadata,
+            "error": self.error,
+        }
+
+
+class TranscriptionWorker:
+    """
+    Runs transcription jobs from a bounded queue on a fixed number of threads.
+
+    The worker lives as long as the process, so torch/whisper imports and
+    model loads are paid once instead of once per upload.
+    """
+
+    def __init__(self, transcribe, concurrency=None, queue_size=None, warmup=None):
+        self.transcribe = transcribe
+        self.warmup = warmup
+        self.concurrency = max(1, concurrency or WORKER_CONCURRENCY)
+        self.queue_size = max(1, queue_size or WORKER_QUEUE_SIZE)
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.started_at = time.time()
+        self.stage_latency = StageLatencyStats()
+
+    def start(self, warm_models=()):
+        for model_size in warm_models:
+            if self.warmup:
+                print(f"Warming whisper model {model_size}")
+                self.warmup(model_size)
+
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"transcription-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, video_file, output_dir, model_size, options=None):
+        job = TranscriptionJob(video_file, output_dir, model_size, options)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                raise QueueFullError(f"Job queue is full ({self.queue_size} jobs waiting)")
+            self._jobs[job.id] = job
+            self._prune_locked()
+        print(f"Queued job {job.id} for {video_file}")
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def _prune_locked(self):
+        """Forget the oldest finished jobs beyond JOB_HISTORY"""
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in ("completed", "failed")]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    def _on_event(self, job, event):
+        """Track a running job's stage/progress and aggregate stage latency across jobs"""
+        kind = event["event"]
+        if kind == "stage_start":
+            job.stage = event["stage"]
+        elif kind == "progress":
+            job.progress = {
+                key: event[key]
+                for key in ("progress", "processed_audio_seconds", "total_audio_seconds",
+                            "real_time_factor", "eta_seconds")
+            }
+        self.stage_latency.record(event)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+
+            with self._lock:
+                job.state = "running"
+                job.started_at = time.time()
+                self._running += 1
+            self.stage_latency.record({"event": "stage_end", "stage": "queue_wait",
+                                       "duration_seconds": job.started_at - job.submitted_at})
+
+            events = EventEmitter(callback=lambda event, job=job: self._on_event(job, event), job=job.id)
+            try:
+                print(f"Starting job {job.id} ({job.video_file})")
+                job.metadata = self.transcribe(job.video_file, job.output_dir, job.model_size,
+                                               events=events, **job.options)
+                job.state = "completed"
+            except Exception as e:
+                print(f"Job {job.id} failed: {e}")
+                traceback.print_exc()
+                job.error = str(e)
+                job.state = "failed"
+            finally:
+                with self._lock:
+                    job.finished_at = time.time()
+                    self._running -= 1
+                    if job.state == "completed":
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+                self._queue.task_done()
+
+    def shutdown(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "queue_size": self.queue_size,
+                "queued": self._queue.qsize(),
+                "running": self._running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "stage_latency": self.stage_latency.snapshot(),
+            }
+
+
+def make_handler(worker, extra_stats=None):
+    """Build the HTTP request handler bound to a worker"""
+
+    class WorkerRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            if not length:
+                return {}
+            return json.loads(self.rfile.read(length).decode("utf-8"))
+
+        def do_GET(self):
+            if self.path == "/health":
+                stats = worker.stats()
+                if extra_stats:
+                    stats.update(extra_stats())
+                self._send_json(200, {"status": "ok", **stats})
+            elif self.path == "/jobs":
+                self._send_json(200, {"jobs": worker.jobs()})
+            elif self.path.startswith("/jobs/"):
+                job = worker.get(self.path[len("/jobs/"):])
+                if job is None:
+                    self._send_json(404, {"error": "Job not found"})
+                else:
+                    self._send_json(200, job.to_dict())
+            else:
+                self._send_json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                self._send_json(404, {"error": "Not found"})
+                return
+
+            try:
+                payload = self._read_json()
+            except (ValueError, UnicodeDecodeError):
+                self._send_json(400, {"error": "Request body must be JSON"})
+                return
+
+            if not isinstance(payload, dict):
+                self._send_json(400, {"error": "Request body must be a JSON object"})
+                return
+
+            video_file = payload.get("video_file")
+            if not isinstance(video_file, str) or not os.path.isfile(video_file):
+                self._send_json(400, {"error": f"Video file not found: {video_file}"})
+                return
+
+            model_size = payload.get("model_size") or "small"
+            if model_size not in WORKER_MODEL_SIZES:
+                self._send_json(400, {"error": f"model_size must be one of {', '.join(WORKER_MODEL_SIZES)}"})
+                return
+
+            try:
+                options = validate_options(payload.get("options"))
+            except ValueError as e:
+                self._send_json(400, {"error": str(e)})
+                return
+
+            try:
+                job = worker.submit(
+                    video_file,
+                    payload.get("output_dir") or "transcripts",
+                    model_size,
+                    options,
+                )
+            except QueueFullError as e:
+                self._send_json(503, {"error": str(e)})
+                return
+
+            self._send_json(202, job.to_dict())
+
+        def log_message(self, format, *args):
+            # Job polling is frequent; keep the worker log for job events only
+            pass
+
+    return WorkerRequestHandler
+
+
+def serve(transcribe, host=None, port=None, concurrency=None, queue_size=None,
+          warm_models=(), warmup=None, extra_stats=None):
+    """Run the transcription worker until interrupted"""
+    worker = TranscriptionWorker(transcribe, concurrency, queue_size, warmup)
+    worker.start(warm_models)
+
+    server = ThreadingHTTPServer((host or WORKER_HOST, port or WORKER_PORT), make_handler(worker, extra_stats))
+    print(f"Transcription worker listening on http://{server.server_address[0]}:{server.server_address[1]} "
+          f"(concurrency={worker.concurrency}, queue_size={worker.queue_size})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down transcription worker")
+    finally:
+        server.server_close()
+    return worker